@@ -1,11 +1,11 @@
 from flask import Flask, render_template
-from ultralytics import YOLO
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask_bcrypt import Bcrypt
 from routes import Routes
 from models import db
+import logging
 import base64
 import time
 import cv2
@@ -13,6 +13,10 @@ import os
 
 app = Flask(__name__)
 
+# Logging: DEBUG adds per-crossing and per-client messages from the pipeline
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+logging.basicConfig(level=app.config['LOG_LEVEL'], format="%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s")
+
 # Database Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///track_record.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -20,9 +24,112 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # JWT Configuration
 app.config["JWT_SECRET_KEY"] = "your-secret-key"
 
+# Inference backend: torch, onnx or openvino. 'auto' picks a GPU when there is one, else the CPU.
+# Exports are cached in INFERENCE_CACHE_DIR; int8 calibrates on the images in INFERENCE_CALIBRATION_DIR.
+app.config['INFERENCE_BACKEND'] = 'torch'
+app.config['INFERENCE_DEVICE'] = 'auto'
+app.config['INFERENCE_INT8'] = False
+app.config['INFERENCE_CACHE_DIR'] = 'models/.cache'
+app.config['INFERENCE_CALIBRATION_DIR'] = None
+app.config['INFERENCE_CALIBRATION_SIZE'] = 100
+
+# Frames kept by each camera's decoder thread (1 = always process the newest frame)
+app.config['FRAME_BUFFER_SIZE'] = 1
+
+# Real size of the speed polygon on the road (across x along), used to convert pixels to meters.
+# Speeds and speed limits are in km/h; calibrate per camera through /update_polygon (width_m, length_m).
+app.config['SPEED_REGION_WIDTH_M'] = 7.0
+app.config['SPEED_REGION_LENGTH_M'] = 20.0
+
+# Track lifecycle: a lost track is evicted after TRACK_LOST_BUFFER detector updates (the
+# tracker's own buffer) or TRACK_TTL seconds, with TRACK_HISTORY positions kept per track
+# and at most TRACK_MAX tracks per camera
+app.config['TRACK_LOST_BUFFER'] = 30
+app.config['TRACK_TTL'] = 10.0
+app.config['TRACK_HISTORY'] = 32
+app.config['TRACK_MAX'] = 256
+
+# Motion gate: the detector is skipped while less than MOTION_MIN_AREA of the region of interest
+# changes by more than MOTION_THRESHOLD gray levels, and kept on for MOTION_HOLD_FRAMES after motion
+app.config['MOTION_GATE'] = True
+app.config['MOTION_THRESHOLD'] = 25
+app.config['MOTION_MIN_AREA'] = 0.002
+app.config['MOTION_HOLD_FRAMES'] = 15
+# Detection runs on the bounding box of speed polygon and line plus this many pixels, None for full frames
+app.config['ROI_PADDING'] = 32
+
+# Adaptive detection stride: the detector runs every 1..DETECTION_MAX_STRIDE frames and tracks are
+# extrapolated in between. The stride drops near the line (DETECTION_NEAR_LINE px) or with
+# DETECTION_BUSY_TRACKS tracks and grows on an empty road or below DETECTION_TARGET_FPS (None = source fps).
+# This is the default for new cameras; /update_detection_stride changes it per camera.
+app.config['DETECTION_STRIDE_ADAPTIVE'] = False
+app.config['DETECTION_MIN_STRIDE'] = 1
+app.config['DETECTION_MAX_STRIDE'] = 4
+app.config['DETECTION_TARGET_FPS'] = None
+app.config['DETECTION_NEAR_LINE'] = 80
+app.config['DETECTION_BUSY_TRACKS'] = 8
+
+# Frame preprocessing per consumer: 'detector' (region of interest before detection), 'crops'
+# (crossing crops for the license and violation models) and 'preview' (streamed frame, annotated
+# after preprocessing). Operations: resize (width/height, scale or max_side), blur (kernel, sigma)
+# and color (a cv2 conversion such as BGR2HSV; 'detector' and 'crops' feed models and must end in
+# BGR, e.g. with HSV2BGR). A 'preprocess' entry in CAMERAS overrides it per camera.
+app.config['PREPROCESS'] = {
+    'detector': [{'op': 'blur', 'kernel': 3, 'sigma': 1.0}],
+    'crops': [],
+    'preview': [],
+}
+
+# Multiprocess mode: every camera decodes in its own process, each model runs in a worker process
+# and JPEG encoding uses ENCODER_PROCESSES processes. Frames go through shared memory whose slots
+# start at MULTIPROCESS_FRAME_SIZE (width, height) and grow when a larger frame arrives. A crashed
+# worker is restarted at most WORKER_MAX_RESTARTS times within WORKER_RESTART_WINDOW seconds.
+app.config['MULTIPROCESS'] = False
+app.config['MULTIPROCESS_FRAME_SIZE'] = (1920, 1080)
+app.config['ENCODER_PROCESSES'] = 2
+app.config['WORKER_MAX_RESTARTS'] = 5
+app.config['WORKER_RESTART_WINDOW'] = 60.0
+
+# Detector micro-batching across cameras
+app.config['INFERENCE_MAX_BATCH_SIZE'] = 8
+app.config['INFERENCE_MAX_WAIT_MS'] = 10
+
+# License/violation sub-model batching on letterboxed crossing crops
+app.config['SUBMODEL_IMGSZ'] = 640
+app.config['SUBMODEL_MAX_BATCH_SIZE'] = 16
+app.config['SUBMODEL_BATCH_WINDOW_MS'] = 0
+
+# Post-processing worker pool (overflow policy: drop_oldest, drop_newest or block)
+app.config['POSTPROCESS_WORKERS'] = 4
+app.config['POSTPROCESS_QUEUE_SIZE'] = 64
+app.config['POSTPROCESS_OVERFLOW_POLICY'] = 'drop_oldest'
+
+# Background violation writer
+app.config['VIOLATION_WRITER_BATCH_SIZE'] = 32
+app.config['VIOLATION_WRITER_FLUSH_INTERVAL'] = 0.5
+app.config['VIOLATION_WRITER_IO_WORKERS'] = 4
+
+# Plate OCR worker processes (TESSERACT_CMD = None looks tesseract up on PATH)
+app.config['OCR_WORKERS'] = 2
+app.config['TESSERACT_CMD'] = None
+app.config['TESSERACT_CONFIG'] = '--psm 6'
+# Seconds /get_license_text waits for an on-demand OCR job before answering 202
+app.config['OCR_REQUEST_WAIT'] = 2.0
+
 # Upload Folder
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(),'static')
 
+# Browser cache lifetime (seconds) of evidence images served by /vehicles/<id>/image/<kind>
+app.config['IMAGE_CACHE_MAX_AGE'] = 86400
+
+# Thumbnails generated on demand (?size=<px>) and kept in a size-bounded on-disk LRU
+app.config['THUMBNAIL_SIZES'] = (160, 320)
+app.config['THUMBNAIL_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+
+# Daily report: rollup days follow this timezone, mail goes out in BCC batches
+app.config['REPORT_TIMEZONE'] = 'Asia/Manila'
+app.config['REPORT_DAYS'] = 7
+app.config['REPORT_BCC_BATCH_SIZE'] = 50
 
 # Email Configuration
 app.config["MAIL_SERVER"] = "smtp.gmail.com"
@@ -37,7 +144,8 @@ jwt = JWTManager(app)
 bcrypt = Bcrypt(app)
 mail = Mail(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
-routes = Routes(app, db, bcrypt, mail, jwt)
 
+# Guarded so OCR worker processes importing this module don't start the app
 if __name__ == '__main__':
+    routes = Routes(app, db, bcrypt, mail, jwt)
     routes.start_run()
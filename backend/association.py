@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """
+    Computes the pairwise IoU of two sets of boxes in one vectorized pass.
+
+    :param boxes_a: (N, 4) array of (x1, y1, x2, y2).
+    :param boxes_b: (M, 4) array of (x1, y1, x2, y2).
+    :return: (N, M) IoU matrix.
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+
+def associate(boxes, tracker_ids, track_boxes, track_ids, iou_threshold=0.1):
+    """
+    Resolves the track id of each box.
+
+    Boxes that already carry a tracker id of an active track keep it. The rest
+    are matched against the active tracks with one IoU matrix, falling back to
+    the nearest box corner distance when nothing overlaps.
+
+    :param boxes: (N, 4) array of boxes to resolve.
+    :param tracker_ids: (N,) array of tracker ids, or None.
+    :param track_boxes: (M, 4) array of active track boxes.
+    :param track_ids: (M,) array of active track ids.
+    :param iou_threshold: Minimum IoU for an overlap match.
+    :return: List of N track ids (None where there are no active tracks).
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    track_boxes = np.asarray(track_boxes, dtype=np.float32).reshape(-1, 4)
+    track_ids = np.asarray(track_ids).reshape(-1)
+    result = np.full(len(boxes), -1, dtype=np.int64)
+
+    if tracker_ids is not None:
+        tracker_ids = np.asarray(tracker_ids).reshape(-1)
+        known = np.isin(tracker_ids, track_ids)
+        result[known] = tracker_ids[known]
+    unresolved = result < 0
+
+    if unresolved.any() and len(track_ids):
+        candidates = boxes[unresolved]
+        iou = box_iou_matrix(candidates, track_boxes)
+        best = iou.argmax(axis=1)
+        overlaps = iou[np.arange(len(candidates)), best] >= iou_threshold
+
+        distance = np.linalg.norm(candidates[:, None, :] - track_boxes[None, :, :], axis=2)
+        best = np.where(overlaps, best, distance.argmin(axis=1))
+        result[unresolved] = track_ids[best]
+
+    return [int(track_id) if track_id >= 0 else None for track_id in result]
@@ -0,0 +1,303 @@
+"""
+Runs the camera pipeline over recorded video files without a UI.
+
+Each file is read once, frame by frame and as fast as the models allow, by
+the same ``Camera`` detection/tracking/violation code the live server uses,
+just without streaming. Files are processed in parallel worker processes.
+Violations go to the database (like the server) or to a JSONL/Parquet file,
+with evidence images written to the evidence store either way.
+
+Run from the backend directory:
+
+    python batch_process.py videos/*.mp4 --output violations.jsonl --workers 4
+    python batch_process.py sample_2.mp4 --output db --database sqlite:///track_record.db
+"""
+from datetime import datetime, timezone
+import multiprocessing
+import threading
+import argparse
+import logging
+import json
+import time
+import os
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class RecordCollector:
+    """
+    Stand-in for ``ViolationWriter`` that keeps violations as rows for an
+    output file instead of inserting them into the database.
+    """
+
+    def __init__(self, evidence_store, source):
+        self.evidence_store = evidence_store
+        self.source = source
+        self.records = []
+        self.lock = threading.Lock()
+
+    def submit(self, camera_id, motorist_img, license_img, violations, speed, timestamp=None):
+        timestamp = timestamp or time.time()
+        record = {
+            'source': self.source,
+            'camera_id': camera_id,
+            'timestamp': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            'violations': list(violations),
+            'speed': speed,
+            'image_path': self.evidence_store.put("motorist", motorist_img, timestamp),
+            'license_path': self.evidence_store.put("license", license_img, timestamp) if license_img is not None else None,
+        }
+        with self.lock:
+            self.records.append(record)
+        return True
+
+    def shutdown(self):
+        pass
+
+
+def parse_points(value, count):
+    if value is None:
+        return None
+    points = [int(float(v)) for v in value.split(",")]
+    if len(points) != count:
+        raise argparse.ArgumentTypeError(f"Expected {count} comma separated numbers, got {value!r}")
+    return points
+
+
+def parse_region_size(value):
+    try:
+        size = [float(v) for v in value.split(",")]
+    except ValueError:
+        size = []
+    if len(size) != 2 or not all(v > 0 for v in size):
+        raise argparse.ArgumentTypeError(f"Expected two positive comma separated numbers (width,length), got {value!r}")
+    return size
+
+
+def create_app(database_uri):
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Several worker processes share the SQLite file
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    return app, db
+
+
+def prepare_database(database_uri):
+    from models import Violation, VIOLATION_NAMES
+    from migrations import migrate
+
+    app, db = create_app(database_uri)
+    with app.app_context():
+        db.create_all()
+        migrate(db)
+        existing = {v.name for v in Violation.query.all()}
+        db.session.add_all([Violation(name=name) for name in VIOLATION_NAMES if name not in existing])
+        db.session.commit()
+
+
+def recording_start(path, start):
+    """ Epoch time of the first frame: ``--start`` if given, else the file's mtime minus its duration. """
+    if start is not None:
+        return start.timestamp()
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frames / fps if fps and fps > 0 else 0.0
+    return os.path.getmtime(path) - duration
+
+
+def process_file(job):
+    """ Runs one file through the pipeline. Executed in a worker process. """
+    from camera_manager import MAIN_MODEL_PATH, LICENSE_MODEL_PATH, VIOLATION_MODEL_PATH, ModelRegistry
+    from inference_backend import ModelExporter
+    from inference_server import InferenceServer
+    from evidence_store import EvidenceStore
+    from motion import MotionGate
+    from worker_pool import WorkerPool, BLOCK
+    from camera import Camera
+    import pytz
+
+    path, options = job
+    logging.basicConfig(level=options['log_level'], format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+    registry = ModelRegistry(options['backend'], options['device'], options['int8'], ModelExporter(cache_dir=options['cache_dir']))
+    detector = InferenceServer(registry.get(MAIN_MODEL_PATH), max_batch_size=1, max_wait_ms=0,
+                               predict_kwargs={'conf': options['conf']}, name="detector")
+    submodel_batching = {'max_batch_size': 16, 'max_wait_ms': 0, 'predict_kwargs': {'conf': 0.5, 'imgsz': options['imgsz']}}
+    license_server = InferenceServer(registry.get(LICENSE_MODEL_PATH, options['imgsz']), name="license", **submodel_batching)
+    violation_server = InferenceServer(registry.get(VIOLATION_MODEL_PATH, options['imgsz']), name="violation", **submodel_batching)
+    evidence_store = EvidenceStore(options['evidence_dir'])
+
+    app = None
+    if options['output'] == 'db':
+        from violation_writer import ViolationWriter
+        app, db = create_app(options['database'])
+        writer = ViolationWriter(app, db, evidence_store, rollup_timezone=pytz.timezone(options['timezone']), max_queue_size=100000)
+    else:
+        writer = RecordCollector(evidence_store, path)
+    # Offline nothing may be dropped, so crossings wait for a free worker instead
+    pool = WorkerPool(options['postprocess_workers'], 64, BLOCK, name="postprocess")
+
+    camera_id = options['camera_id'] or os.path.splitext(os.path.basename(path))[0]
+    camera = Camera(
+        camera_id, camera_id, path, None, None, app,
+        main_model=detector,
+        license_model=license_server,
+        violation_model=violation_server,
+        worker_pool=pool,
+        violation_writer=writer,
+        submodel_imgsz=options['imgsz'],
+        frame_buffer_size=8,
+        realtime=False,
+        start_time=recording_start(path, options['start']),
+        motion_gate=MotionGate() if options['motion_gate'] else None,
+        roi_padding=options['roi_padding'],
+        region_size=options['region_size'] or (7.0, 20.0),
+        detection_stride={'max_stride': options['max_stride']} if options['max_stride'] > 1 else None,
+    )
+    camera.set_speed_limit(options['speed_limit'])
+    if options['line']:
+        camera.set_line(*options['line'])
+    if options['polygon']:
+        camera.set_polygon(*options['polygon'])
+
+    start = time.perf_counter()
+    camera.capture_frame()
+    pool.shutdown(wait=True, timeout=None)
+    writer.shutdown()
+    elapsed = time.perf_counter() - start
+
+    frames = camera.grabber.stats()['delivered']
+    fps = camera.grabber.fps
+    stats = {
+        'file': path,
+        'frames': frames,
+        'seconds': elapsed,
+        'fps': frames / elapsed if elapsed else 0.0,
+        'realtime_factor': (frames / fps) / elapsed if fps and elapsed else None,
+        'crossings': pool.stats()['processed'],
+        'failed_jobs': pool.stats()['failed'],
+        'detector': detector.stats(),
+        'gating': camera.gating_stats(),
+        'frames_predicted': camera.frames_predicted,
+    }
+    if isinstance(writer, RecordCollector):
+        stats['violations'] = len(writer.records)
+        records = writer.records
+    else:
+        stats['violations'] = writer.stats()['written']
+        records = []
+
+    camera.release()
+    for server in (detector, license_server, violation_server):
+        server.shutdown()
+    return stats, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="Video files to process")
+    parser.add_argument("--output", required=True, help="'db', or a .jsonl or .parquet file")
+    parser.add_argument("--database", default="sqlite:///track_record.db", help="Database URI used with --output db")
+    parser.add_argument("--evidence-dir", default=os.path.join(os.getcwd(), "static"), help="Root of the evidence store")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Files processed in parallel")
+    parser.add_argument("--postprocess-workers", type=int, default=2, help="Crossing workers per file")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--cache-dir", default="models/.cache")
+    parser.add_argument("--imgsz", type=int, default=640, help="Input size of the license/violation models")
+    parser.add_argument("--conf", type=float, default=0.25, help="Detector confidence threshold")
+    parser.add_argument("--camera-id", help="Camera id recorded for every file, defaults to the file name")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Recording start (ISO 8601), defaults to mtime minus duration")
+    parser.add_argument("--timezone", default="Asia/Manila", help="Timezone of the daily rollup with --output db")
+    parser.add_argument("--speed-limit", type=float, default=30)
+    parser.add_argument("--line", type=lambda v: parse_points(v, 4), help="Crossing line as x1,y1,x2,y2")
+    parser.add_argument("--polygon", type=lambda v: parse_points(v, 8), help="Speed region as x1,y1,...,x4,y4")
+    parser.add_argument("--region-size", type=parse_region_size,
+                        help="Real width,length of the speed region in meters, for km/h")
+    parser.add_argument("--no-motion-gate", dest="motion_gate", action="store_false", help="Run the detector on every frame")
+    parser.add_argument("--roi-padding", type=int, default=32, help="Padding of the detector crop around polygon and line, -1 for full frames")
+    parser.add_argument("--max-stride", type=int, default=1, help="Detect every 1..N frames, predicting tracks in between")
+    parser.add_argument("--stats-json", help="Also write the per-file statistics to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+    extension = os.path.splitext(args.output)[1].lower()
+    if args.output != 'db' and extension not in ('.jsonl', '.parquet'):
+        parser.error("--output must be 'db' or end in .jsonl or .parquet")
+    missing = [path for path in args.files if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"Not found: {', '.join(missing)}")
+
+    if args.output == 'db':
+        prepare_database(args.database)
+    options = {
+        'output': 'db' if args.output == 'db' else extension,
+        'database': args.database,
+        'evidence_dir': args.evidence_dir,
+        'postprocess_workers': args.postprocess_workers,
+        'backend': args.backend,
+        'device': args.device,
+        'int8': args.int8,
+        'cache_dir': args.cache_dir,
+        'imgsz': args.imgsz,
+        'conf': args.conf,
+        'camera_id': args.camera_id,
+        'start': args.start,
+        'timezone': args.timezone,
+        'speed_limit': args.speed_limit,
+        'line': args.line,
+        'polygon': args.polygon,
+        'region_size': args.region_size,
+        'motion_gate': args.motion_gate,
+        'roi_padding': args.roi_padding if args.roi_padding >= 0 else None,
+        'max_stride': args.max_stride,
+        'log_level': args.log_level,
+    }
+
+    all_stats = []
+    rows = []
+    jsonl = open(args.output, "w") if extension == '.jsonl' else None
+    begin = time.perf_counter()
+    # Spawned workers load their own models and never share CUDA or SQLite handles with the parent
+    with multiprocessing.get_context("spawn").Pool(min(args.workers, len(args.files))) as pool:
+        for stats, records in pool.imap_unordered(process_file, [(path, options) for path in args.files]):
+            all_stats.append(stats)
+            if jsonl is not None:
+                for record in records:
+                    jsonl.write(json.dumps(record) + "\n")
+                jsonl.flush()
+            else:
+                rows.extend(records)
+            realtime = f"{stats['realtime_factor']:.1f}x realtime" if stats['realtime_factor'] else ""
+            print(f"{stats['file']}: {stats['frames']} frames in {stats['seconds']:.1f}s "
+                  f"({stats['fps']:.1f} fps, {realtime}), {stats['violations']} violations")
+    elapsed = time.perf_counter() - begin
+    if jsonl is not None:
+        jsonl.close()
+
+    if extension == '.parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(rows), args.output)
+
+    frames = sum(s['frames'] for s in all_stats)
+    print(f"Total: {len(all_stats)} files, {frames} frames in {elapsed:.1f}s ({frames / elapsed if elapsed else 0.0:.1f} fps), "
+          f"{sum(s['violations'] for s in all_stats)} violations")
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump({'files': all_stats, 'seconds': elapsed, 'frames': frames}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Microbenchmark of crossing-to-track association.
+
+Compares the per-box torch loop formerly used by ``Camera.find_nearest_key``
+against the vectorized ``association.associate``.
+
+Run from the backend directory:
+
+    python benchmarks/bench_association.py --tracks 50 --crossings 5
+"""
+import os
+import sys
+import argparse
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from association import associate
+
+
+def find_nearest_key(data_dict, target_array):
+    """ The previous implementation, kept here as the baseline. """
+    import torch
+
+    target_tensor = torch.tensor(target_array, dtype=torch.float32)
+    closest_key = None
+    min_distance = float("inf")
+
+    for key, tensor_list in data_dict.items():
+        for tensor in tensor_list:
+            tensor = torch.as_tensor(tensor, dtype=torch.float32).squeeze()
+            distance = torch.norm(tensor - target_tensor)
+
+            if distance < min_distance:
+                min_distance = distance
+                closest_key = key
+
+    return closest_key
+
+
+def make_scene(num_tracks, num_crossings, seed=0):
+    rng = np.random.default_rng(seed)
+    top_left = rng.uniform(0, 1800, size=(num_tracks, 2))
+    size = rng.uniform(40, 200, size=(num_tracks, 2))
+    boxes = np.hstack([top_left, top_left + size]).astype(np.float32)
+    track_ids = np.arange(1, num_tracks + 1)
+    picked = rng.choice(num_tracks, size=min(num_crossings, num_tracks), replace=False)
+    crossing_boxes = boxes[picked] + rng.normal(0, 2, size=(len(picked), 4)).astype(np.float32)
+    return boxes, track_ids, crossing_boxes, track_ids[picked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--crossings", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    boxes, track_ids, crossing_boxes, crossing_ids = make_scene(args.tracks, args.crossings)
+
+    def vectorized_with_ids():
+        associate(crossing_boxes, crossing_ids, boxes, track_ids)
+
+    def vectorized_without_ids():
+        associate(crossing_boxes, None, boxes, track_ids)
+
+    results = {
+        "associate (tracker ids)": vectorized_with_ids,
+        "associate (IoU matrix)": vectorized_without_ids,
+    }
+
+    try:
+        import torch  # noqa: F401
+        track_m = {int(t): [b] for t, b in zip(track_ids, boxes)}
+
+        def legacy():
+            for box in crossing_boxes:
+                find_nearest_key(track_m, tuple(box))
+
+        results["find_nearest_key (legacy)"] = legacy
+    except ImportError:
+        print("torch not installed, skipping the legacy baseline")
+
+    print(f"{args.tracks} tracks, {len(crossing_boxes)} crossings, {args.repeat} repeats")
+    for name, fn in results.items():
+        seconds = min(timeit.repeat(fn, number=args.repeat, repeat=3)) / args.repeat
+        print(f"{name:<28} {seconds * 1e6:10.1f} us/frame")
+
+    matched = associate(crossing_boxes, None, boxes, track_ids)
+    accuracy = np.mean(np.array(matched) == crossing_ids)
+    print(f"IoU association accuracy vs ground truth: {accuracy:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compares inference backends on the CPU.
+
+Every model is run through the PyTorch path and through each requested
+export (ONNX, OpenVINO, optionally int8). The script reports frames per
+second and how far each export's detections drift from PyTorch: precision,
+recall and F1 of its boxes against the PyTorch boxes (same class, IoU >= 0.5)
+and the mean confidence difference of matched boxes.
+
+Run from the backend directory:
+
+    python benchmarks/bench_backends.py --images calibration/ --int8
+"""
+import os
+import sys
+import argparse
+import glob
+import json
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from association import box_iou_matrix
+from camera_manager import MAIN_MODEL_PATH, LICENSE_MODEL_PATH, VIOLATION_MODEL_PATH
+from inference_backend import IMAGE_EXTENSIONS, ModelExporter, load_model
+
+
+def load_images(folder, video, limit):
+    if folder:
+        paths = sorted(p for pattern in IMAGE_EXTENSIONS for p in glob.glob(os.path.join(folder, pattern)))
+        return [image for image in (cv2.imread(p) for p in paths[:limit]) if image is not None]
+    cap = cv2.VideoCapture(video)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or limit
+    step = max(1, total // limit)
+    images = []
+    while len(images) < limit:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, len(images) * step)
+        ret, frame = cap.read()
+        if not ret:
+            break
+        images.append(frame)
+    cap.release()
+    return images
+
+
+def run(model, device, images, imgsz, warmup):
+    for image in images[:warmup]:
+        model.predict(image, imgsz=imgsz, device=device, verbose=False)
+    outputs = []
+    start = time.perf_counter()
+    for image in images:
+        boxes = model.predict(image, imgsz=imgsz, device=device, verbose=False)[0].boxes
+        outputs.append((boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()))
+    return len(images) / (time.perf_counter() - start), outputs
+
+
+def agreement(reference, candidate, iou_threshold=0.5):
+    """ Precision/recall/F1 of candidate boxes against reference boxes, and the mean confidence delta. """
+    matched = predicted = expected = 0
+    deltas = []
+    for (ref_boxes, ref_cls, ref_conf), (boxes, cls, conf) in zip(reference, candidate):
+        predicted += len(boxes)
+        expected += len(ref_boxes)
+        if not len(boxes) or not len(ref_boxes):
+            continue
+        iou = box_iou_matrix(ref_boxes, boxes)
+        iou[ref_cls[:, None] != cls[None, :]] = 0
+        # Greedy one-to-one matching, best overlaps first
+        used_rows, used_cols = set(), set()
+        for r, c in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[r, c] < iou_threshold:
+                break
+            if r in used_rows or c in used_cols:
+                continue
+            used_rows.add(r)
+            used_cols.add(c)
+            matched += 1
+            deltas.append(abs(float(ref_conf[r]) - float(conf[c])))
+    precision = matched / predicted if predicted else 1.0
+    recall = matched / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': precision, 'recall': recall, 'f1': f1, 'conf_delta': float(np.mean(deltas)) if deltas else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Folder of sample frames, also used for int8 calibration")
+    source.add_argument("--video", help="Video sampled evenly for frames")
+    parser.add_argument("--models", nargs="+", default=[MAIN_MODEL_PATH, LICENSE_MODEL_PATH, VIOLATION_MODEL_PATH])
+    parser.add_argument("--backends", nargs="+", default=["onnx", "openvino"], choices=["onnx", "openvino"])
+    parser.add_argument("--int8", action="store_true", help="Also benchmark int8 exports (needs --images)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--cache-dir", default="models/.cache")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if args.int8 and not args.images:
+        parser.error("--int8 needs --images for calibration")
+    images = load_images(args.images, args.video, args.frames)
+    if not images:
+        parser.error("No frames could be read")
+    exporter = ModelExporter(cache_dir=args.cache_dir, calibration_dir=args.images)
+    variants = [(backend, False) for backend in args.backends]
+    if args.int8:
+        variants += [(backend, True) for backend in args.backends]
+
+    results = []
+    print(f"{len(images)} frames at imgsz {args.imgsz} on {args.device}")
+    print(f"{'model':<24} {'backend':<14} {'fps':>7} {'speedup':>8} {'precision':>10} {'recall':>7} {'f1':>6} {'conf delta':>11}")
+    for weights in args.models:
+        name = os.path.basename(weights)
+        model, device = load_model(weights, "torch", args.device)
+        base_fps, reference = run(model, device, images, args.imgsz, args.warmup)
+        results.append({'model': name, 'backend': 'torch', 'int8': False, 'fps': base_fps})
+        print(f"{name:<24} {'torch':<14} {base_fps:7.1f} {1.0:7.2f}x")
+
+        for backend, int8 in variants:
+            label = f"{backend}{'-int8' if int8 else ''}"
+            try:
+                model, device = load_model(weights, backend, args.device, args.imgsz, int8, exporter)
+            except Exception as e:
+                print(f"{name:<24} {label:<14} skipped: {e}")
+                continue
+            fps, outputs = run(model, device, images, args.imgsz, args.warmup)
+            delta = agreement(reference, outputs)
+            results.append({'model': name, 'backend': backend, 'int8': int8, 'fps': fps, **delta})
+            print(f"{name:<24} {label:<14} {fps:7.1f} {fps / base_fps:7.2f}x {delta['precision']:10.3f} "
+                  f"{delta['recall']:7.3f} {delta['f1']:6.3f} {delta['conf_delta']:11.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
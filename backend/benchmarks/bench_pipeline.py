@@ -0,0 +1,274 @@
+"""
+Replays a clip through the camera pipeline and reports per-stage timings.
+
+The real Camera, InferenceServer, WorkerPool, ViolationWriter (on a throwaway
+SQLite database) and FrameBroadcaster are used. Only the models are replaced
+by stubs with configurable latency, and the socket by a sink, so the
+benchmark runs on a CI box without weights or a GPU. The stub detector finds
+the bright blobs of the synthetic clip, which move across the crossing line
+so every stage is exercised.
+
+Reports per-stage p50/p95/p99, end-to-end frame latency and steady-state fps
+as JSON. With ``--baseline`` the run fails (exit code 1) when fps drops, or
+frame p95 latency grows, by more than ``--threshold``.
+
+Run from the backend directory:
+
+    python benchmarks/bench_pipeline.py --frames 600 --json result.json
+    python benchmarks/bench_pipeline.py --baseline result.json --threshold 0.1
+"""
+import os
+import sys
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import profiling
+from camera import Camera
+from evidence_store import EvidenceStore
+from frame_broadcaster import FrameBroadcaster
+from inference_server import InferenceServer
+from motion import MotionGate
+from preprocess import Preprocessor
+from process_pipeline import DetectionResult, FrameEncoder, ProcessGrabber, ResultBoxes
+from violation_writer import ViolationWriter
+from worker_pool import WorkerPool, BLOCK
+
+
+class StubModel:
+    """
+    Stands in for a YOLO model. ``predict`` sleeps ``latency_ms`` per batch plus
+    ``per_frame_ms`` per frame, then answers through ``respond(frame)`` with the
+    same result objects the worker processes return.
+    """
+
+    def __init__(self, names, respond, latency_ms=0.0, per_frame_ms=0.0):
+        self.names = names
+        self.respond = respond
+        self.latency = latency_ms / 1000.0
+        self.per_frame = per_frame_ms / 1000.0
+        self.calls = []
+
+    def predict(self, frames, **kwargs):
+        frames = frames if isinstance(frames, list) else [frames]
+        time.sleep(self.latency + self.per_frame * len(frames))
+        self.calls.append(time.perf_counter())
+        return [DetectionResult(self.names, frame.shape[:2], ResultBoxes(*self.respond(frame))) for frame in frames]
+
+
+def detect_blobs(frame):
+    """ Bright connected components become motorist detections. """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    _, mask = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    boxes = [(x, y, x + w, y + h) for x, y, w, h, area in stats[1:count] if area >= 100]
+    return boxes, [0.9] * len(boxes), [0] * len(boxes)
+
+
+def plate_in_center(crop):
+    height, width = crop.shape[:2]
+    return [(width * 0.35, height * 0.6, width * 0.65, height * 0.8)], [0.8], [0]
+
+
+def no_helmet(crop):
+    return [(0, 0, crop.shape[1], crop.shape[0])], [0.7], [0]
+
+
+def synthetic_clip(path, frames, width, height, objects, fps=30, idle=0.0):
+    """
+    Writes a clip of bright boxes sweeping across the frame at different speeds and lanes.
+    The last ``idle`` share of every 10 seconds shows the empty road.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 120, size=(height, width, 3), dtype=np.uint8)
+    lanes = np.linspace(height * 0.15, height * 0.75, objects).astype(int)
+    speeds = rng.uniform(width / (fps * 4), width / (fps * 1.5), size=objects)
+    offsets = rng.uniform(0, width, size=objects)
+    size = max(20, height // 8)
+    for index in range(frames):
+        frame = background.copy()
+        if index % (fps * 10) >= fps * 10 * (1 - idle):
+            writer.write(frame)
+            continue
+        for lane, speed, offset in zip(lanes, speeds, offsets):
+            x = int((offset + speed * index) % (width + size)) - size
+            cv2.rectangle(frame, (max(0, x), lane), (min(width - 1, x + size), lane + size), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+class SocketSink:
+    """ Stand-in for SocketIO that only counts what would have been sent. """
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def emit(self, event, data, to=None):
+        self.messages += 1
+        self.bytes += len(data)
+
+
+def create_app(folder):
+    from flask import Flask
+    from models import db, Violation, VIOLATION_NAMES
+    from migrations import migrate
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(folder, 'bench.db')}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        migrate(db)
+        db.session.add_all([Violation(name=name) for name in VIOLATION_NAMES])
+        db.session.commit()
+    return app, db
+
+
+def run(args, folder):
+    clip = args.video
+    if clip is None:
+        clip = os.path.join(folder, "clip.avi")
+        synthetic_clip(clip, args.frames, args.width, args.height, args.objects, idle=args.idle)
+
+    detector = StubModel({0: "motorist"}, detect_blobs, args.detector_ms, args.detector_per_frame_ms)
+    license_model = StubModel({0: "plate"}, plate_in_center, args.submodel_ms)
+    violation_model = StubModel({0: "No_Helmet"}, no_helmet, args.submodel_ms)
+    servers = [
+        InferenceServer(detector, max_batch_size=args.batch_size, max_wait_ms=args.batch_wait_ms, name="detector"),
+        InferenceServer(license_model, max_batch_size=16, max_wait_ms=0, name="license"),
+        InferenceServer(violation_model, max_batch_size=16, max_wait_ms=0, name="violation"),
+    ]
+
+    app, db = create_app(folder)
+    writer = ViolationWriter(app, db, EvidenceStore(os.path.join(folder, "static")), max_queue_size=100000)
+    pool = WorkerPool(args.postprocess_workers, 64, BLOCK, name="postprocess")
+    socket = SocketSink()
+    # The stub models stay in this process; decoding and encoding move to worker processes
+    encoder = FrameEncoder(args.encoder_processes, slot_bytes=args.width * args.height * 3) if args.multiprocess else None
+    broadcaster = FrameBroadcaster(socket, encoder=encoder)
+    for index in range(args.subscribers):
+        broadcaster.subscribe(f"client-{index}", "bench", tier=("full", "half", "thumbnail")[index % 3], max_fps=1000)
+
+    camera = Camera("bench", "bench", clip, broadcaster, db, app, servers[0], servers[1], servers[2], pool, writer,
+                    submodel_imgsz=args.imgsz, frame_buffer_size=4, realtime=False,
+                    motion_gate=MotionGate() if args.motion_gate else None, roi_padding=args.roi_padding,
+                    detection_stride={'max_stride': args.max_stride} if args.max_stride > 1 else None,
+                    preprocessor=Preprocessor(args.preprocess),
+                    grabber=ProcessGrabber(clip, buffer_size=4, loop=False, realtime=False) if args.multiprocess else None)
+    camera.set_speed_limit(args.speed_limit)
+    if args.polygon:
+        camera.set_polygon(*args.polygon)
+
+    profiling.timer.reset()
+    start = time.perf_counter()
+    camera.capture_frame()
+    pool.shutdown(wait=True, timeout=None)
+    writer.shutdown()
+    elapsed = time.perf_counter() - start
+    camera.release()
+    for server in servers:
+        server.shutdown()
+    if encoder is not None:
+        encoder.shutdown()
+
+    calls = detector.calls
+    warmup = min(args.warmup, max(0, len(calls) - 2))
+    steady = calls[warmup:]
+    steady_fps = (len(steady) - 1) / (steady[-1] - steady[0]) if len(steady) > 1 and steady[-1] > steady[0] else 0.0
+    stages = profiling.timer.summary()
+    frame = stages.get('frame', {})
+    return {
+        'frames': camera.frames_processed,
+        'detector_calls': len(calls),
+        'seconds': elapsed,
+        'fps': camera.frames_processed / elapsed if elapsed else 0.0,
+        'steady_fps': steady_fps,
+        'latency_ms': {key: frame.get(f"{key}_ms", 0.0) for key in ('p50', 'p95', 'p99')},
+        'violations_written': writer.stats()['written'],
+        'frames_emitted': socket.messages,
+        'gating': camera.gating_stats(),
+        'frames_predicted': camera.frames_predicted,
+        'stages': {name: stats for name, stats in stages.items() if name != 'frame'},
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'baseline')},
+    }
+
+
+def check_regression(result, baseline, threshold):
+    failures = []
+    if result['steady_fps'] < baseline['steady_fps'] * (1 - threshold):
+        failures.append(f"steady fps {result['steady_fps']:.1f} < baseline {baseline['steady_fps']:.1f} - {threshold:.0%}")
+    if result['latency_ms']['p95'] > baseline['latency_ms']['p95'] * (1 + threshold):
+        failures.append(f"p95 latency {result['latency_ms']['p95']:.2f} ms > baseline {baseline['latency_ms']['p95']:.2f} ms + {threshold:.0%}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Recorded clip to replay instead of the synthetic one")
+    parser.add_argument("--frames", type=int, default=600, help="Length of the synthetic clip")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--objects", type=int, default=4, help="Moving objects in the synthetic clip")
+    parser.add_argument("--idle", type=float, default=0.0, help="Share of the synthetic clip showing an empty road")
+    parser.add_argument("--motion-gate", action="store_true", help="Skip the detector while nothing moves")
+    parser.add_argument("--roi-padding", type=int, help="Detect only around polygon and line, with this padding")
+    parser.add_argument("--max-stride", type=int, default=1, help="Adaptive detection stride up to this many frames")
+    parser.add_argument("--polygon", type=lambda v: [int(float(p)) for p in v.split(",")], help="Speed region as x1,y1,...,x4,y4")
+    parser.add_argument("--preprocess", type=json.loads, help="Preprocessing tiers as JSON, e.g. '{\"preview\": [{\"op\": \"resize\", \"scale\": 0.5}]}'")
+    parser.add_argument("--multiprocess", action="store_true", help="Decode and encode in worker processes")
+    parser.add_argument("--encoder-processes", type=int, default=2, help="Encoder processes with --multiprocess")
+    parser.add_argument("--detector-ms", type=float, default=8.0, help="Stub detector latency per batch")
+    parser.add_argument("--detector-per-frame-ms", type=float, default=0.0, help="Extra stub detector latency per frame")
+    parser.add_argument("--submodel-ms", type=float, default=5.0, help="Stub license/violation latency per batch")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait-ms", type=float, default=0)
+    parser.add_argument("--postprocess-workers", type=int, default=2)
+    parser.add_argument("--subscribers", type=int, default=1, help="Simulated stream clients")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--speed-limit", type=float, default=30)
+    parser.add_argument("--warmup", type=int, default=30, help="Frames left out of the steady-state fps")
+    parser.add_argument("--json", help="Write the result to this file")
+    parser.add_argument("--baseline", help="Result JSON of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench-pipeline-")
+    try:
+        result = run(args, folder)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{result['frames']} frames in {result['seconds']:.2f}s, steady {result['steady_fps']:.1f} fps, "
+          f"latency p50/p95/p99 {result['latency_ms']['p50']:.2f}/{result['latency_ms']['p95']:.2f}/{result['latency_ms']['p99']:.2f} ms, "
+          f"{result['violations_written']} violations written, {result['frames_emitted']} frames emitted")
+    gating = result['gating']
+    print(f"motion gate skipped {gating['frames_skipped']} frames ({gating['skipped_ratio']:.0%}, ~{gating['estimated_saved_s']:.2f}s saved), "
+          f"detector saw {gating['roi_pixel_ratio']:.0%} of each frame, {result['frames_predicted']} frames predicted")
+    print(f"{'stage':<16} {'count':>7} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in sorted(result['stages'].items(), key=lambda item: -item[1]['total_s']):
+        print(f"{name:<16} {stats['count']:7d} {stats['mean_ms']:9.3f} {stats['p50_ms']:8.3f} {stats['p95_ms']:8.3f} {stats['p99_ms']:8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = check_regression(result, json.load(f), args.threshold)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark of the vehicle search queries on a year of synthetic records.
+
+Seeds a throwaway SQLite database through the real models, indexes and
+migrations, then times ``plate_search.search_vehicles`` for typical filters.
+
+Run from the backend directory:
+
+    python benchmarks/bench_search.py --vehicles 300000
+"""
+import os
+import sys
+import argparse
+import random
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models import db, Vehicle, Violation, vehicle_violation, plate_trigram
+from plate_search import normalize_plate, trigrams, search_vehicles
+from migrations import migrate
+
+VIOLATIONS = ["No Helmet", "Overloading", "Overspeeding"]
+
+
+def random_plate(rng):
+    letters = "".join(rng.choice(string.ascii_uppercase) for _ in range(3))
+    digits = "".join(rng.choice(string.digits) for _ in range(4))
+    return f"{letters}-{digits}"
+
+
+def seed(num_vehicles, days, seed_value=0, chunk=20000):
+    rng = random.Random(seed_value)
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=days) / num_vehicles
+
+    db.session.add_all([Violation(name=name) for name in VIOLATIONS])
+    db.session.commit()
+    violation_ids = [v.id for v in Violation.query.all()]
+
+    plates = []
+    for first in range(1, num_vehicles + 1, chunk):
+        vehicles, records, grams = [], [], []
+        for vehicle_id in range(first, min(first + chunk, num_vehicles + 1)):
+            plate = random_plate(rng) if rng.random() < 0.8 else None
+            normalized = normalize_plate(plate)
+            if plate:
+                plates.append(plate)
+            vehicles.append({
+                'id': vehicle_id,
+                'image_path': f"img/motorist/{vehicle_id}.jpg",
+                'speed': round(rng.uniform(10, 90), 1),
+                'plate_text': plate,
+                'plate_confidence': 80.0 if plate else None,
+                'plate_normalized': normalized,
+            })
+            timestamp = start + step * vehicle_id
+            for violation_id in rng.sample(violation_ids, rng.choice((1, 1, 1, 2))):
+                records.append({'vehicle_id': vehicle_id, 'violation_id': violation_id, 'timestamp': timestamp})
+            grams.extend({'trigram': gram, 'vehicle_id': vehicle_id} for gram in trigrams(normalized))
+        db.session.execute(Vehicle.__table__.insert(), vehicles)
+        db.session.execute(vehicle_violation.insert(), records)
+        if grams:
+            db.session.execute(plate_trigram.insert(), grams)
+        db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+    return plates, start
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - begin)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[-1] * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=300000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(folder, 'bench.db')}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        migrate(db)
+        begin = time.perf_counter()
+        plates, start = seed(args.vehicles, args.days)
+        print(f"Seeded {args.vehicles} vehicles over {args.days} days in {time.perf_counter() - begin:.1f}s")
+
+        rng = random.Random(1)
+        plate = rng.choice(plates)
+        typo = plate[:-1] + ("0" if plate[-1] != "0" else "1")
+        week = start + timedelta(days=args.days // 2)
+        queries = {
+            "plate prefix (3 chars)": dict(plate=plate[:3]),
+            "plate prefix (full)": dict(plate=plate),
+            "plate fuzzy (1 typo)": dict(plate=typo, fuzzy=True),
+            "violation": dict(violations=["Overloading"]),
+            "violation + week": dict(violations=["No Helmet"], start=week, end=week + timedelta(days=7)),
+            "week + min speed": dict(start=week, end=week + timedelta(days=7), min_speed=70),
+            "speed range": dict(min_speed=85, max_speed=86),
+            "plate prefix + violation": dict(plate=plate[:2], violations=["Overspeeding"]),
+        }
+
+        print(f"{'query':<28} {'p50 ms':>8} {'max ms':>8} {'rows':>6}")
+        for name, kwargs in queries.items():
+            p50, worst, (rows, _) = timed(lambda: search_vehicles(db.session, limit=args.limit, **kwargs), args.repeat)
+            print(f"{name:<28} {p50:8.2f} {worst:8.2f} {len(rows):6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,324 +1,424 @@
-from models import Vehicle, Violation
-from datetime import datetime
-from ultralytics import YOLO
-from ultralytics.solutions import SpeedEstimator
+from letterbox import letterbox, unletterbox_box
+from association import associate
+from frame_grabber import FrameGrabber
+from preprocess import Preprocessor
+from camera_config import ActiveConfig, CameraConfig
+from speed import SpeedEstimator
+from motion import roi_box
+from stride import AdaptiveStride, TrackPredictor
+from tracks import TrackManager
+import profiling
+import metrics
+import logging
 import supervision as sv
 import numpy as np
 import threading
-import base64
 import time
-import torch
 import cv2
 import os
 
+logger = logging.getLogger(__name__)
+
 class Camera:
-    def __init__(self, id, name, socketio, db, app):
+    def __init__(self, id, name, source, broadcaster, db, app, main_model, license_model, violation_model, worker_pool, violation_writer, submodel_imgsz=640, frame_buffer_size=1, realtime=True, start_time=None, motion_gate=None, roi_padding=None, detection_stride=None, region_size=(7.0, 20.0), track_manager=None, config=None, grabber=None, preprocessor=None):
         self.id = id
         self.name = name
-        self.cap = cv2.VideoCapture(id)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # ✅ Reduce buffer size
-        self.cap.set(cv2.CAP_PROP_FPS, 30)  # ✅ Limit FPS if needed
-        self.main_model = YOLO("models/motorist/motocorist.pt")
-        self.main_model.to("cuda")
-        self.sub_model_1 = YOLO("models/license/licenciados_4.pt")
-        self.sub_model_1.to("cuda")
-        self.sub_model_2 = YOLO("models/violations/violaciones.pt")
-        self.sub_model_2.to("cuda")
+        self.source = source
+        # Offline runs (realtime=False) read a file once, frame by frame, as fast as the pipeline goes.
+        # A grabber with the same interface (process_pipeline.ProcessGrabber) can be passed instead
+        self.grabber = grabber or FrameGrabber(source, buffer_size=frame_buffer_size, loop=realtime, realtime=realtime, start_time=start_time)
+        self.main_model = main_model
+        self.sub_model_1 = license_model
+        self.sub_model_2 = violation_model
+        self.worker_pool = worker_pool
+        self.violation_writer = violation_writer
+        self.submodel_imgsz = submodel_imgsz
         self.app = app
-        self.socketio = socketio
+        self.broadcaster = broadcaster
         self.db = db
-        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.is_open = False
-
-        self.speed_limit = 30
+        self.frame_width = self.grabber.frame_width
+        self.frame_height = self.grabber.frame_height
+        self.is_open = True
+        self.running = False
+
+        # Optional MotionGate skipping the detector while the region of interest is still
+        self.motion_gate = motion_gate
+        # Operations applied to the detector input, the sub-model crops and the stream preview
+        self.preprocessor = preprocessor or Preprocessor()
+        self.frames_skipped = 0
+        self.roi_pixels = 0
+        self.full_pixels = 0
+        self.detect_seconds = 0.0
+        self.motion_seconds = 0.0
+
+        # Between detections of an AdaptiveStride the tracks are extrapolated by the predictor
+        self.predictor = TrackPredictor()
+        self.frames_until_detect = 0
+        self.frames_predicted = 0
+
+        # Processed frames and the rate over the last full second, for /metrics
+        self.frames_processed = 0
+        # Frames whose detector call failed, in total and in a row (for the back-off)
+        self.detect_failures = 0
+        self.failure_streak = 0
+        self.fps = 0.0
+        self.fps_window_start = None
+        self.fps_window_frames = 0
+        self.frame_seconds = metrics.registry.histogram(
+            'traffic_camera_frame_seconds', "Processing time of a frame, detection to publish.", ('camera',))
 
         self.speed_data = None
 
-        self.polygon_coords = {
-            'x1': 0, 'y1': 0,
-            'x2': 0, 'y2': self.frame_height,
-            'x3': self.frame_width, 'y3': self.frame_height,
-            'x4': self.frame_width, 'y4': 0
-        }
+        # Line, polygon, speed limit, crop padding and stride settings. A stored config wins,
+        # the constructor arguments only shape the full-frame default
+        if config is None:
+            config = CameraConfig.full_frame(self.frame_width, self.frame_height, region_size=tuple(region_size), roi_padding=roi_padding)
+            if detection_stride is not None:
+                config = config.replace(detection_stride=detection_stride)
+        self.speed_estimator = SpeedEstimator(config.polygon, *config.region_size)
 
-        self.speed_region = [
-            (self.polygon_coords['x1'], self.polygon_coords['y1']),
-            (self.polygon_coords['x2'], self.polygon_coords['y2']),
-            (self.polygon_coords['x3'], self.polygon_coords['y3']),
-            (self.polygon_coords['x4'], self.polygon_coords['y4'])
-        ]
+        self.counters = 0
 
+        # The manager evicts a lost track when the tracker drops it, so both use the same buffer
+        self.tracks = track_manager or TrackManager()
+        self.tracks.on_evict.append(self.speed_estimator.release)
+        self.tracker = sv.ByteTrack(lost_track_buffer=self.tracks.lost_track_buffer)
 
-        self.speed_estimator = SpeedEstimator(
-                                show=True,  # Display the output
-                                model="models/motorist/motocorist.pt",  # Path to the YOLO11 model file.
-                                region=self.speed_region,  # Pass region points
-                            )
+        self.line_annotation = sv.LineZoneAnnotator()
 
-        self.counters = 0
+        # Writers build a new ActiveConfig under this lock and swap it in with one assignment;
+        # the frame loop reads self.active once per frame and never takes the lock
+        self.config_lock = threading.RLock()
+        self.active = None
+        self.apply_config(config)
 
-        self.tracker = sv.ByteTrack()
+        logger.info("Camera %s violation classes: %s", self.id, self.sub_model_2.names)
 
-        self.mid_x = self.frame_width // 2
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'source': self.source, 'running': self.running, 'fps': round(self.fps, 2),
+                'frames': self.grabber.stats(), 'gating': self.gating_stats(), 'region_size_m': list(self.active.config.region_size),
+                'tracks': self.tracks.stats(), 'detect_failures': self.detect_failures,
+                'detection_stride': self.get_detection_stride(), 'preprocess': self.preprocessor.to_dict()}
 
-        self.start_point = (self.mid_x, 0)
-        self.end_point = (self.mid_x, self.frame_height)
+    def on_crossed(self, object_id, position):
+        logger.debug("Camera %s: object %s crossed the line at %s", self.id, object_id, position)
 
-        self.start, self.end = sv.Point(x=self.mid_x, y=0), sv.Point(x=self.mid_x, y=self.frame_height)
-        self.line_zone = sv.LineZone(start=self.start, end=self.end)
+    @property
+    def config(self):
+        return self.active.config
 
-        self.line_annotation = sv.LineZoneAnnotator()
+    def apply_config(self, config):
+        """
+        Makes ``config`` the camera's config.
 
-        self.lock = threading.Lock()
+        The line zone, the AdaptiveStride and the speed calibration are kept
+        when their settings did not change, so an edit of the speed limit does
+        not reset line counts or the stride. Models are never touched.
 
-        names = self.sub_model_2.names
-        print("Available sub-models:")
-        print(names)
+        :param config: New ``CameraConfig``.
+        :return: The config now in use.
+        """
+        with self.config_lock:
+            current = self.active
+            if current is not None and current.config.line == config.line:
+                line_zone = current.line_zone
+            else:
+                (x1, y1), (x2, y2) = config.line
+                line_zone = sv.LineZone(start=sv.Point(x=x1, y=y1), end=sv.Point(x=x2, y=y2))
 
-    def on_crossed(self, object_id, position):
-        print(f"Object {object_id} crossed the line at {position}!")
+            if current is not None and current.config.detection_stride == config.detection_stride:
+                stride = current.stride
+            else:
+                stride = AdaptiveStride(**config.stride_settings()) if config.detection_stride is not None else None
+
+            if current is not None and (current.config.polygon, current.config.region_size) != (config.polygon, config.region_size):
+                self.speed_estimator.set_region(config.polygon, *config.region_size)
+
+            if config.roi_padding is None:
+                roi = (0, 0, self.frame_width, self.frame_height)
+            else:
+                roi = roi_box(list(config.polygon) + list(config.line), self.frame_width, self.frame_height, config.roi_padding)
+
+            self.active = ActiveConfig(config, roi, line_zone, stride)
+            if current is not None and stride is not current.stride:
+                self.frames_until_detect = 0
+            return config
+
+    def update_config(self, **changes):
+        """ Applies a copy of the current config with ``changes``, see ``CameraConfig``. """
+        with self.config_lock:
+            return self.apply_config(self.active.config.replace(**changes))
 
     def get_line(self):
-        with self.lock:
-            print("Getting line")
-            return {'x1': self.start_point[0], 'y1': self.start_point[1], 'x2': self.end_point[0], 'y2': self.end_point[1]}
+        return self.active.config.line_coords()
 
     def set_line(self, start_x, start_y, end_x, end_y):
-        with self.lock:
-            self.start_point = (start_x, start_y)
-            self.end_point = (end_x, end_y)
-            self.start, self.end = sv.Point(x=start_x, y=start_y), sv.Point(x=end_x, y=end_y)
-            self.line_zone = sv.LineZone(start=self.start, end=self.end)
-            return {'x1': self.start_point[0], 'y1': self.start_point[1], 'x2': self.end_point[0], 'y2': self.end_point[1]}
+        return self.update_config(line=((start_x, start_y), (end_x, end_y))).line_coords()
 
     def get_polygon(self):
-        with self.lock:
-            print("Getting line")
-            return self.polygon_coords
-
-    def set_polygon(self, x1, y1, x2, y2, x3, y3, x4, y4):
-        with self.lock:
-            self.polygon_coords = {
-                'x1': x1, 'y1': y1,
-                'x2': x2, 'y2': y2,
-                'x3': x4, 'y3': y4,
-                'x4': x4, 'y4': y4
-            }
-            self.speed_region = [
-                (x1, y1),
-                (x2, y2),
-                (x3, y3),
-                (x4, y4)
-            ]
-
-            self.speed_estimator = SpeedEstimator(
-                                show=True,
-                                model="models/motorist/motocorist.pt",
-                                region=self.speed_region,
-                            )
-
-            return self.polygon_coords
+        return self.active.config.polygon_coords()
 
-    def set_speed_limit(self, speed_limit):
-        with self.lock:
-            self.speed_limit = speed_limit
-
-    def get_speed_limit(self):
-        return self.speed_limit
+    def set_polygon(self, x1, y1, x2, y2, x3, y3, x4, y4, width_m=None, length_m=None):
+        width, length = self.active.config.region_size
+        config = self.update_config(
+            polygon=((x1, y1), (x2, y2), (x3, y3), (x4, y4)),
+            region_size=(width if width_m is None else float(width_m), length if length_m is None else float(length_m)),
+        )
+        return config.polygon_coords()
 
-    def save_to_db(self, motorist_img, license_img, violations, speed):
-        if len(violations) <= 0:
-            return
-        with self.lock:
-            motorist_filename = f"Motorist_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-            motorist_filepath = os.path.join(self.app.config['UPLOAD_FOLDER'], "img", "motorist", motorist_filename)
-            cv2.imwrite(motorist_filepath, motorist_img)
-
-            license_filepath = os.path.join(self.app.config['UPLOAD_FOLDER'], "img", "license", "Capture.png")
-            if license_img is not None:
-                license_filename = f"License_{datetime.now().strftime('%Y%m%d%H%M%S')}.jpg"
-                license_filepath = os.path.join(self.app.config['UPLOAD_FOLDER'], "img", "license", license_filename)
-                cv2.imwrite(license_filepath, license_img)
-
-            with self.app.app_context():
-                vehicle = Vehicle(image_path=motorist_filepath, license_path=license_filepath, speed=speed)
-                self.db.session.add(vehicle)
-                self.db.session.commit()
-            
-                for violation_name in violations:
-                    violation = Violation.query.filter_by(name=violation_name).first()
-                    if violation:
-                        vehicle.violations.append(violation)
-                        self.db.session.commit()
-
-    def find_nearest_key(self, data_dict, target_array):
+    def gating_stats(self):
         """
-        Finds the key whose tensor values are closest to the given target array.
+        Work avoided by the motion gate and the ROI crop compared with full-frame processing.
 
-        :param data_dict: Dictionary where values are lists containing tensors.
-        :param target_array: NumPy array or list to compare against.
-        :return: The key with the closest tensor values.
+        The saved time is estimated from the mean blur, detect and track time of
+        the frames that did run, minus what the motion checks cost on every
+        frame; it is negative when the gate costs more than it saves.
         """
-        target_tensor = torch.tensor(target_array)  # Convert target to a tensor
-        closest_key = None
-        min_distance = float("inf")
-
-        for key, tensor_list in data_dict.items():
-            for tensor in tensor_list:  # Handle lists of tensors
-                tensor = tensor.squeeze()  # Remove extra dimensions if any
-                distance = torch.norm(tensor - target_tensor)  # Euclidean distance
-
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_key = key
+        detected = self.frames_processed - self.frames_skipped - self.frames_predicted
+        mean_detect = self.detect_seconds / detected if detected else 0.0
+        return {
+            'motion_gate': self.motion_gate is not None,
+            'roi': list(self.active.roi),
+            'frames_skipped': self.frames_skipped,
+            'skipped_ratio': self.frames_skipped / self.frames_processed if self.frames_processed else 0.0,
+            'roi_pixel_ratio': self.roi_pixels / self.full_pixels if self.full_pixels else 1.0,
+            'detect_ms_avg': mean_detect * 1000,
+            'motion_ms_avg': self.motion_seconds / self.frames_processed * 1000 if self.frames_processed else 0.0,
+            'motion_s': self.motion_seconds,
+            'estimated_saved_s': self.frames_skipped * mean_detect - self.motion_seconds,
+        }
 
-        return closest_key
+    def get_detection_stride(self):
+        stride = self.active.stride
+        settings = stride.to_dict() if stride else {'stride': 1}
+        return {'adaptive': stride is not None, 'frames_predicted': self.frames_predicted, **settings}
 
-    def enforce_dict_size_limit(self, data_dict, max_size=20):
+    def set_detection_stride(self, settings):
         """
-        Ensures the dictionary does not exceed max_size by removing the oldest entry.
-        
-        :param data_dict: Dictionary to manage.
-        :param max_size: Maximum allowed size of the dictionary.
+        :param settings: ``AdaptiveStride`` keyword arguments, or None to detect on every frame.
         """
-        while len(data_dict) > max_size:
-            first_key = next(iter(data_dict))  # Get the first (oldest) key
-            data_dict.pop(first_key)  # Remove it
-        return data_dict
+        self.update_config(detection_stride=settings)
+        return self.get_detection_stride()
 
-    def filter_dict_by_keys(self, a, b):
-        """
-        Removes any key in dictionary `b` that does not exist in dictionary `a`.
+    def set_speed_limit(self, speed_limit):
+        self.update_config(speed_limit=speed_limit)
 
-        :param a: Reference dictionary.
-        :param b: Dictionary to filter.
-        :return: New dictionary with only matching keys.
+    def get_speed_limit(self):
+        return self.active.config.speed_limit
+
+    def save_to_db(self, motorist_img, license_img, violations, speed, timestamp=None):
+        """
+        Hands a violation to the background writer; never blocks on disk or SQLite.
         """
-        return {key: value for key, value in b.items() if key in a}
+        if len(violations) <= 0:
+            return
+        self.violation_writer.submit(self.id, motorist_img, license_img, violations, speed, timestamp)
 
+    def process_detections(self, tracked_detections, crossed_in, crossed_out, frame, timestamp=None):
+        crossed = crossed_in | crossed_out
+        if not crossed.any():
+            return
 
-    def process_detections(self, tracked_detections, frame):
-        crossed_in, crossed_out = self.line_zone.trigger(tracked_detections)
-        track_m = {}
-        for box, track_id in zip(self.speed_estimator.boxes, self.speed_estimator.track_ids):
-            if track_id in track_m:
-                track_m[track_id].append(box)
-            else:
-                track_m[track_id] = [box]
-        track_m = self.enforce_dict_size_limit(track_m)
-        print(track_m)
-        print(self.speed_estimator.spd)
-        self.speed_estimator.trk_pp = self.filter_dict_by_keys(track_m, self.speed_estimator.trk_pp)
-        self.speed_estimator.trk_pt = self.filter_dict_by_keys(track_m, self.speed_estimator.trk_pt)
-        self.speed_estimator.spd = self.filter_dict_by_keys(track_m, self.speed_estimator.spd)
-
-        if crossed_out.any():
-            motorist_bounds = tracked_detections[crossed_out]
-            for bound in motorist_bounds:
-                coords = bound[0]
-                x1, y1, x2, y2 =  int(coords[0]), int(coords[1]), int(coords[2]), int(coords[3])
-                track_id = self.find_nearest_key(track_m, (coords[0], coords[1], coords[2], coords[3]))
-                cv2.putText(frame, f"motorist: {self.speed_estimator.tracks[0]}", (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                crop_image = frame[y1:y2, x1:x2]
-                v_speed = self.speed_estimator.spd[track_id]
-                violations = self.sub_model_2(crop_image, conf=0.5)
-                licencias = self.sub_model_1(crop_image, conf=0.5)[0]
-                license_img = licencias.boxes.xyxy.tolist()
-                if not license_img:
-                    license_img = None
-                else:
-                    x1, y1, x2, y2 = license_img[0]
-                    license_img = crop_image[int(y1):int(y2), int(x1):int(x2)]
-                names = self.sub_model_2.names
-                top_classes = []
-                for r in violations:
-                    for c in r.boxes.cls:
-                        top_classes.append(names[int(c)])
-                print("top classes", top_classes)
-                if v_speed > self.speed_limit:
-                    top_classes.append("Overspeeding")
-                if len(top_classes) > 0 and ('No_Helmet' in top_classes or 'Overloading' in top_classes or "Overspeeding" in top_classes):
-                    self.save_to_db(crop_image, license_img, [viola.replace('_', ' ') for viola in top_classes], round(v_speed.item(), 1))
-
-        if crossed_in.any():
-            motorist_bounds = tracked_detections[crossed_in]
-            for bound in motorist_bounds:
-                print("bound", bound)
-                coords = bound[0]
-                x1, y1, x2, y2 =  int(coords[0]), int(coords[1]), int(coords[2]), int(coords[3])
-                track_id = self.find_nearest_key(track_m, (coords[0], coords[1], coords[2], coords[3]))
-                cv2.putText(frame, f"motorist: {self.speed_estimator.tracks[0]}", (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                crop_image = frame[y1:y2, x1:x2]
-                v_speed = self.speed_estimator.spd[track_id]
-                violations = self.sub_model_2(crop_image, conf=0.5)
-                licencias = self.sub_model_1(crop_image, conf=0.5)[0]
-                license_img = licencias.boxes.xyxy.tolist()
-                if not license_img:
-                    license_img = None
-                else:
-                    x1, y1, x2, y2 = license_img[0]
-                    license_img = crop_image[int(y1):int(y2), int(x1):int(x2)]
-                names = self.sub_model_2.names
-                top_classes = []
-                for r in violations:
-                    for c in r.boxes.cls:
-                        top_classes.append(names[int(c)])
-                print("top classes", top_classes)
-                if v_speed > self.speed_limit:
-                    top_classes.append("Overspeeding")
-                if len(top_classes) > 0 and ('No_Helmet' in top_classes or 'Overloading' in top_classes or "Overspeeding" in top_classes):
-                    self.save_to_db(crop_image, license_img, [viola.replace('_', ' ') for viola in top_classes], round(v_speed.item(), 1))
+        crossing_detections = tracked_detections[crossed]
+        track_ids = associate(
+            crossing_detections.xyxy, crossing_detections.tracker_id,
+            tracked_detections.xyxy, tracked_detections.tracker_id
+        )
+
+        # Collect every crossing of this frame so each sub-model runs once per batch
+        with profiling.stage('crop'):
+            crossings = []
+            for coords, track_id in zip(crossing_detections.xyxy, track_ids):
+                x1, y1 = max(0, int(coords[0])), max(0, int(coords[1]))
+                x2, y2 = min(frame.shape[1], int(coords[2])), min(frame.shape[0], int(coords[3]))
+                if x2 <= x1 or y2 <= y1:
+                    continue
+                crop_image, _ = self.preprocessor.apply('crops', frame[y1:y2, x1:x2])
+                # An untouched crop is a view that would keep the whole frame alive in the writer queue
+                if np.may_share_memory(crop_image, frame):
+                    crop_image = crop_image.copy()
+                crossings.append((track_id, crop_image, (x1, y1, x2, y2)))
+
+            if not crossings:
+                return
+
+            letterboxed = [letterbox(crop_image, self.submodel_imgsz) for _, crop_image, _ in crossings]
+            canvases = [canvas for canvas, _, _ in letterboxed]
+
+        with profiling.stage('submodels'):
+            violation_futures = self.sub_model_2.submit_many(canvases)
+            license_futures = self.sub_model_1.submit_many(canvases)
+            outputs = [(violation_future.result(), license_future.result())
+                       for violation_future, license_future in zip(violation_futures, license_futures)]
+
+        # Speeds as measured on the crossing frame, the estimator has moved on since
+        speeds = dict(zip(tracked_detections.tracker_id, tracked_detections.data.get('speed', ())))
+        names = self.sub_model_2.names
+        for (track_id, crop_image, _), (_, scale, pad), (violations, licencias) in zip(crossings, letterboxed, outputs):
+            license_img = None
+            plate_boxes = licencias.boxes.xyxy.tolist()
+            if plate_boxes:
+                x1, y1, x2, y2 = unletterbox_box(plate_boxes[0], scale, pad, crop_image.shape)
+                if x2 > x1 and y2 > y1:
+                    license_img = crop_image[y1:y2, x1:x2]
+
+            top_classes = [names[int(c)] for c in violations.boxes.cls]
+            logger.debug("Camera %s track %s: %s", self.id, track_id, top_classes)
+            v_speed = speeds.get(track_id, 0.0)
+            if v_speed > self.active.config.speed_limit:
+                top_classes.append("Overspeeding")
+            if len(top_classes) > 0 and ('No_Helmet' in top_classes or 'Overloading' in top_classes or "Overspeeding" in top_classes):
+                self.save_to_db(crop_image, license_img, [viola.replace('_', ' ') for viola in top_classes], round(float(v_speed), 1), timestamp)
 
     def capture_frame(self):
         self.is_open = True
-        while True:
-            ret, frame = self.cap.read()  # Read frame
-            if not ret:
-                with self.lock:
-                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.running = True
+        try:
+            self._capture_loop()
+        finally:
+            # Also when the loop died, so /cameras and /metrics never report a dead camera as running
+            self.running = False
+
+    def _capture_loop(self):
+        while self.running:
+            grabbed = self.grabber.read(timeout=1.0)  # Newest decoded frame
+            if grabbed is None:
+                if self.grabber.is_finished:
+                    break
+                continue
+            frame, timestamp, _ = grabbed
+            frame_start = time.perf_counter()
+            # One snapshot per frame: crop, stride and line zone all belong to the same config
+            active = self.active
+            x1, y1, x2, y2 = active.roi
+            stride = active.stride
+
+            moving = True
+            if self.motion_gate is not None:
+                with profiling.stage('motion'):
+                    moving = self.motion_gate.update(frame, (x1, y1, x2, y2))
+                self.motion_seconds += time.perf_counter() - frame_start
+
+            detected = False
+            if moving and stride is not None and self.frames_until_detect > 0:
+                # Tracker-only frame: the last tracks moved along their velocities
+                with profiling.stage('predict'):
+                    tracked_detections = self.predictor.predict(timestamp)
+                self.frames_until_detect -= 1
+                self.frames_predicted += 1
+            elif moving:
+                detected = True
+                detect_start = time.perf_counter()
+                # Only the region around polygon and line is preprocessed and detected, boxes are
+                # scaled and shifted back to frame coordinates. The frame itself stays untouched
+                detector_input, (scale_x, scale_y) = self.preprocessor.apply('detector', frame[y1:y2, x1:x2])
+
+                # One detector call and one tracker update per frame drive line
+                # crossing, speed estimation and annotation alike
+                try:
+                    with profiling.stage('detect'):
+                        results = self.main_model.predict(detector_input)[0]
+                except Exception:
+                    # A failed detector (e.g. a worker process out of restarts) skips the frame
+                    # and backs off instead of killing the capture thread
+                    self.detect_failures += 1
+                    self.failure_streak += 1
+                    self.frames_until_detect = 0
+                    logger.exception("Camera %s: detection failed (%d in a row)", self.id, self.failure_streak)
+                    time.sleep(min(5.0, 0.05 * 2 ** min(self.failure_streak, 7)))
                     continue
-
-            frame = cv2.GaussianBlur(frame, (3,3), sigmaX=1, sigmaY=1)
-
-            results = None
-
-            try:
-                self.speed_estimator.estimate_speed(frame)
-                results = self.speed_estimator.tracks[0]
-                self.speed_data = self.speed_estimator.spd
-            except:
-                results = self.main_model.predict(frame)[0]
-
-            # TODO: combine speed estimator track data to Detections class
-
-            # results = self.main_model.predict(frame)[0]
-            # print("Supervision:")
-            # print(results)
-
-            # cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            # cv2.putText(frame, f"motorist: {self.speed_estimator.spd}", (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2
-
-            detections = sv.Detections.from_ultralytics(results)
-            tracked_detections = self.tracker.update_with_detections(detections)
-
-            annotated_frame = self.line_annotation.annotate(
-                frame=frame.copy(),
-                line_counter=self.line_zone
-            )
-
-            threading.Thread(target=self.process_detections, args=(tracked_detections, annotated_frame), daemon=True).start()
-
-            _, buffer = cv2.imencode('.jpg', annotated_frame)
-            img_bytes = base64.b64encode(buffer).decode('utf-8')
-            self.socketio.emit('frame', img_bytes)
-
+                self.failure_streak = 0
+                with profiling.stage('track'):
+                    detections = sv.Detections.from_ultralytics(results)
+                    if (scale_x, scale_y) != (1.0, 1.0):
+                        detections.xyxy /= np.array([scale_x, scale_y, scale_x, scale_y], dtype=detections.xyxy.dtype)
+                    if x1 or y1:
+                        detections.xyxy += np.array([x1, y1, x1, y1], dtype=detections.xyxy.dtype)
+                    tracked_detections = self.tracker.update_with_detections(detections)
+                self.detect_seconds += time.perf_counter() - detect_start
+                self.roi_pixels += (x2 - x1) * (y2 - y1)
+                self.full_pixels += frame.shape[0] * frame.shape[1]
+                if stride is not None:
+                    self.predictor.update(tracked_detections, timestamp)
+                    self.frames_until_detect = stride.update(
+                        tracked_detections, active.config.line, self.fps, self.grabber.fps, self.predictor.velocities,
+                        untracked=max(0, len(detections) - len(tracked_detections))) - 1
+
+            if moving:
+                with profiling.stage('lifecycle'):
+                    self.tracks.update(tracked_detections, timestamp, detected=detected)
+                with profiling.stage('speed'):
+                    self.speed_data = self.speed_estimator.update(tracked_detections, timestamp)
+                    tracked_detections.data['speed'] = self.speed_data
+                with profiling.stage('line_trigger'):
+                    crossed_in, crossed_out = active.line_zone.trigger(tracked_detections)
+
+                crossed = crossed_in | crossed_out
+                if crossed.any():
+                    self.worker_pool.submit(self.process_detections, tracked_detections, crossed_in, crossed_out, frame, timestamp)
+            else:
+                # Nothing moves in the region: tracks, speeds and line counts stay as they are
+                self.frames_skipped += 1
+                # The first frame after a still period is always detected
+                self.frames_until_detect = 0
+                tracked_detections = sv.Detections.empty()
+                crossed = np.zeros(0, dtype=bool)
+
+            # Annotation and encoding only happen while someone is watching
+            if self.broadcaster is not None and self.broadcaster.wants_frame(self.id):
+                preview, scale = self.preprocessor.apply('preview', frame)
+                with profiling.stage('annotate'):
+                    # Drawing on the frame itself would change the crops post-processing takes from it
+                    if preview is frame:
+                        preview = frame.copy()
+                    if scale == (1.0, 1.0):
+                        self.line_annotation.annotate(frame=preview, line_counter=active.line_zone)
+                    else:
+                        self.annotate_line(preview, active, scale)
+                    self.annotate_crossings(preview, tracked_detections[crossed], scale)
+                self.broadcaster.publish(self.id, preview)
+            elapsed = time.perf_counter() - frame_start
+            profiling.timer.record('frame', elapsed)
+            self.frame_seconds.observe(elapsed, self.id)
+            self.count_frame(frame_start)
+
+    def count_frame(self, now):
+        self.frames_processed += 1
+        if self.fps_window_start is None:
+            self.fps_window_start = now
+        self.fps_window_frames += 1
+        window = now - self.fps_window_start
+        if window >= 1.0:
+            self.fps = self.fps_window_frames / window
+            self.fps_window_start = now
+            self.fps_window_frames = 0
+
+    def annotate_line(self, frame, active, scale):
+        """ Line and counts on a resized preview, which ``LineZoneAnnotator`` cannot scale to. """
+        (x1, y1), (x2, y2) = active.config.line
+        scale_x, scale_y = scale
+        cv2.line(frame, (int(x1 * scale_x), int(y1 * scale_y)), (int(x2 * scale_x), int(y2 * scale_y)), (255, 255, 255), 2)
+        cv2.putText(frame, f"in: {active.line_zone.in_count} out: {active.line_zone.out_count}",
+                    (int(min(x1, x2) * scale_x) + 5, int(min(y1, y2) * scale_y) + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    def annotate_crossings(self, frame, detections, scale=(1.0, 1.0)):
+        if detections.tracker_id is None:
+            return
+        factors = np.array([scale[0], scale[1], scale[0], scale[1]])
+        for coords, track_id in zip(detections.xyxy * factors, detections.tracker_id):
+            x1, y1, x2, y2 = int(coords[0]), int(coords[1]), int(coords[2]), int(coords[3])
+            trail = self.tracks.trail(int(track_id)) * factors[:2]
+            if len(trail) > 1:
+                cv2.polylines(frame, [trail.astype(np.int32).reshape(-1, 1, 2)], False, (255, 0, 0), 2)
+            cv2.putText(frame, f"motorist: {track_id}", (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+    def stop(self):
+        self.running = False
 
     def release(self):
         if self.is_open:
-            self.cap.release()
+            self.grabber.release()
             self.is_open = False
     
     def __del__(self):
@@ -0,0 +1,120 @@
+from dataclasses import dataclass, replace
+import numbers
+import json
+import math
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value)
+
+
+@dataclass(frozen=True)
+class CameraConfig:
+    """
+    Immutable settings of one camera.
+
+    Updates never modify an instance: ``replace`` builds a new one that is
+    swapped in as a whole, so the frame loop can read the current config
+    without a lock and never sees half of an edit.
+
+    :param line: Counting line as ((x1, y1), (x2, y2)).
+    :param polygon: Speed region as four (x, y) points, top left, bottom left,
+        bottom right and top right as seen by the camera.
+    :param region_size: Real (width, length) of the speed region in meters.
+    :param speed_limit: Speed limit in km/h.
+    :param roi_padding: Padding of the detector crop around polygon and line, None for full frames.
+    :param detection_stride: ``AdaptiveStride`` settings as sorted (name, value)
+        pairs, None to detect on every frame.
+    """
+
+    line: tuple
+    polygon: tuple
+    region_size: tuple = (7.0, 20.0)
+    speed_limit: float = 30
+    roi_padding: object = 32
+    detection_stride: tuple = None
+
+    def __post_init__(self):
+        # Every new config passes here (replace and with_json included), so a bad
+        # value is refused before it reaches the frame loop or the database
+        for name, points, count in (('line', self.line, 2), ('polygon', self.polygon, 4)):
+            if len(points) != count or not all(len(point) == 2 and all(map(_is_number, point)) for point in points):
+                raise ValueError(f"{name} must be {count} (x, y) points with numeric coordinates")
+        if len(self.region_size) != 2 or not all(_is_number(value) and value > 0 for value in self.region_size):
+            raise ValueError("region_size must be two positive numbers")
+        if not _is_number(self.speed_limit) or self.speed_limit <= 0:
+            raise ValueError("speed_limit must be a positive number")
+        if self.roi_padding is not None and (not isinstance(self.roi_padding, numbers.Integral) or isinstance(self.roi_padding, bool) or self.roi_padding < 0):
+            raise ValueError("roi_padding must be a non-negative integer or None")
+
+    @classmethod
+    def full_frame(cls, width, height, **settings):
+        """ Default config: a vertical line through the middle and the whole frame as speed region. """
+        mid_x = width // 2
+        return cls(
+            line=((mid_x, 0), (mid_x, height)),
+            polygon=((0, 0), (0, height), (width, height), (width, 0)),
+            **settings,
+        )
+
+    def replace(self, **changes):
+        if 'detection_stride' in changes and isinstance(changes['detection_stride'], dict):
+            changes['detection_stride'] = tuple(sorted(changes['detection_stride'].items()))
+        return replace(self, **changes)
+
+    def stride_settings(self):
+        return dict(self.detection_stride) if self.detection_stride is not None else None
+
+    def line_coords(self):
+        (x1, y1), (x2, y2) = self.line
+        return {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+
+    def polygon_coords(self):
+        coords = {}
+        for index, (x, y) in enumerate(self.polygon, start=1):
+            coords[f'x{index}'] = x
+            coords[f'y{index}'] = y
+        return coords
+
+    def to_json(self):
+        return json.dumps({
+            'line': self.line,
+            'polygon': self.polygon,
+            'region_size': self.region_size,
+            'speed_limit': self.speed_limit,
+            'roi_padding': self.roi_padding,
+            'detection_stride': self.stride_settings(),
+        })
+
+    def with_json(self, text):
+        """
+        :param text: JSON written by ``to_json``; fields it lacks keep this config's values.
+        :return: New config.
+        """
+        data = json.loads(text)
+        changes = {}
+        if 'line' in data:
+            changes['line'] = tuple(tuple(point) for point in data['line'])
+        if 'polygon' in data:
+            changes['polygon'] = tuple(tuple(point) for point in data['polygon'])
+        if 'region_size' in data:
+            changes['region_size'] = tuple(data['region_size'])
+        for key in ('speed_limit', 'roi_padding', 'detection_stride'):
+            if key in data:
+                changes[key] = data[key]
+        return self.replace(**changes)
+
+
+@dataclass(frozen=True)
+class ActiveConfig:
+    """
+    A camera's config together with the runtime objects derived from it.
+
+    Swapped as one reference, so the line zone, crop and stride used on a
+    frame always belong to the same config.
+    """
+
+    config: CameraConfig
+    roi: tuple
+    line_zone: object
+    stride: object
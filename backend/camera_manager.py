@@ -0,0 +1,486 @@
+from process_pipeline import FrameEncoder, ProcessGrabber, ProcessModel, RestartPolicy
+from frame_broadcaster import FrameBroadcaster
+from inference_server import InferenceServer
+from evidence_store import EvidenceStore
+from violation_writer import ViolationWriter
+from inference_backend import ModelExporter, load_model
+from plate_reader import PlateReader
+from preprocess import Preprocessor
+from motion import MotionGate
+from tracks import TrackManager
+from worker_pool import WorkerPool
+from models import CameraSettings
+from camera import Camera
+import threading
+import metrics
+import logging
+import pytz
+import uuid
+import re
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+MAIN_MODEL_PATH = "models/motorist/motocorist.pt"
+LICENSE_MODEL_PATH = "models/license/licenciados_4.pt"
+VIOLATION_MODEL_PATH = "models/violations/violaciones.pt"
+
+
+def thread_group(name):
+    """ Thread name without its per-instance suffix, e.g. ``postprocess-3`` -> ``postprocess``. """
+    if name.startswith(("camera-", "grabber-")):
+        return name.split("-", 1)[0]
+    return re.sub(r"([-_]\d+)+( \(.*\))?$", "", name)
+
+
+class SharedModel:
+    """
+    Thread-safe handle to a YOLO model that is shared between cameras.
+
+    Ultralytics predictors keep per-call state, so concurrent calls on the same
+    instance are serialized with a lock.
+    """
+
+    def __init__(self, path, backend="torch", device="auto", imgsz=640, int8=False, exporter=None):
+        """
+        :param path: Path of the ``.pt`` weights.
+        :param backend: ``torch``, ``onnx`` or ``openvino``, see ``inference_backend``.
+        :param device: Device name, or ``auto`` to use a GPU when there is one.
+        :param imgsz: Input size of exported models.
+        :param int8: Use an int8 quantized export.
+        :param exporter: ModelExporter used for onnx/openvino.
+        """
+        self.path = path
+        self.backend = backend
+        self.int8 = int8
+        self.model, self.device = load_model(path, backend, device, imgsz, int8, exporter)
+        self.lock = threading.Lock()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def predict(self, source, **kwargs):
+        kwargs.setdefault('device', self.device)
+        with self.lock:
+            return self.model.predict(source, **kwargs)
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+
+class ModelRegistry:
+    """
+    Loads each weights file once and hands out the shared instance.
+
+    With ``processes`` every model is loaded in a worker process of its own
+    (``process_pipeline.ProcessModel``) instead of in this process.
+    """
+
+    def __init__(self, backend="torch", device="auto", int8=False, exporter=None, processes=False, restart_policy=RestartPolicy):
+        """
+        :param processes: Run each model in a worker process.
+        :param restart_policy: Callable returning the RestartPolicy of a model process.
+        """
+        self.backend = backend
+        self.device = device
+        self.int8 = int8
+        self.exporter = exporter
+        self.processes = processes
+        self.restart_policy = restart_policy
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get(self, path, imgsz=640, batch_size=16, frame_bytes=1920 * 1080 * 3):
+        """
+        :param batch_size: Most frames per call, sizes the shared memory of a model process.
+        :param frame_bytes: Initial frame slot size of a model process, grown on demand.
+        """
+        with self.lock:
+            if path not in self.models:
+                logger.info("Loading model %s (backend=%s, device=%s, int8=%s, process=%s)", path, self.backend, self.device, self.int8, self.processes)
+                if self.processes:
+                    self.models[path] = ProcessModel(path, self.backend, self.device, imgsz, self.int8, self.exporter,
+                                                     slots=batch_size, slot_bytes=frame_bytes, restart_policy=self.restart_policy())
+                else:
+                    self.models[path] = SharedModel(path, self.backend, self.device, imgsz, self.int8, self.exporter)
+            return self.models[path]
+
+    def shutdown(self):
+        with self.lock:
+            for model in self.models.values():
+                if isinstance(model, ProcessModel):
+                    model.shutdown()
+
+    def describe(self):
+        with self.lock:
+            return {path: {'backend': m.backend, 'device': m.device, 'int8': m.int8} for path, m in self.models.items()}
+
+
+class CameraManager:
+    """
+    Registry of running camera pipelines.
+
+    Every camera gets its own capture thread while the detector, license and
+    violation models are loaded once and shared through a ``ModelRegistry``.
+    Detector calls from all cameras go through one micro-batching
+    ``InferenceServer`` and post-processing runs on one bounded ``WorkerPool``.
+    The license and violation models get batching servers of their own so the
+    crops of every crossing in a frame (and, with a non-zero window, of
+    crossings shortly after) share one forward pass.
+
+    In multiprocess mode (``MULTIPROCESS``) every camera decodes in a process
+    of its own, each model runs in a worker process and JPEG encoding is
+    spread over ``ENCODER_PROCESSES`` processes. Frames cross process
+    boundaries through shared memory; crashed workers are restarted as the
+    ``WORKER_MAX_RESTARTS``/``WORKER_RESTART_WINDOW`` policy allows.
+    """
+
+    def __init__(self, socketio, db, app):
+        self.socketio = socketio
+        self.db = db
+        self.app = app
+        self.multiprocess = app.config.get('MULTIPROCESS', False)
+        width, height = app.config.get('MULTIPROCESS_FRAME_SIZE', (1920, 1080))
+        self.frame_slot_bytes = width * height * 3
+        self.encoder = FrameEncoder(
+            workers=app.config.get('ENCODER_PROCESSES', 2),
+            slot_bytes=self.frame_slot_bytes,
+            restart_policy=self.restart_policy,
+        ) if self.multiprocess else None
+        self.broadcaster = FrameBroadcaster(socketio, encoder=self.encoder)
+        self.models = ModelRegistry(
+            backend=app.config.get('INFERENCE_BACKEND', 'torch'),
+            device=app.config.get('INFERENCE_DEVICE', 'auto'),
+            int8=app.config.get('INFERENCE_INT8', False),
+            exporter=ModelExporter(
+                cache_dir=app.config.get('INFERENCE_CACHE_DIR', 'models/.cache'),
+                calibration_dir=app.config.get('INFERENCE_CALIBRATION_DIR'),
+                calibration_size=app.config.get('INFERENCE_CALIBRATION_SIZE', 100),
+            ),
+            processes=self.multiprocess,
+            restart_policy=self.restart_policy,
+        )
+        self.inference_server = InferenceServer(
+            self.models.get(MAIN_MODEL_PATH, batch_size=app.config.get('INFERENCE_MAX_BATCH_SIZE', 8), frame_bytes=self.frame_slot_bytes),
+            max_batch_size=app.config.get('INFERENCE_MAX_BATCH_SIZE', 8),
+            max_wait_ms=app.config.get('INFERENCE_MAX_WAIT_MS', 10),
+            predict_kwargs={'conf': app.config.get('DETECTOR_CONF', 0.25)},
+            name="detector",
+        )
+        self.submodel_imgsz = app.config.get('SUBMODEL_IMGSZ', 640)
+        submodel_batching = {
+            'max_batch_size': app.config.get('SUBMODEL_MAX_BATCH_SIZE', 16),
+            'max_wait_ms': app.config.get('SUBMODEL_BATCH_WINDOW_MS', 0),
+            'predict_kwargs': {'conf': 0.5, 'imgsz': self.submodel_imgsz},
+        }
+        # Sub-models only ever see letterboxed imgsz x imgsz crops
+        submodel_slots = {'batch_size': submodel_batching['max_batch_size'], 'frame_bytes': self.submodel_imgsz ** 2 * 3}
+        self.license_server = InferenceServer(self.models.get(LICENSE_MODEL_PATH, self.submodel_imgsz, **submodel_slots), name="license", **submodel_batching)
+        self.violation_server = InferenceServer(self.models.get(VIOLATION_MODEL_PATH, self.submodel_imgsz, **submodel_slots), name="violation", **submodel_batching)
+        self.evidence_store = EvidenceStore(
+            app.config['UPLOAD_FOLDER'],
+            max_cache_bytes=app.config.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        )
+        self.plate_reader = PlateReader(
+            app,
+            db,
+            self.evidence_store,
+            workers=app.config.get('OCR_WORKERS', 2),
+            tesseract_cmd=app.config.get('TESSERACT_CMD'),
+            tesseract_config=app.config.get('TESSERACT_CONFIG', '--psm 6'),
+        )
+        self.violation_writer = ViolationWriter(
+            app,
+            db,
+            self.evidence_store,
+            plate_reader=self.plate_reader,
+            rollup_timezone=pytz.timezone(app.config.get('REPORT_TIMEZONE', 'UTC')),
+            batch_size=app.config.get('VIOLATION_WRITER_BATCH_SIZE', 32),
+            flush_interval=app.config.get('VIOLATION_WRITER_FLUSH_INTERVAL', 0.5),
+            io_workers=app.config.get('VIOLATION_WRITER_IO_WORKERS', 4),
+        )
+        self.worker_pool = WorkerPool(
+            num_workers=app.config.get('POSTPROCESS_WORKERS', 4),
+            max_queue_size=app.config.get('POSTPROCESS_QUEUE_SIZE', 64),
+            overflow_policy=app.config.get('POSTPROCESS_OVERFLOW_POLICY', 'drop_oldest'),
+            name="postprocess",
+        )
+        self.cameras = {}
+        self.threads = {}
+        # Ids of cameras being added, see add_camera
+        self.reserved = set()
+        self.lock = threading.Lock()
+        metrics.registry.register_collector(self.collect_metrics)
+
+    def add_camera(self, source, name=None, camera_id=None, preprocess=None):
+        """
+        Creates a camera pipeline and starts its capture thread.
+
+        :param source: Device index, file path or stream URL passed to OpenCV.
+        :param name: Display name of the camera.
+        :param camera_id: Optional identifier, generated when omitted.
+        :param preprocess: Preprocessing tiers of this camera, ``PREPROCESS`` when None.
+        :return: The started Camera.
+        """
+        camera_id = str(camera_id or uuid.uuid4().hex[:8])
+        # The id is reserved until the camera is inserted, so a concurrent add with
+        # the same id fails here instead of overwriting this one
+        with self.lock:
+            if camera_id in self.cameras or camera_id in self.reserved:
+                raise ValueError(f"Camera '{camera_id}' already exists")
+            self.reserved.add(camera_id)
+
+        grabber = None
+        try:
+            preprocessor = Preprocessor(preprocess if preprocess is not None else self.app.config.get('PREPROCESS'))
+            if self.multiprocess:
+                grabber = ProcessGrabber(source, buffer_size=self.app.config.get('FRAME_BUFFER_SIZE', 1), restart_policy=self.restart_policy())
+            camera = Camera(
+                camera_id,
+                name or camera_id,
+                source,
+                self.broadcaster,
+                self.db,
+                self.app,
+                main_model=self.inference_server,
+                license_model=self.license_server,
+                violation_model=self.violation_server,
+                worker_pool=self.worker_pool,
+                violation_writer=self.violation_writer,
+                submodel_imgsz=self.submodel_imgsz,
+                frame_buffer_size=self.app.config.get('FRAME_BUFFER_SIZE', 1),
+                motion_gate=self.create_motion_gate(),
+                region_size=(self.app.config.get('SPEED_REGION_WIDTH_M', 7.0), self.app.config.get('SPEED_REGION_LENGTH_M', 20.0)),
+                track_manager=TrackManager(
+                    lost_track_buffer=self.app.config.get('TRACK_LOST_BUFFER', 30),
+                    ttl=self.app.config.get('TRACK_TTL', 10.0),
+                    history=self.app.config.get('TRACK_HISTORY', 32),
+                    max_tracks=self.app.config.get('TRACK_MAX', 256),
+                ),
+                roi_padding=self.app.config.get('ROI_PADDING', 32),
+                detection_stride=self.detection_stride_settings() if self.app.config.get('DETECTION_STRIDE_ADAPTIVE', False) else None,
+                preprocessor=preprocessor,
+                grabber=grabber,
+            )
+            grabber = camera.grabber
+            stored = self.load_config(camera_id)
+            if stored is not None:
+                try:
+                    camera.apply_config(camera.config.with_json(stored))
+                except (ValueError, TypeError) as e:
+                    logger.warning("Ignoring stored config of camera %s: %s", camera_id, e)
+        except Exception:
+            # The source is opened while the camera is built, it must not outlive a failed add
+            if grabber is not None:
+                grabber.release()
+            with self.lock:
+                self.reserved.discard(camera_id)
+            raise
+        thread = threading.Thread(target=camera.capture_frame, name=f"camera-{camera_id}", daemon=True)
+
+        with self.lock:
+            self.reserved.discard(camera_id)
+            self.cameras[camera_id] = camera
+            self.threads[camera_id] = thread
+        thread.start()
+        return camera
+
+    def restart_policy(self):
+        return RestartPolicy(
+            max_restarts=self.app.config.get('WORKER_MAX_RESTARTS', 5),
+            window=self.app.config.get('WORKER_RESTART_WINDOW', 60.0),
+        )
+
+    def create_motion_gate(self):
+        if not self.app.config.get('MOTION_GATE', True):
+            return None
+        return MotionGate(
+            threshold=self.app.config.get('MOTION_THRESHOLD', 25),
+            min_area=self.app.config.get('MOTION_MIN_AREA', 0.002),
+            hold_frames=self.app.config.get('MOTION_HOLD_FRAMES', 15),
+        )
+
+    def load_config(self, camera_id):
+        """ :return: Stored config JSON of a camera, None when it was never saved. """
+        with self.app.app_context():
+            settings = self.db.session.get(CameraSettings, camera_id)
+            return settings.config if settings else None
+
+    def save_config(self, camera):
+        """ Stores the camera's current config so a restart does not reset it. """
+        with self.app.app_context():
+            settings = self.db.session.get(CameraSettings, camera.id)
+            if settings is None:
+                settings = CameraSettings(camera_id=camera.id, config=camera.config.to_json())
+                self.db.session.add(settings)
+            else:
+                settings.config = camera.config.to_json()
+            self.db.session.commit()
+
+    def detection_stride_settings(self, **settings):
+        """
+        :param settings: AdaptiveStride arguments overriding the configured defaults.
+        :return: Complete AdaptiveStride arguments.
+        """
+        defaults = {
+            'min_stride': self.app.config.get('DETECTION_MIN_STRIDE', 1),
+            'max_stride': self.app.config.get('DETECTION_MAX_STRIDE', 4),
+            'target_fps': self.app.config.get('DETECTION_TARGET_FPS'),
+            'near_line': self.app.config.get('DETECTION_NEAR_LINE', 80),
+            'busy_tracks': self.app.config.get('DETECTION_BUSY_TRACKS', 8),
+        }
+        return {**defaults, **settings}
+
+    def remove_camera(self, camera_id):
+        """
+        Stops a camera's capture thread and releases its source.
+
+        :param camera_id: Identifier of the camera to remove.
+        :return: True if the camera existed.
+        """
+        with self.lock:
+            camera = self.cameras.pop(camera_id, None)
+            thread = self.threads.pop(camera_id, None)
+        if camera is None:
+            return False
+        camera.stop()
+        if thread is not None:
+            thread.join(timeout=5)
+        camera.release()
+        return True
+
+    def get(self, camera_id=None):
+        """
+        Returns the camera with the given id, or the first camera when no id is given.
+        """
+        with self.lock:
+            if camera_id is None:
+                return next(iter(self.cameras.values()), None)
+            return self.cameras.get(camera_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.cameras.values())
+
+    def worker_stats(self):
+        """ Liveness and restarts of the worker processes, empty unless in multiprocess mode. """
+        if not self.multiprocess:
+            return {}
+        workers = {f"decoder-{camera.id}": {'alive': camera.grabber.process.is_alive(), 'restarts': camera.grabber.restarts}
+                   for camera in self.list() if isinstance(camera.grabber, ProcessGrabber)}
+        with self.models.lock:
+            models = list(self.models.models.values())
+        workers.update({model.worker.name: model.worker.stats() for model in models if isinstance(model, ProcessModel)})
+        workers.update(self.encoder.stats())
+        return workers
+
+    def collect_metrics(self):
+        """
+        Counters and gauges read from the pipeline components when ``/metrics`` is scraped.
+
+        :return: ``(name, type, help, samples)`` tuples for ``metrics.Registry``.
+        """
+        cameras = self.list()
+        gating = [(camera.id, camera.gating_stats()) for camera in cameras]
+        tracks = [(camera.id, camera.tracks.stats()) for camera in cameras]
+        grabbers = [(camera.id, camera.grabber.stats()) for camera in cameras]
+        servers = [(server.name, server.stats()) for server in (self.inference_server, self.license_server, self.violation_server)]
+        pool = self.worker_pool.stats()
+        writer = self.violation_writer.stats()
+        stream = self.broadcaster.stats()
+        ocr = self.plate_reader.stats()
+        workers = self.worker_stats()
+
+        thread_groups = {}
+        for thread in threading.enumerate():
+            group = thread_group(thread.name)
+            thread_groups[group] = thread_groups.get(group, 0) + 1
+
+        return [
+            ('traffic_camera_fps', 'gauge', "Frames processed per second over the last second.",
+             [({'camera': camera.id}, camera.fps) for camera in cameras]),
+            ('traffic_camera_running', 'gauge', "Whether the capture loop is running.",
+             [({'camera': camera.id}, camera.running) for camera in cameras]),
+            ('traffic_camera_frames_processed_total', 'counter', "Frames run through the pipeline.",
+             [({'camera': camera.id}, camera.frames_processed) for camera in cameras]),
+            ('traffic_camera_detect_failures_total', 'counter', "Frames skipped because the detector call failed.",
+             [({'camera': camera.id}, camera.detect_failures) for camera in cameras]),
+            ('traffic_camera_frames_captured_total', 'counter', "Frames decoded from the source.",
+             [({'camera': camera_id}, stats['captured']) for camera_id, stats in grabbers]),
+            ('traffic_camera_frames_dropped_total', 'counter', "Frames overwritten in the buffer before being processed.",
+             [({'camera': camera_id}, stats['dropped']) for camera_id, stats in grabbers]),
+            ('traffic_camera_frames_late_total', 'counter', "Frames skipped for being older than the allowed age.",
+             [({'camera': camera_id}, stats['late']) for camera_id, stats in grabbers]),
+            ('traffic_camera_frames_predicted_total', 'counter', "Frames whose tracks were extrapolated instead of detected.",
+             [({'camera': camera.id}, camera.frames_predicted) for camera in cameras]),
+            ('traffic_camera_detection_stride', 'gauge', "Frames between detector runs.",
+             [({'camera': camera.id}, camera.active.stride.stride if camera.active.stride else 1) for camera in cameras]),
+            ('traffic_camera_frames_skipped_total', 'counter', "Frames the motion gate kept from the detector.",
+             [({'camera': camera_id}, stats['frames_skipped']) for camera_id, stats in gating]),
+            ('traffic_camera_roi_pixel_ratio', 'gauge', "Share of the frame the detector runs on.",
+             [({'camera': camera_id}, stats['roi_pixel_ratio']) for camera_id, stats in gating]),
+            ('traffic_camera_detect_saved_seconds', 'counter', "Estimated blur, detect and track time saved by the motion gate.",
+             [({'camera': camera_id}, stats['estimated_saved_s']) for camera_id, stats in gating]),
+            ('traffic_tracks', 'gauge', "Track records held, by state.",
+             [({'camera': camera_id, 'state': state}, stats[state]) for camera_id, stats in tracks for state in ('tracked', 'lost')]),
+            ('traffic_tracks_evicted_total', 'counter', "Track records evicted after being lost or expiring.",
+             [({'camera': camera_id}, stats['evicted']) for camera_id, stats in tracks]),
+            ('traffic_tracks_high_water', 'gauge', "Most track records held at once.",
+             [({'camera': camera_id}, stats['high_water']) for camera_id, stats in tracks]),
+            ('traffic_tracks_high_water_bytes', 'gauge', "Approximate memory of the track records at the high-water mark.",
+             [({'camera': camera_id}, stats['high_water_bytes']) for camera_id, stats in tracks]),
+            ('traffic_inference_queue_depth', 'gauge', "Requests waiting for a batch.",
+             [({'model': name}, stats['queue_depth']) for name, stats in servers]),
+            ('traffic_inference_frames_total', 'counter', "Frames run through the model.",
+             [({'model': name}, stats['frames']) for name, stats in servers]),
+            ('traffic_postprocess_queue_depth', 'gauge', "Crossing jobs waiting for a worker.",
+             [({}, pool['queue_depth'])]),
+            ('traffic_postprocess_jobs_total', 'counter', "Crossing jobs by outcome.",
+             [({'outcome': outcome}, pool[outcome]) for outcome in ('processed', 'failed', 'dropped')]),
+            ('traffic_violation_queue_depth', 'gauge', "Violations waiting to be written.",
+             [({}, writer['queue_depth'])]),
+            ('traffic_violations_total', 'counter', "Violation events by outcome.",
+             [({'outcome': outcome}, writer[outcome]) for outcome in ('written', 'failed', 'dropped')]),
+            ('traffic_stream_subscribers', 'gauge', "Socket clients subscribed to a camera stream.",
+             [({'camera': camera.id}, self.broadcaster.subscriber_count(camera.id)) for camera in cameras]),
+            ('traffic_stream_frames_sent_total', 'counter', "Frames emitted to socket clients.",
+             [({}, stream['sent'])]),
+            ('traffic_stream_bytes_sent_total', 'counter', "Encoded bytes emitted to socket clients.",
+             [({}, stream['bytes_sent'])]),
+            ('traffic_ocr_pending', 'gauge', "Plate reads queued or running.",
+             [({}, ocr['pending'])]),
+            ('traffic_ocr_reads_total', 'counter', "Plate reads by outcome.",
+             [({'outcome': outcome}, ocr[outcome]) for outcome in ('completed', 'failed')]),
+            ('traffic_threads', 'gauge', "Live threads by name prefix.",
+             [({'group': group}, count) for group, count in sorted(thread_groups.items())]),
+            ('traffic_worker_process_up', 'gauge', "Whether a worker process is alive, multiprocess mode only.",
+             [({'worker': name}, stats['alive']) for name, stats in sorted(workers.items())]),
+            ('traffic_worker_process_restarts_total', 'counter', "Restarts of a worker process after it crashed.",
+             [({'worker': name}, stats['restarts']) for name, stats in sorted(workers.items())]),
+        ] + self.process_metrics()
+
+    def process_metrics(self):
+        if resource is None:
+            return []
+        # ru_maxrss is in kilobytes on Linux
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return [('traffic_process_max_rss_bytes', 'gauge', "Peak resident memory of the server process.", [({}, max_rss)])]
+
+    def shutdown(self):
+        metrics.registry.unregister_collector(self.collect_metrics)
+        for camera in self.list():
+            self.remove_camera(camera.id)
+        self.inference_server.shutdown()
+        self.license_server.shutdown()
+        self.violation_server.shutdown()
+        self.worker_pool.shutdown()
+        self.violation_writer.shutdown()
+        self.plate_reader.shutdown()
+        self.models.shutdown()
+        if self.encoder is not None:
+            self.encoder.shutdown()
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import hashlib
+import logging
+import time
+import cv2
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class EvidenceStore:
+    """
+    Content-addressed storage for evidence images.
+
+    Images are stored as ``img/<kind>/YYYY/MM/DD/<h[:2]>/<sha256>.jpg`` under
+    ``root``, so names never collide and no directory grows without bound.
+    Thumbnails are generated on first request and kept in an on-disk cache
+    that is trimmed least-recently-used first once it exceeds
+    ``max_cache_bytes``.
+    """
+
+    def __init__(self, root, cache_dir=None, max_cache_bytes=256 * 1024 * 1024, jpeg_quality=95):
+        """
+        :param root: Folder that stored paths are relative to (the upload folder).
+        :param cache_dir: Folder of the thumbnail cache, defaults to ``<root>/cache/thumbs``.
+        :param max_cache_bytes: Size limit of the thumbnail cache.
+        :param jpeg_quality: JPEG quality of stored evidence.
+        """
+        self.root = root
+        self.cache_dir = cache_dir or os.path.join(root, "cache", "thumbs")
+        self.max_cache_bytes = max_cache_bytes
+        self.jpeg_quality = jpeg_quality
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_cache()
+
+    def _load_cache(self):
+        entries = []
+        for folder, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, path, stat.st_size))
+        for _, path, size in sorted(entries):
+            self.cache[path] = size
+            self.cache_bytes += size
+        self._evict()
+
+    def put(self, kind, image, timestamp=None):
+        """
+        Encodes and stores an image unless identical content is already stored.
+
+        :param kind: Evidence category, e.g. ``motorist`` or ``license``.
+        :param image: BGR image.
+        :param timestamp: Capture time used for the date shard, defaults to now.
+        :return: Path relative to ``root``.
+        """
+        return self.store(kind, image, timestamp)[0]
+
+    def store(self, kind, image, timestamp=None):
+        """
+        Like ``put``, but also tells whether the file was written by this call.
+
+        :return: Tuple of (path relative to ``root``, True if the file is new).
+            Only new files may be discarded again, an existing one can be
+            referenced by stored records.
+        """
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise IOError(f"Could not encode {kind} image")
+        data = buffer.tobytes()
+        digest = hashlib.sha256(data).hexdigest()
+        day = datetime.fromtimestamp(timestamp or time.time())
+
+        relative = os.path.join("img", kind, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"), digest[:2], f"{digest}.jpg")
+        path = os.path.join(self.root, relative)
+        if os.path.exists(path):
+            return relative, False
+        self._write_atomic(path, data)
+        return relative, True
+
+    def discard(self, relative):
+        """ Removes a stored image, e.g. one written for records that were never committed. """
+        try:
+            os.remove(self.path(relative))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not remove evidence %s", relative)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def path(self, relative):
+        return os.path.join(self.root, relative)
+
+    def thumbnail(self, relative, size):
+        """
+        Returns the path of a cached thumbnail, generating it if needed.
+
+        :param relative: Stored path of the source image.
+        :param size: Longest side of the thumbnail in pixels.
+        :return: Absolute path of the thumbnail, or None if the source is missing.
+        """
+        key = hashlib.sha1(f"{relative}:{size}".encode("utf-8")).hexdigest()
+        thumb_path = os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+        with self.lock:
+            if thumb_path in self.cache and os.path.exists(thumb_path):
+                self.cache.move_to_end(thumb_path)
+                return thumb_path
+
+        image = cv2.imread(self.path(relative))
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        scale = size / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ok:
+            return None
+        self._write_atomic(thumb_path, buffer.tobytes())
+
+        with self.lock:
+            self.cache_bytes -= self.cache.pop(thumb_path, 0)
+            self.cache[thumb_path] = os.path.getsize(thumb_path)
+            self.cache_bytes += self.cache[thumb_path]
+            self._evict(keep=thumb_path)
+        return thumb_path
+
+    def _evict(self, keep=None):
+        while self.cache_bytes > self.max_cache_bytes and self.cache:
+            path, size = next(iter(self.cache.items()))
+            if path == keep:
+                break
+            self.cache.popitem(last=False)
+            self.cache_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                logger.warning("Could not evict thumbnail %s", path)
+
+    def stats(self):
+        with self.lock:
+            return {'thumbnails': len(self.cache), 'cache_bytes': self.cache_bytes, 'max_cache_bytes': self.max_cache_bytes}
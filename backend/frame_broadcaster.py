@@ -0,0 +1,158 @@
+import profiling
+import threading
+import time
+import cv2
+
+# Output size as a fraction of the source frame
+TIERS = {
+    'full': 1.0,
+    'half': 0.5,
+    'thumbnail': 0.25,
+}
+
+
+def resize_frame(frame, scale):
+    if scale >= 1.0:
+        return frame
+    height, width = frame.shape[:2]
+    return cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+def encode_frame(frame, jobs):
+    """
+    JPEG-encodes a frame once per requested output.
+
+    :param jobs: List of (scale, quality) pairs.
+    :return: Encoded bytes, one per job. Each scale is resized only once.
+    """
+    resized = {}
+    payloads = []
+    for scale, quality in jobs:
+        if scale not in resized:
+            resized[scale] = resize_frame(frame, scale)
+        _, buffer = cv2.imencode('.jpg', resized[scale], [cv2.IMWRITE_JPEG_QUALITY, quality])
+        payloads.append(buffer.tobytes())
+    return payloads
+
+
+class Subscription:
+    __slots__ = ('sid', 'camera_id', 'tier', 'quality', 'max_fps', 'last_sent')
+
+    def __init__(self, sid, camera_id, tier, quality, max_fps):
+        self.sid = sid
+        self.camera_id = camera_id
+        self.tier = tier
+        self.quality = quality
+        self.max_fps = max_fps
+        self.last_sent = 0.0
+
+    def to_dict(self):
+        return {'camera_id': self.camera_id, 'tier': self.tier, 'quality': self.quality, 'max_fps': self.max_fps}
+
+
+class FrameBroadcaster:
+    """
+    Fans processed frames out to socket clients as binary JPEG payloads.
+
+    Each client picks a camera, a resolution tier, a JPEG quality and a frame
+    rate cap. A frame is resized and encoded at most once per (tier, quality)
+    pair and the same bytes are sent to every client that asked for it. When a
+    camera has no subscribers nothing is encoded at all.
+
+    With an ``encoder`` (see ``process_pipeline.FrameEncoder``) encoding runs
+    in worker processes; frames are still emitted from this process, which
+    owns the sockets.
+    """
+
+    def __init__(self, socketio, event='frame', encoder=None):
+        self.socketio = socketio
+        self.event = event
+        self.encoder = encoder
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.encoded = 0
+        self.sent = 0
+        self.bytes_sent = 0
+
+    def subscribe(self, sid, camera_id, tier='full', quality=95, max_fps=30):
+        """
+        Registers or updates the stream settings of a client.
+
+        :param sid: Socket session id.
+        :param camera_id: Camera to stream.
+        :param tier: One of ``full``, ``half`` or ``thumbnail``.
+        :param quality: JPEG quality between 1 and 100.
+        :param max_fps: Highest frame rate sent to this client.
+        :return: The stored Subscription.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}', expected one of {tuple(TIERS)}")
+        subscription = Subscription(sid, camera_id, tier, min(100, max(1, int(quality))), max(0.1, float(max_fps)))
+        with self.lock:
+            self.subscriptions[sid] = subscription
+        return subscription
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            return self.subscriptions.pop(sid, None)
+
+    def get(self, sid):
+        with self.lock:
+            return self.subscriptions.get(sid)
+
+    def has_subscribers(self, camera_id):
+        with self.lock:
+            return any(s.camera_id == camera_id for s in self.subscriptions.values())
+
+    def wants_frame(self, camera_id):
+        """
+        Tells whether any subscriber of the camera is due a frame, so callers
+        can skip annotating frames that would not be sent.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return any(s.camera_id == camera_id and now - s.last_sent >= 1.0 / s.max_fps
+                       for s in self.subscriptions.values())
+
+    def subscriber_count(self, camera_id=None):
+        with self.lock:
+            return sum(1 for s in self.subscriptions.values() if camera_id is None or s.camera_id == camera_id)
+
+    def publish(self, camera_id, frame):
+        """
+        Sends a frame to the subscribers of a camera whose frame rate cap allows it.
+
+        :return: Number of clients the frame was sent to.
+        """
+        now = time.monotonic()
+        with self.lock:
+            due = [s for s in self.subscriptions.values()
+                   if s.camera_id == camera_id and now - s.last_sent >= 1.0 / s.max_fps]
+            for subscription in due:
+                subscription.last_sent = now
+        if not due:
+            return 0
+
+        keys = list(dict.fromkeys((subscription.tier, subscription.quality) for subscription in due))
+        jobs = [(TIERS[tier], quality) for tier, quality in keys]
+        with profiling.stage('encode'):
+            payloads = self.encoder.encode(frame, jobs) if self.encoder is not None else encode_frame(frame, jobs)
+        encoded = dict(zip(keys, payloads))
+        for subscription in due:
+            with profiling.stage('emit'):
+                self.socketio.emit(self.event, encoded[(subscription.tier, subscription.quality)], to=subscription.sid)
+
+        with self.lock:
+            self.encoded += len(encoded)
+            self.sent += len(due)
+            self.bytes_sent += sum(len(encoded[(s.tier, s.quality)]) for s in due)
+        return len(due)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': len(self.subscriptions),
+                'encoded': self.encoded,
+                'sent': self.sent,
+                'bytes_sent': self.bytes_sent,
+            }
@@ -0,0 +1,196 @@
+from letterbox import letterbox
+from ultralytics import YOLO
+import numpy as np
+import hashlib
+import logging
+import shutil
+import glob
+import cv2
+import os
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def select_device(device="auto"):
+    """
+    Resolves ``auto`` to ``cuda:0`` when a GPU is usable, then ``mps``, then ``cpu``.
+    Explicit devices are returned unchanged.
+    """
+    if device and device != "auto":
+        return device
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    if torch.cuda.is_available():
+        return "cuda:0"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def weights_digest(path, chunk_size=1 << 20):
+    """ Content hash of a weights file, so cached exports follow retrained weights. """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def calibration_images(folder, limit=100):
+    """ Paths of up to ``limit`` images used for int8 calibration. """
+    if not folder or not os.path.isdir(folder):
+        raise ValueError(f"int8 quantization needs a folder of calibration images, got {folder!r}")
+    paths = sorted(p for pattern in IMAGE_EXTENSIONS for p in glob.glob(os.path.join(folder, pattern)))
+    if not paths:
+        raise ValueError(f"No calibration images found in {folder}")
+    return paths[:limit]
+
+
+class CalibrationReader:
+    """ onnxruntime calibration data reader feeding letterboxed frames one at a time. """
+
+    def __init__(self, input_name, paths, imgsz):
+        self.input_name = input_name
+        self.paths = iter(paths)
+        self.imgsz = imgsz
+
+    def get_next(self):
+        for path in self.paths:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            canvas, _, _ = letterbox(image, self.imgsz)
+            tensor = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            return {self.input_name: tensor}
+        return None
+
+
+class ModelExporter:
+    """
+    Exports YOLO weights to ONNX or OpenVINO and caches the artifacts.
+
+    Artifacts are stored under ``cache_dir`` in a folder named after the
+    weights, their content hash, the backend, the input size and whether they
+    are int8, so an export only happens once per combination.
+    """
+
+    def __init__(self, cache_dir="models/.cache", calibration_dir=None, calibration_size=100):
+        """
+        :param cache_dir: Folder holding exported models.
+        :param calibration_dir: Folder of sample frames used for int8 calibration.
+        :param calibration_size: Number of calibration images used.
+        """
+        self.cache_dir = cache_dir
+        self.calibration_dir = calibration_dir
+        self.calibration_size = calibration_size
+
+    def artifact_dir(self, weights, backend, imgsz, int8):
+        stem = os.path.splitext(os.path.basename(weights))[0]
+        name = f"{stem}-{weights_digest(weights)}-{backend}-{imgsz}{'-int8' if int8 else ''}"
+        return os.path.join(self.cache_dir, name)
+
+    def export(self, weights, backend, imgsz=640, int8=False):
+        """
+        Returns the path of an exported model, exporting it on first use.
+
+        :param weights: Path of the ``.pt`` weights.
+        :param backend: ``onnx`` or ``openvino``.
+        :param imgsz: Square input size baked into the export.
+        :param int8: Apply post-training int8 quantization.
+        :return: Path loadable with ``YOLO(path)``.
+        """
+        if backend not in ('onnx', 'openvino'):
+            raise ValueError(f"Cannot export to '{backend}', expected onnx or openvino")
+
+        target = self.artifact_dir(weights, backend, imgsz, int8)
+        artifact = os.path.join(target, "model.onnx") if backend == 'onnx' else target
+        if os.path.exists(artifact):
+            return artifact
+
+        logger.info("Exporting %s to %s (imgsz=%d, int8=%s)", weights, backend, imgsz, int8)
+        if backend == 'onnx' and int8:
+            self._quantize_onnx(self.export(weights, 'onnx', imgsz), artifact, imgsz)
+            return artifact
+
+        options = {'format': backend, 'imgsz': imgsz, 'dynamic': True}
+        if int8:
+            options.update(int8=True, data=self._calibration_yaml(weights, target), fraction=1.0)
+        exported = YOLO(weights).export(**options)
+        staging = f"{target}.partial"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        if backend == 'onnx':
+            os.makedirs(staging)
+            shutil.move(exported, os.path.join(staging, "model.onnx"))
+        else:
+            shutil.move(exported, staging)
+        os.replace(staging, target)
+        return artifact
+
+    def _calibration_yaml(self, weights, target):
+        """ Writes the dataset description ultralytics expects for OpenVINO calibration. """
+        images = os.path.abspath(os.path.dirname(calibration_images(self.calibration_dir, self.calibration_size)[0]))
+        path = f"{target}-calibration.yaml"
+        names = YOLO(weights).names
+        with open(path, "w") as f:
+            f.write(f"path: {images}\ntrain: .\nval: .\nnames:\n")
+            for index, name in names.items():
+                f.write(f"  {index}: {name!r}\n")
+        return path
+
+    def _quantize_onnx(self, source, artifact, imgsz):
+        import onnx
+        from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+        model = onnx.load(source)
+        reader = CalibrationReader(model.graph.input[0].name, calibration_images(self.calibration_dir, self.calibration_size), imgsz)
+        os.makedirs(os.path.dirname(artifact), exist_ok=True)
+        temp = f"{artifact}.partial"
+        quantize_static(
+            source,
+            temp,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+        # Ultralytics reads class names, stride and imgsz from the model metadata
+        quantized = onnx.load(temp)
+        del quantized.metadata_props[:]
+        quantized.metadata_props.extend(model.metadata_props)
+        onnx.save(quantized, temp)
+        os.replace(temp, artifact)
+
+
+def load_model(weights, backend="torch", device="auto", imgsz=640, int8=False, exporter=None):
+    """
+    Loads weights for the requested backend, exporting them first if needed.
+
+    :param weights: Path of the ``.pt`` weights.
+    :param backend: One of ``torch``, ``onnx`` or ``openvino``.
+    :param device: Device name or ``auto``.
+    :param imgsz: Input size of exported models.
+    :param int8: Use an int8 quantized export (onnx/openvino only).
+    :param exporter: ModelExporter holding the cache and calibration settings.
+    :return: Tuple of (YOLO model, resolved device).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    device = select_device(device)
+    if backend == 'torch':
+        if int8:
+            logger.warning("int8 is only supported by the onnx and openvino backends, loading %s in float", weights)
+        model = YOLO(weights)
+        model.to(device)
+        return model, device
+
+    # Exported models run on the CPU through onnxruntime / OpenVINO unless a GPU provider is installed
+    path = (exporter or ModelExporter()).export(weights, backend, imgsz, int8)
+    return YOLO(path, task='detect'), device
@@ -0,0 +1,192 @@
+from concurrent.futures import Future
+from collections import deque
+import metrics
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """
+    Micro-batching front end for a shared detector.
+
+    Frames submitted by any number of cameras are gathered into a batch until
+    either ``max_batch_size`` frames are waiting or the oldest frame has waited
+    ``max_wait_ms``. The batch runs as a single forward pass and every caller
+    receives its own result.
+    """
+
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, predict_kwargs=None, history=500, name="model"):
+        """
+        :param model: Detector exposing ``predict(list_of_frames, **kwargs)``.
+        :param max_batch_size: Largest number of frames run in one forward pass.
+        :param max_wait_ms: Longest time the first frame of a batch waits for company.
+        :param predict_kwargs: Arguments applied to every batch (e.g. ``conf``).
+        :param history: Number of recent batches kept for the statistics.
+        :param name: Label of this server in ``/metrics``.
+        """
+        self.model = model
+        self.name = name
+        self.batch_seconds = metrics.registry.histogram(
+            'traffic_inference_batch_seconds', "Forward pass duration of a batch.", ('model',))
+        self.wait_seconds = metrics.registry.histogram(
+            'traffic_inference_queue_wait_seconds', "Time the first frame of a batch waited.", ('model',))
+        self.batch_frames = metrics.registry.histogram(
+            'traffic_inference_batch_size', "Frames per batch.", ('model',), buckets=(1, 2, 4, 8, 16, 32, 64))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.predict_kwargs = {'verbose': False, **(predict_kwargs or {})}
+        self.requests = queue.Queue()
+        self.pending = None
+        self.latencies = deque(maxlen=history)
+        self.waits = deque(maxlen=history)
+        self.fill_ratios = deque(maxlen=history)
+        self.batches = 0
+        self.frames = 0
+        self.stats_lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="inference-server", daemon=True)
+        self.thread.start()
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def submit(self, frame):
+        """
+        Queues a frame for the next batch.
+
+        :param frame: BGR image.
+        :return: Future resolving to the ultralytics ``Results`` for this frame.
+        """
+        return self.submit_many([frame])[0]
+
+    def submit_many(self, frames):
+        """
+        Queues several frames that are guaranteed to land in the same batch
+        (split only if they exceed ``max_batch_size``).
+
+        :param frames: List of BGR images.
+        :return: List of futures, one per frame.
+        """
+        futures = [Future() for _ in frames]
+        if frames:
+            self.requests.put((list(frames), futures, time.perf_counter()))
+        return futures
+
+    def predict(self, source, **kwargs):
+        """
+        Drop-in replacement for ``YOLO.predict`` on a single frame.
+
+        Per-call arguments are accepted for compatibility, but the server-wide
+        ``predict_kwargs`` apply because the frame is batched with other cameras.
+        """
+        return [self.submit(source).result()]
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+    def _collect(self):
+        if self.pending is not None:
+            batch, self.pending = [self.pending], None
+        else:
+            try:
+                batch = [self.requests.get(timeout=0.5)]
+            except queue.Empty:
+                return []
+
+        size = len(batch[0][0])
+        deadline = batch[0][2] + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                # Keep grouped frames together in the next batch
+                self.pending = request
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _serve(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+
+            frames = [frame for request in batch for frame in request[0]]
+            futures = [future for request in batch for future in request[1]]
+            for i in range(0, len(frames), self.max_batch_size):
+                self._run(frames[i:i + self.max_batch_size], futures[i:i + self.max_batch_size], batch[0][2])
+
+    def _run(self, frames, futures, submitted):
+        start = time.perf_counter()
+        try:
+            results = self.model.predict(frames, **self.predict_kwargs)
+        except Exception as e:
+            logger.exception("Batch inference failed")
+            for future in futures:
+                future.set_exception(e)
+            return
+        latency = time.perf_counter() - start
+
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+        with self.stats_lock:
+            self.batches += 1
+            self.frames += len(frames)
+            self.latencies.append(latency)
+            self.waits.append(start - submitted)
+            self.fill_ratios.append(len(frames) / self.max_batch_size)
+        self.batch_seconds.observe(latency, self.name)
+        self.wait_seconds.observe(start - submitted, self.name)
+        self.batch_frames.observe(len(frames), self.name)
+
+    def stats(self):
+        """
+        Summarizes recent batches so batch size and wait time can be tuned.
+
+        :return: Dictionary with batch latency, queue wait and fill ratio figures.
+        """
+        with self.stats_lock:
+            latencies = sorted(self.latencies)
+            waits = list(self.waits)
+            fill_ratios = list(self.fill_ratios)
+            batches, frames = self.batches, self.frames
+
+        def percentile(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': batches,
+            'frames': frames,
+            'queue_depth': self.requests.qsize(),
+            'batch_latency_ms_avg': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            'batch_latency_ms_p50': percentile(latencies, 0.50),
+            'batch_latency_ms_p95': percentile(latencies, 0.95),
+            'queue_wait_ms_avg': sum(waits) / len(waits) * 1000 if waits else 0.0,
+            'fill_ratio_avg': sum(fill_ratios) / len(fill_ratios) if fill_ratios else 0.0,
+            'fill_ratio_last': fill_ratios[-1] if fill_ratios else 0.0,
+        }
+
+    def shutdown(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        requests = [self.pending] if self.pending is not None else []
+        while True:
+            try:
+                requests.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        for _, futures, _ in requests:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,40 @@
+import numpy as np
+import cv2
+
+
+def letterbox(image, size=640, color=(114, 114, 114)):
+    """
+    Resizes an image to fit a square canvas while keeping its aspect ratio.
+
+    :param image: BGR image.
+    :param size: Side length of the output canvas.
+    :param color: Fill color of the padding.
+    :return: Tuple of (canvas, scale, (pad_x, pad_y)).
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), color, dtype=image.dtype)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return canvas, scale, (pad_x, pad_y)
+
+
+def unletterbox_box(box, scale, pad, shape):
+    """
+    Maps a box predicted on a letterboxed canvas back to the source image.
+
+    :param box: (x1, y1, x2, y2) in canvas coordinates.
+    :param scale: Scale returned by ``letterbox``.
+    :param pad: Padding returned by ``letterbox``.
+    :param shape: Shape of the source image.
+    :return: Integer (x1, y1, x2, y2) clipped to the source image.
+    """
+    h, w = shape[:2]
+    x1 = int(np.clip((box[0] - pad[0]) / scale, 0, w))
+    y1 = int(np.clip((box[1] - pad[1]) / scale, 0, h))
+    x2 = int(np.clip((box[2] - pad[0]) / scale, 0, w))
+    y2 = int(np.clip((box[3] - pad[1]) / scale, 0, h))
+    return x1, y1, x2, y2
@@ -0,0 +1,119 @@
+from bisect import bisect_left
+import threading
+import math
+
+# Latency buckets in seconds, from 1 ms to 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Prometheus histogram with fixed buckets and optional labels.
+
+    ``observe`` is a bisect and three increments under a lock, cheap enough
+    for per-frame use.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels({**labels, 'le': format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Histograms observed by the pipeline plus collectors that read counters and
+    gauges from the components when ``/metrics`` is scraped.
+
+    A collector returns ``(name, type, help, samples)`` tuples where samples is
+    a list of ``(labels dict, value)``.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, documentation, labelnames, buckets)
+            return self.histograms[name]
+
+    def register_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def unregister_collector(self, collector):
+        with self.lock:
+            if collector in self.collectors:
+                self.collectors.remove(collector)
+
+    def render(self):
+        """ Renders every metric in the Prometheus text exposition format (0.0.4). """
+        with self.lock:
+            histograms = list(self.histograms.values())
+            collectors = list(self.collectors)
+
+        lines = []
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry served by /metrics
+registry = Registry()
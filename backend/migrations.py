@@ -0,0 +1,68 @@
+from plate_search import normalize_plate, trigrams
+from sqlalchemy import inspect, text
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def add_column(connection, table, column, ddl):
+    """ Adds a column unless ``create_all`` already created it on a fresh database. """
+    columns = {c['name'] for c in inspect(connection).get_columns(table)}
+    if column not in columns:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def add_plate_text(connection):
+    add_column(connection, 'vehicle', 'plate_text', 'VARCHAR(32)')
+    add_column(connection, 'vehicle', 'plate_confidence', 'FLOAT')
+
+
+
+def add_search_indexes(connection):
+    add_column(connection, 'vehicle', 'plate_normalized', 'VARCHAR(32)')
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_vehicle_record_timestamp ON vehicle_record (timestamp, vehicle_id)",
+        "CREATE INDEX IF NOT EXISTS ix_vehicle_record_violation_timestamp ON vehicle_record (violation_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_vehicle_speed ON vehicle (speed)",
+        "CREATE INDEX IF NOT EXISTS ix_vehicle_plate_normalized ON vehicle (plate_normalized)",
+        "CREATE INDEX IF NOT EXISTS ix_violation_name ON violation (name)",
+    ):
+        connection.execute(text(statement))
+
+    # Index plates that were read before the search columns existed
+    rows = connection.execute(text("SELECT id, plate_text FROM vehicle WHERE plate_text IS NOT NULL")).fetchall()
+    for vehicle_id, plate_text in rows:
+        normalized = normalize_plate(plate_text)
+        connection.execute(text("UPDATE vehicle SET plate_normalized = :plate WHERE id = :id"), {'plate': normalized, 'id': vehicle_id})
+        for gram in trigrams(normalized):
+            connection.execute(text("INSERT OR IGNORE INTO plate_trigram (trigram, vehicle_id) VALUES (:gram, :id)"), {'gram': gram, 'id': vehicle_id})
+
+
+
+def add_vehicle_camera(connection):
+    add_column(connection, 'vehicle', 'camera_id', 'VARCHAR(64)')
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicle_camera_id ON vehicle (camera_id)"))
+
+
+# Ordered schema changes; a migration's version is its position in this list
+MIGRATIONS = [
+    add_plate_text,
+    add_search_indexes,
+    add_vehicle_camera,
+]
+
+
+def migrate(db):
+    """
+    Brings an existing database up to date with the models.
+
+    ``db.create_all`` only creates missing tables, so columns added to existing
+    tables are applied here. The applied version is kept in ``schema_version``.
+    """
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        version = connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info("Applying migration %d: %s", number, migration.__name__)
+            migration(connection)
+            connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {'version': number})
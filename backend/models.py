@@ -4,6 +4,9 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
+# Violations recorded by the pipeline, seeded into the violation table
+VIOLATION_NAMES = ["No Helmet", "Overloading", "Overspeeding"]
+
 class Subscriber(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -19,7 +22,15 @@ class User(db.Model):
 vehicle_violation = db.Table('vehicle_record',
     db.Column('vehicle_id', db.Integer, db.ForeignKey('vehicle.id'), primary_key=True),
     db.Column('violation_id', db.Integer, db.ForeignKey('violation.id'), primary_key=True),
-    db.Column('timestamp', db.DateTime, nullable=False, default=datetime.utcnow)
+    db.Column('timestamp', db.DateTime, nullable=False, default=datetime.utcnow),
+    db.Index('ix_vehicle_record_timestamp', 'timestamp', 'vehicle_id'),
+    db.Index('ix_vehicle_record_violation_timestamp', 'violation_id', 'timestamp')
+)
+
+# Trigrams of normalized plate text, used for fuzzy plate search
+plate_trigram = db.Table('plate_trigram',
+    db.Column('trigram', db.String(3), primary_key=True),
+    db.Column('vehicle_id', db.Integer, db.ForeignKey('vehicle.id'), primary_key=True)
 )
 
 # Vehicle model with an image
@@ -29,7 +40,11 @@ class Vehicle(db.Model):
     image_path = db.Column(db.String(255), nullable=True)
     license_path = db.Column(db.String(255), nullable=True)
     violations = db.relationship('Violation', secondary=vehicle_violation, backref=db.backref('vehicles', lazy='dynamic'))
-    speed = db.Column(db.Integer, nullable=True, default=0)
+    speed = db.Column(db.Integer, nullable=True, default=0, index=True)
+    plate_text = db.Column(db.String(32), nullable=True)
+    plate_normalized = db.Column(db.String(32), nullable=True, index=True)
+    camera_id = db.Column(db.String(64), nullable=True, index=True)
+    plate_confidence = db.Column(db.Float, nullable=True)
 
     def to_dict(self):
         return {
@@ -37,7 +52,10 @@ class Vehicle(db.Model):
             'image_path': self.image_path,
             'license_path': self.license_path,
             'violations': [v.name for v in self.violations],
-            'speed': self.speed
+            'speed': self.speed,
+            'camera_id': self.camera_id,
+            'plate_text': self.plate_text,
+            'plate_confidence': self.plate_confidence
         }
 
     def __repr__(self):
@@ -47,7 +65,32 @@ class Vehicle(db.Model):
 class Violation(db.Model):
     __tablename__ = 'violation'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<Violation {self.name}>'
+
+# Violations per day, camera and violation type, kept up to date by the violation writer
+class DailyRollup(db.Model):
+    __tablename__ = 'daily_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    camera_id = db.Column(db.String(64), primary_key=True)
+    violation = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    speed_max = db.Column(db.Float, nullable=True)
+    # JSON list of counts per speed bin, see rollup.SPEED_BIN_WIDTH
+    speed_histogram = db.Column(db.Text, nullable=False)
+
+    def __repr__(self):
+        return f'<DailyRollup {self.day} {self.camera_id} {self.violation}>'
+
+# Line, polygon, speed limit and detection settings of a camera, restored when it is added again
+class CameraSettings(db.Model):
+    __tablename__ = 'camera_config'
+    camera_id = db.Column(db.String(64), primary_key=True)
+    # JSON written by CameraConfig.to_json
+    config = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Violation {self.name}>'
\ No newline at end of file
+        return f'<CameraSettings {self.camera_id}>'
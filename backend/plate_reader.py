@@ -0,0 +1,154 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from plate_search import index_plate
+from models import Vehicle
+import multiprocessing
+import threading
+import logging
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Text returned for plates tesseract could not read
+UNREADABLE = ""
+
+
+def _init_worker(tesseract_cmd):
+    import pytesseract
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def preprocess_plate(image, height=96):
+    """
+    Prepares a plate crop for tesseract: grayscale, upscaled so characters are
+    large enough to read, then binarized with Otsu's threshold.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = height / max(1, gray.shape[0])
+    if scale > 1:
+        gray = cv2.resize(gray, (max(1, int(gray.shape[1] * scale)), height), interpolation=cv2.INTER_CUBIC)
+    gray = cv2.bilateralFilter(gray, 7, 50, 50)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def read_plate(path, config="--psm 6"):
+    """
+    Runs OCR on a stored plate image. Executed in a worker process.
+
+    :param path: Absolute path of the plate image.
+    :param config: Extra tesseract options.
+    :return: Tuple of (text, mean word confidence between 0 and 100).
+    """
+    import pytesseract
+
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(path)
+    try:
+        data = pytesseract.image_to_data(preprocess_plate(image), config=config, output_type=pytesseract.Output.DICT)
+    except (pytesseract.TesseractNotFoundError, pytesseract.TesseractError) as e:
+        # pytesseract's exceptions cannot be unpickled in the parent process
+        raise RuntimeError(f"tesseract failed: {e}") from None
+
+    words = []
+    confidences = []
+    for text, conf in zip(data['text'], data['conf']):
+        text = text.strip()
+        if text and float(conf) >= 0:
+            words.append(text)
+            confidences.append(float(conf))
+    if not words:
+        return UNREADABLE, 0.0
+    return " ".join(words), sum(confidences) / len(confidences)
+
+
+class PlateReader:
+    """
+    Reads license plates on a process pool so OCR never runs in a request.
+
+    The violation writer hands every saved plate to ``submit`` and the result
+    is stored on the ``Vehicle``. Jobs are keyed by vehicle id, so a plate that
+    is already being read is not queued a second time when it is also
+    requested on demand.
+    """
+
+    def __init__(self, app, db, evidence_store, workers=2, tesseract_cmd=None, tesseract_config="--psm 6"):
+        """
+        :param app: Flask application, used for the app context.
+        :param db: SQLAlchemy instance.
+        :param evidence_store: EvidenceStore the plate images are read from.
+        :param workers: OCR worker processes.
+        :param tesseract_cmd: Path of the tesseract binary, found on PATH when None.
+        :param tesseract_config: Extra tesseract options.
+        """
+        self.app = app
+        self.db = db
+        self.evidence_store = evidence_store
+        self.tesseract_config = tesseract_config
+        self.workers = workers
+        self.tesseract_cmd = tesseract_cmd
+        self.pool = self._create_pool()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _create_pool(self):
+        # Spawned workers do not inherit the camera and server threads of this process
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.tesseract_cmd,),
+        )
+
+    def submit(self, vehicle_id, license_path):
+        """
+        Queues OCR of a vehicle's plate unless it is already queued.
+
+        :param vehicle_id: Id of the Vehicle the result is stored on.
+        :param license_path: Stored path of the plate image.
+        :return: Future resolving to (text, confidence).
+        """
+        with self.lock:
+            future = self.pending.get(vehicle_id)
+            if future is not None:
+                return future
+            path = self.evidence_store.path(license_path)
+            try:
+                future = self.pool.submit(read_plate, path, self.tesseract_config)
+            except BrokenProcessPool:
+                logger.warning("OCR pool broke, restarting it")
+                self.pool = self._create_pool()
+                future = self.pool.submit(read_plate, path, self.tesseract_config)
+            self.pending[vehicle_id] = future
+        future.add_done_callback(lambda f: self._store(vehicle_id, f))
+        return future
+
+    def _store(self, vehicle_id, future):
+        try:
+            text, confidence = future.result()
+            with self.app.app_context():
+                Vehicle.query.filter_by(id=vehicle_id).update({'plate_text': text, 'plate_confidence': confidence})
+                index_plate(self.db.session, vehicle_id, text)
+                self.db.session.commit()
+            succeeded = True
+        except Exception:
+            # Left unset so the plate is read again when it is next requested
+            logger.exception("OCR failed for vehicle %s", vehicle_id)
+            succeeded = False
+        with self.lock:
+            self.pending.pop(vehicle_id, None)
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'completed': self.completed, 'failed': self.failed}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
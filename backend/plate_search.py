@@ -0,0 +1,119 @@
+from models import Vehicle, Violation, vehicle_violation, plate_trigram
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import selectinload
+import math
+import re
+
+NON_ALNUM = re.compile(r"[^0-9A-Z]")
+
+
+def normalize_plate(text):
+    """ Uppercases plate text and strips everything but letters and digits. """
+    if not text:
+        return None
+    return NON_ALNUM.sub("", text.upper()) or None
+
+
+def trigrams(normalized):
+    """
+    Trigrams of a normalized plate. Plates are padded with ``#`` so that short
+    plates and the first/last characters still contribute.
+    """
+    if not normalized:
+        return set()
+    padded = f"##{normalized}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_plate(session, vehicle_id, text):
+    """
+    Stores the normalized plate and replaces the vehicle's trigram rows.
+    The caller commits.
+    """
+    normalized = normalize_plate(text)
+    session.query(Vehicle).filter_by(id=vehicle_id).update({'plate_normalized': normalized})
+    session.execute(plate_trigram.delete().where(plate_trigram.c.vehicle_id == vehicle_id))
+    grams = trigrams(normalized)
+    if grams:
+        session.execute(plate_trigram.insert(), [{'trigram': gram, 'vehicle_id': vehicle_id} for gram in grams])
+
+
+def search_vehicles(session, plate=None, fuzzy=False, min_similarity=0.5, start=None, end=None,
+                    violations=None, min_speed=None, max_speed=None, limit=50, cursor=None):
+    """
+    Finds vehicles by plate, time range, violation type and speed.
+
+    Without ``fuzzy`` the plate is matched as a prefix of the normalized plate,
+    which is a range scan of ``ix_vehicle_plate_normalized``. With ``fuzzy``
+    vehicles sharing at least ``min_similarity`` of the query's trigrams are
+    returned best match first. With a time range the candidate vehicles come
+    from a range scan of ``ix_vehicle_record_timestamp``; a violation filter
+    alone is a correlated ``EXISTS`` probing the record's primary key.
+
+    :param session: SQLAlchemy session.
+    :param plate: Plate text, normalized before matching.
+    :param fuzzy: Match by trigram similarity instead of prefix.
+    :param min_similarity: Share of the query trigrams a fuzzy match needs.
+    :param start: Earliest violation time.
+    :param end: Latest violation time.
+    :param violations: Violation names, any of which must be recorded.
+    :param min_speed: Lowest speed.
+    :param max_speed: Highest speed.
+    :param limit: Page size.
+    :param cursor: Vehicle id the previous page ended at (prefix matches only).
+    :return: Tuple of (list of (Vehicle, first violation time), next cursor).
+    """
+    query = session.query(Vehicle).options(selectinload(Vehicle.violations))
+    normalized = normalize_plate(plate)
+    ranked = None
+
+    if normalized and fuzzy:
+        grams = trigrams(normalized)
+        needed = max(1, math.ceil(len(grams) * min_similarity))
+        hits = func.count().label('hits')
+        ranked = select(plate_trigram.c.vehicle_id, hits) \
+            .where(plate_trigram.c.trigram.in_(grams)) \
+            .group_by(plate_trigram.c.vehicle_id) \
+            .having(hits >= needed) \
+            .subquery()
+        query = query.join(ranked, ranked.c.vehicle_id == Vehicle.id)
+    elif normalized:
+        # Upper bound of the prefix range, e.g. "AB12" -> "AB13"
+        upper = normalized[:-1] + chr(ord(normalized[-1]) + 1)
+        query = query.filter(Vehicle.plate_normalized >= normalized, Vehicle.plate_normalized < upper)
+
+    record = vehicle_violation.c
+    conditions = []
+    if start is not None:
+        conditions.append(record.timestamp >= start)
+    if end is not None:
+        conditions.append(record.timestamp <= end)
+    if violations:
+        violation_ids = [v.id for v in session.query(Violation.id).filter(Violation.name.in_(violations))]
+        conditions.append(record.violation_id.in_(violation_ids))
+    if start is not None or end is not None:
+        query = query.filter(Vehicle.id.in_(select(record.vehicle_id).where(*conditions)))
+    elif conditions:
+        query = query.filter(exists().where(record.vehicle_id == Vehicle.id, *conditions))
+
+    if min_speed is not None:
+        query = query.filter(Vehicle.speed >= min_speed)
+    if max_speed is not None:
+        query = query.filter(Vehicle.speed <= max_speed)
+
+    if ranked is not None:
+        # Ranked results come as a single page
+        vehicles = query.order_by(ranked.c.hits.desc(), Vehicle.id.desc()).limit(limit).all()
+        next_cursor = None
+    else:
+        if cursor is not None:
+            query = query.filter(Vehicle.id < cursor)
+        vehicles = query.order_by(Vehicle.id.desc()).limit(limit + 1).all()
+        next_cursor = vehicles[limit - 1].id if len(vehicles) > limit else None
+        vehicles = vehicles[:limit]
+
+    # Timestamps are looked up for the page only, through the primary key
+    first_seen = dict(session.query(record.vehicle_id, func.min(record.timestamp))
+                      .filter(record.vehicle_id.in_([v.id for v in vehicles]))
+                      .group_by(record.vehicle_id)) if vehicles else {}
+    return [(v, first_seen.get(v.id)) for v in vehicles], next_cursor
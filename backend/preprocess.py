@@ -0,0 +1,165 @@
+import profiling
+import cv2
+
+# What each tier feeds: the detector gets the region of interest, the license and
+# violation models get the crop of every crossing, the stream gets the annotated preview
+TIERS = ('detector', 'crops', 'preview')
+
+# The models take 3-channel BGR input, so these tiers have to end in BGR
+BGR_TIERS = ('detector', 'crops')
+
+# The blur the detector always had; crops and preview use the original pixels
+DEFAULT_TIERS = {
+    'detector': [{'op': 'blur', 'kernel': 3, 'sigma': 1.0}],
+    'crops': [],
+    'preview': [],
+}
+
+INTERPOLATIONS = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'area': cv2.INTER_AREA,
+    'cubic': cv2.INTER_CUBIC,
+}
+
+
+class Resize:
+    """
+    Resizes to a fixed ``width`` and/or ``height`` (the other side keeps the
+    aspect ratio), by a ``scale`` factor, or so the longer side is at most
+    ``max_side``, which never upscales.
+    """
+
+    name = 'resize'
+
+    def __init__(self, width=None, height=None, scale=None, max_side=None, interpolation='area'):
+        if sum((width is not None or height is not None, scale is not None, max_side is not None)) != 1:
+            raise ValueError("resize takes one of width/height, scale or max_side")
+        if interpolation not in INTERPOLATIONS:
+            raise ValueError(f"Unknown interpolation '{interpolation}', expected one of {tuple(INTERPOLATIONS)}")
+        if any(value is not None and value <= 0 for value in (width, height, scale, max_side)):
+            raise ValueError("resize sizes must be positive")
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.max_side = max_side
+        self.interpolation = interpolation
+
+    def size(self, width, height):
+        if self.scale is not None:
+            factor_x = factor_y = self.scale
+        elif self.max_side is not None:
+            factor_x = factor_y = min(1.0, self.max_side / max(width, height))
+        else:
+            factor_x = self.width / width if self.width else self.height / height
+            factor_y = self.height / height if self.height else factor_x
+        return max(1, int(round(width * factor_x))), max(1, int(round(height * factor_y)))
+
+    def __call__(self, image):
+        height, width = image.shape[:2]
+        size = self.size(width, height)
+        if size == (width, height):
+            return image
+        return cv2.resize(image, size, interpolation=INTERPOLATIONS[self.interpolation])
+
+    def to_dict(self):
+        settings = {'width': self.width, 'height': self.height, 'scale': self.scale, 'max_side': self.max_side}
+        return {'op': self.name, **{key: value for key, value in settings.items() if value is not None}, 'interpolation': self.interpolation}
+
+
+class Blur:
+    """ Gaussian blur with an odd ``kernel`` size. """
+
+    name = 'blur'
+
+    def __init__(self, kernel=3, sigma=1.0):
+        if int(kernel) < 1 or int(kernel) % 2 == 0:
+            raise ValueError("blur kernel must be a positive odd number")
+        self.kernel = int(kernel)
+        self.sigma = float(sigma)
+
+    def __call__(self, image):
+        return cv2.GaussianBlur(image, (self.kernel, self.kernel), sigmaX=self.sigma, sigmaY=self.sigma)
+
+    def to_dict(self):
+        return {'op': self.name, 'kernel': self.kernel, 'sigma': self.sigma}
+
+
+class ColorConvert:
+    """ ``cv2.cvtColor`` with the conversion named after its ``COLOR_`` constant, e.g. ``BGR2GRAY``. """
+
+    name = 'color'
+
+    def __init__(self, code):
+        self.code = str(code).upper()
+        self.flag = getattr(cv2, f"COLOR_{self.code}", None)
+        if self.flag is None:
+            raise ValueError(f"Unknown color conversion '{code}'")
+        # Color space of the output, e.g. GRAY for BGR2GRAY and BGR for YUV2BGR_NV12
+        self.target = self.code.split('2', 1)[-1].split('_', 1)[0]
+
+    def __call__(self, image):
+        return cv2.cvtColor(image, self.flag)
+
+    def to_dict(self):
+        return {'op': self.name, 'code': self.code}
+
+
+OPERATIONS = {operation.name: operation for operation in (Resize, Blur, ColorConvert)}
+
+
+def build_operation(spec):
+    """
+    :param spec: Dictionary with the operation name under ``op`` and its arguments, e.g. ``{'op': 'blur', 'kernel': 5}``.
+    """
+    settings = dict(spec)
+    name = settings.pop('op', None)
+    if name not in OPERATIONS:
+        raise ValueError(f"Unknown preprocessing operation '{name}', expected one of {tuple(OPERATIONS)}")
+    try:
+        return OPERATIONS[name](**settings)
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments for '{name}': {e}") from None
+
+
+class Preprocessor:
+    """
+    Declarative preprocessing of a camera's frames, one list of operations per tier.
+
+    The frame itself is never modified: every tier starts from the original
+    pixels and its output is computed once, where it is consumed. A tier
+    without operations hands its input through untouched. Every operation is
+    timed as the ``<tier>_<op>`` profiling stage.
+    """
+
+    def __init__(self, tiers=None):
+        """
+        :param tiers: Operation specs per tier (see ``build_operation``); tiers left out
+            get no operations, None uses ``DEFAULT_TIERS``.
+        """
+        tiers = DEFAULT_TIERS if tiers is None else tiers
+        unknown = set(tiers) - set(TIERS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing tiers {sorted(unknown)}, expected {TIERS}")
+        self.tiers = {tier: [build_operation(spec) for spec in tiers.get(tier) or ()] for tier in TIERS}
+        for tier in BGR_TIERS:
+            conversions = [operation for operation in self.tiers[tier] if isinstance(operation, ColorConvert)]
+            if conversions and conversions[-1].target != 'BGR':
+                raise ValueError(f"The '{tier}' tier feeds a model and has to end in BGR, "
+                                 f"'{conversions[-1].code}' leaves it in {conversions[-1].target}")
+
+    def apply(self, tier, image):
+        """
+        :param tier: One of ``TIERS``.
+        :param image: Input of the tier.
+        :return: Tuple of (output, (scale_x, scale_y)) from input to output coordinates.
+            The output is ``image`` itself when no operation changed it.
+        """
+        height, width = image.shape[:2]
+        for operation in self.tiers[tier]:
+            with profiling.stage(f"{tier}_{operation.name}"):
+                image = operation(image)
+        return image, (image.shape[1] / width, image.shape[0] / height)
+
+    def to_dict(self):
+        return {tier: [operation.to_dict() for operation in operations] for tier, operations in self.tiers.items()}
@@ -0,0 +1,631 @@
+from multiprocessing import shared_memory
+from functools import partial
+import multiprocessing
+import numpy as np
+import itertools
+import threading
+import logging
+import queue
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFrameRing:
+    """
+    Fixed-size frame slots in one ``multiprocessing.shared_memory`` block.
+
+    The process that creates the ring owns it and unlinks it on ``close``;
+    worker processes attach by name. Frames are written into a slot and only
+    the slot index, shape and dtype go through the queues, so frames are
+    never pickled.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        """
+        :param slots: Number of frames the ring holds.
+        :param slot_bytes: Size of the largest frame a slot takes.
+        :param name: Name of an existing ring to attach to, None creates one.
+        """
+        self.slots = max(1, int(slots))
+        self.slot_bytes = max(1, int(slot_bytes))
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+    @classmethod
+    def attach(cls, spec):
+        """ :param spec: Tuple returned by ``spec`` in the owning process. """
+        name, slots, slot_bytes = spec
+        return cls(slots, slot_bytes, name=name)
+
+    def spec(self):
+        return self.name, self.slots, self.slot_bytes
+
+    def view(self, slot, shape, dtype=np.uint8):
+        """ Array backed by the slot's memory, valid until the slot is written again. """
+        return np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=int(slot) * self.slot_bytes)
+
+    def write(self, slot, frame):
+        """
+        :return: Tuple of (shape, dtype string) to send along with the slot index.
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+        self.view(slot, frame.shape, frame.dtype)[...] = frame
+        return frame.shape, frame.dtype.str
+
+    def close(self):
+        try:
+            self.memory.close()
+        except BufferError:
+            logger.warning("Shared frames %s still referenced, leaving them mapped", self.name)
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RestartPolicy:
+    """
+    Decides whether a crashed worker process is started again.
+
+    At most ``max_restarts`` restarts are allowed within ``window`` seconds;
+    each one waits ``backoff`` seconds, doubled for every restart still in the
+    window, so a worker that keeps crashing does not spin.
+    """
+
+    def __init__(self, max_restarts=5, window=60.0, backoff=0.5):
+        self.max_restarts = max_restarts
+        self.window = window
+        self.backoff = backoff
+        self.recent = []
+        self.total = 0
+
+    def next_delay(self):
+        """ :return: Seconds to wait before restarting, None when the worker should stay down. """
+        now = time.monotonic()
+        self.recent = [t for t in self.recent if now - t < self.window]
+        if len(self.recent) >= self.max_restarts:
+            return None
+        delay = self.backoff * (2 ** len(self.recent))
+        self.recent.append(now)
+        self.total += 1
+        return delay
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _serve(factory, spec, requests, responses):
+    """
+    Worker process loop. ``factory()`` returns ``(handler, info)``; ``info`` is
+    sent back once at start, then every request's frames are read from the
+    ring and passed to ``handler(frames, payload)``. A request naming another
+    ring (the parent grew it) switches to that ring.
+    """
+    ring = SharedFrameRing.attach(spec)
+    try:
+        try:
+            handler, info = factory()
+        except Exception as e:
+            responses.put((None, 'error', f"{type(e).__name__}: {e}"))
+            return
+        responses.put((None, 'ok', info))
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            request_id, spec, frames, payload = request
+            if spec[0] != ring.name:
+                ring.close()
+                ring = SharedFrameRing.attach(spec)
+            views = [ring.view(slot, shape, dtype) for slot, shape, dtype in frames]
+            try:
+                response = (request_id, 'ok', handler(views, payload))
+            except Exception as e:
+                # Exceptions of model libraries do not always unpickle in the parent
+                response = (request_id, 'error', f"{type(e).__name__}: {e}")
+            del views
+            responses.put(response)
+    finally:
+        ring.close()
+
+
+class ProcessWorker:
+    """
+    One worker process answering requests on frames passed through a ``SharedFrameRing``.
+
+    Calls are serialized: the frames of a call occupy the first slots of the
+    ring until the answer arrives. The slots grow when a call brings a larger
+    frame than they hold. A worker that died is restarted on the next call as
+    long as its ``RestartPolicy`` allows, and a call interrupted by a crash is
+    retried once on the new process.
+    """
+
+    def __init__(self, name, factory, slots, slot_bytes, restart_policy=None, start_timeout=120.0, context=None):
+        """
+        :param name: Process name, also used in logs and metrics.
+        :param factory: Picklable callable run in the worker, returning ``(handler, info)``.
+        :param slots: Most frames per call.
+        :param slot_bytes: Initial slot size, grown on demand.
+        :param restart_policy: RestartPolicy, a default one when None.
+        :param start_timeout: Seconds the worker may take to start (e.g. to load a model).
+        :param context: multiprocessing context, ``spawn`` by default.
+        """
+        self.name = name
+        self.factory = factory
+        self.restart_policy = restart_policy or RestartPolicy()
+        self.start_timeout = start_timeout
+        self.context = context or multiprocessing.get_context("spawn")
+        self.ring = SharedFrameRing(slots, slot_bytes)
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.process = None
+        self.info = None
+        self.calls = 0
+        self.failures = 0
+        self.start()
+
+    @property
+    def restarts(self):
+        return self.restart_policy.total
+
+    def start(self):
+        self.requests = self.context.Queue()
+        self.responses = self.context.Queue()
+        self.process = self.context.Process(
+            target=_serve, args=(self.factory, self.ring.spec(), self.requests, self.responses), name=self.name, daemon=True)
+        self.process.start()
+        _, status, info = self._receive(None, self.start_timeout)
+        if status != 'ok':
+            self._stop()
+            raise RuntimeError(f"Worker {self.name} failed to start: {info}")
+        self.info = info
+
+    def _receive(self, request_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                message = self.responses.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise WorkerCrashed(f"Worker {self.name} exited with code {self.process.exitcode}")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Worker {self.name} did not answer within {timeout}s")
+                continue
+            # Answers to calls that timed out earlier are dropped
+            if message[0] == request_id:
+                return message
+
+    def _ensure_running(self):
+        if self.process.is_alive():
+            return
+        delay = self.restart_policy.next_delay()
+        if delay is None:
+            raise RuntimeError(f"Worker {self.name} crashed too often, not restarting")
+        logger.warning("Worker %s exited with code %s, restarting in %.1fs", self.name, self.process.exitcode, delay)
+        self._stop()
+        time.sleep(delay)
+        self.start()
+
+    def call(self, frames, payload=None, timeout=30.0):
+        """
+        :param frames: Frames for the handler, at most ``slots``.
+        :param payload: Picklable arguments for the handler.
+        :return: The handler's result.
+        """
+        if len(frames) > self.ring.slots:
+            raise ValueError(f"{len(frames)} frames exceed the {self.ring.slots} slots of worker {self.name}")
+        with self.lock:
+            self.calls += 1
+            largest = max((frame.nbytes for frame in frames), default=0)
+            if largest > self.ring.slot_bytes:
+                self._grow(largest)
+            for attempt in range(2):
+                self._ensure_running()
+                request_id = next(self.ids)
+                specs = [(slot, *self.ring.write(slot, frame)) for slot, frame in enumerate(frames)]
+                self.requests.put((request_id, self.ring.spec(), specs, payload))
+                try:
+                    _, status, result = self._receive(request_id, timeout)
+                except WorkerCrashed:
+                    self.failures += 1
+                    if attempt:
+                        raise
+                    logger.error("Worker %s crashed during a call, retrying", self.name)
+                    continue
+                except TimeoutError:
+                    # A hung worker is replaced on the next call
+                    self.failures += 1
+                    self.process.terminate()
+                    raise
+                if status != 'ok':
+                    self.failures += 1
+                    raise RuntimeError(f"Worker {self.name}: {result}")
+                return result
+
+    def _grow(self, slot_bytes):
+        """ Replaces the ring with one of larger slots; the worker switches on its next request. """
+        logger.info("Worker %s: growing frame slots from %d to %d bytes", self.name, self.ring.slot_bytes, slot_bytes)
+        ring = SharedFrameRing(self.ring.slots, slot_bytes)
+        # The worker keeps its own mapping of the old ring until it switches
+        self.ring.close()
+        self.ring = ring
+
+    def stats(self):
+        return {
+            'alive': self.process is not None and self.process.is_alive(),
+            'pid': self.process.pid if self.process is not None else None,
+            'calls': self.calls,
+            'failures': self.failures,
+            'restarts': self.restarts,
+        }
+
+    def _stop(self, timeout=5.0):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+        for channel in (self.requests, self.responses):
+            channel.close()
+            channel.cancel_join_thread()
+
+    def shutdown(self, timeout=5.0):
+        with self.lock:
+            self._stop(timeout)
+            self.ring.close()
+
+
+class ResultTensor(np.ndarray):
+    """ ndarray with the ``cpu()/numpy()/int()`` calls made on ultralytics tensors. """
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+    def int(self):
+        return self.astype(np.int64).view(ResultTensor)
+
+
+def _tensor(values, dtype=np.float32, width=None):
+    array = np.asarray(values, dtype=dtype)
+    if width is not None:
+        array = array.reshape(-1, width)
+    return array.view(ResultTensor)
+
+
+class ResultBoxes:
+    __slots__ = ('xyxy', 'conf', 'cls', 'id')
+
+    def __init__(self, xyxy, conf, cls, id=None):
+        self.xyxy = _tensor(xyxy, width=4)
+        self.conf = _tensor(conf)
+        self.cls = _tensor(cls)
+        self.id = _tensor(id) if id is not None else None
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class DetectionResult:
+    """
+    Picklable stand-in for an ultralytics ``Results`` holding only the boxes.
+
+    Worker processes return these instead of the full results, which carry
+    the input image; ``sv.Detections.from_ultralytics`` accepts them as is.
+    """
+
+    def __init__(self, names, orig_shape, boxes):
+        self.names = names
+        self.orig_shape = orig_shape
+        self.boxes = boxes
+        self.masks = None
+        self.obb = None
+        self.keypoints = None
+        self.probs = None
+
+    @classmethod
+    def from_ultralytics(cls, result):
+        boxes = result.boxes
+        return cls(result.names, tuple(result.orig_shape), ResultBoxes(
+            boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(),
+            boxes.id.cpu().numpy() if boxes.id is not None else None))
+
+
+def _model_worker(path, backend, device, imgsz, int8, exporter):
+    """ Worker factory: loads the model and runs ``predict`` on the frames of each call. """
+    from inference_backend import load_model
+
+    model, device = load_model(path, backend, device, imgsz, int8, exporter)
+
+    def predict(frames, kwargs):
+        return [DetectionResult.from_ultralytics(result) for result in model.predict(list(frames), device=device, **kwargs)]
+    return predict, {'names': model.names, 'device': device}
+
+
+class ProcessModel:
+    """
+    Model loaded in a worker process, a drop-in for ``camera_manager.SharedModel``.
+
+    ``predict`` writes the frames into shared memory and returns
+    ``DetectionResult`` objects, so the forward pass and its pre- and
+    post-processing run outside the server process's GIL.
+    """
+
+    def __init__(self, path, backend="torch", device="auto", imgsz=640, int8=False, exporter=None, slots=16, slot_bytes=1920 * 1080 * 3, restart_policy=None):
+        """
+        :param slots: Most frames per ``predict`` call, at least the batch size of its InferenceServer.
+        :param slot_bytes: Initial slot size, grown when a larger frame arrives.
+        """
+        self.path = path
+        self.backend = backend
+        self.int8 = int8
+        self.worker = ProcessWorker(
+            f"model-{os.path.splitext(os.path.basename(path))[0]}",
+            partial(_model_worker, path, backend, device, imgsz, int8, exporter),
+            slots, slot_bytes, restart_policy)
+
+    @property
+    def names(self):
+        return self.worker.info['names']
+
+    @property
+    def device(self):
+        return self.worker.info['device']
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        return self.worker.call(frames, kwargs)
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+    def shutdown(self):
+        self.worker.shutdown()
+
+
+def _encode_worker():
+    """ Worker factory: JPEG-encodes the frame of each call, see ``frame_broadcaster.encode_frame``. """
+    from frame_broadcaster import encode_frame
+
+    return (lambda frames, jobs: encode_frame(frames[0], jobs)), None
+
+
+class FrameEncoder:
+    """
+    JPEG encoding on ``workers`` processes for ``FrameBroadcaster``.
+
+    Each call takes whichever worker is idle, so cameras publishing at the
+    same time encode on different cores.
+    """
+
+    def __init__(self, workers=2, slot_bytes=1920 * 1080 * 3, restart_policy=None):
+        """
+        :param workers: Number of encoder processes.
+        :param slot_bytes: Initial slot size, grown when a larger frame arrives.
+        :param restart_policy: Callable returning a RestartPolicy per worker.
+        """
+        self.workers = [ProcessWorker(f"encoder-{index}", _encode_worker, 1, slot_bytes,
+                                      restart_policy() if restart_policy else None)
+                        for index in range(max(1, int(workers)))]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def encode(self, frame, jobs):
+        """
+        :param jobs: List of (scale, quality) pairs.
+        :return: Encoded bytes, one per job.
+        """
+        worker = self.idle.get()
+        try:
+            return worker.call([frame], jobs)
+        finally:
+            self.idle.put(worker)
+
+    def stats(self):
+        return {worker.name: worker.stats() for worker in self.workers}
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.shutdown()
+
+
+def _decode(source, options, events, control, free, stop):
+    """
+    Decode process: runs a ``FrameGrabber`` and hands every frame it delivers
+    to the parent through the ring whose spec arrives on ``control``.
+    """
+    from frame_grabber import FrameGrabber
+
+    grabber = FrameGrabber(source, **options)
+    events.put(('open', grabber.frame_width, grabber.frame_height, grabber.fps))
+    ring = SharedFrameRing.attach(control.get())
+    sent = 0
+    try:
+        while not stop.is_set():
+            grabbed = grabber.read(timeout=0.5)
+            if grabbed is None:
+                if grabber.is_finished:
+                    events.put(('end', grabber.stats()))
+                    break
+                continue
+            frame, timestamp, index = grabbed
+            # Realtime grabbers keep decoding and dropping stale frames while no slot is free
+            slot = None
+            while slot is None and not stop.is_set():
+                try:
+                    slot = free.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+            if slot is None:
+                break
+            shape, dtype = ring.write(slot, frame)
+            sent += 1
+            events.put(('frame', slot, shape, dtype, timestamp, index, grabber.stats() if sent % 30 == 0 else None))
+    finally:
+        grabber.release()
+        ring.close()
+
+
+class ProcessGrabber:
+    """
+    ``FrameGrabber`` running in a decode process, with the same interface.
+
+    Decoded frames come back through a ``SharedFrameRing`` and are copied out
+    of their slot on ``read``, so the slot is free again at once and the
+    camera may keep the frame as long as it likes. A live source whose decode
+    process dies is restarted as its ``RestartPolicy`` allows; an offline
+    file is not, since it would be processed from the start again.
+    """
+
+    def __init__(self, source, buffer_size=1, max_age=0.5, loop=True, realtime=True, start_time=None, restart_policy=None, start_timeout=30.0, context=None):
+        """
+        See ``FrameGrabber`` for the first arguments.
+
+        :param restart_policy: RestartPolicy of the decode process.
+        :param start_timeout: Seconds the decode process may take to open the source.
+        :param context: multiprocessing context, ``spawn`` by default.
+        """
+        self.source = source
+        self.options = {'buffer_size': buffer_size, 'max_age': max_age, 'loop': loop, 'realtime': realtime, 'start_time': start_time}
+        self.buffer_size = buffer_size
+        self.max_age = max_age
+        self.realtime = realtime
+        self.restart_policy = restart_policy or RestartPolicy()
+        self.start_timeout = start_timeout
+        self.context = context or multiprocessing.get_context("spawn")
+        # One slot more than the buffer, so the decoder can fill one while the camera reads another
+        self.slots = max(2, int(buffer_size) + 1)
+        self.ring = None
+        self.process = None
+        self.ended = False
+        self.decoder_stats = {}
+        self.delivered = 0
+        self.late = 0
+        self.start()
+
+    @property
+    def restarts(self):
+        return self.restart_policy.total
+
+    def start(self):
+        self.events = self.context.Queue()
+        self.control = self.context.Queue()
+        self.free = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.process = self.context.Process(
+            target=_decode, args=(self.source, self.options, self.events, self.control, self.free, self.stop_event),
+            name=f"decoder-{self.source}", daemon=True)
+        self.process.start()
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                _, width, height, fps = self.events.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self._stop()
+                    raise RuntimeError(f"Decoder of {self.source} did not start")
+        self.frame_width, self.frame_height, self.fps = width, height, fps
+        if self.ring is None or self.ring.slot_bytes < width * height * 3:
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = SharedFrameRing(self.slots, max(1, width * height * 3))
+        for slot in range(self.slots):
+            self.free.put(slot)
+        self.control.put(self.ring.spec())
+
+    def read(self, timeout=1.0):
+        """
+        :return: Tuple of (frame, capture timestamp, frame index), or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.ended:
+            try:
+                message = self.events.get(timeout=max(0.0, min(0.5, deadline - time.monotonic())))
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self._restart()
+                if time.monotonic() >= deadline:
+                    return None
+                continue
+            if message[0] == 'end':
+                self.ended = True
+                self.decoder_stats = message[1]
+                return None
+            _, slot, shape, dtype, timestamp, index, stats = message
+            frame = self.ring.view(slot, shape, dtype).copy()
+            self.free.put(slot)
+            if stats:
+                self.decoder_stats = stats
+            self.delivered += 1
+            if self.realtime and time.time() - timestamp > self.max_age:
+                self.late += 1
+            return frame, timestamp, index
+        return None
+
+    def _restart(self):
+        exitcode = self.process.exitcode
+        self._stop()
+        while True:
+            delay = self.restart_policy.next_delay() if self.realtime else None
+            if delay is None:
+                logger.error("Decoder of %s exited with code %s, giving up", self.source, exitcode)
+                self.ended = True
+                return
+            logger.warning("Decoder of %s exited with code %s, restarting in %.1fs", self.source, exitcode, delay)
+            time.sleep(delay)
+            try:
+                self.start()
+                return
+            except RuntimeError as e:
+                logger.error("%s", e)
+                exitcode = self.process.exitcode
+
+    @property
+    def is_finished(self):
+        return self.ended
+
+    def stats(self):
+        return {
+            'captured': self.decoder_stats.get('captured', 0),
+            'delivered': self.delivered,
+            'dropped': self.decoder_stats.get('dropped', 0),
+            'late': self.late,
+            'buffer_size': self.buffer_size,
+            'restarts': self.restarts,
+        }
+
+    def _stop(self, timeout=2.0):
+        if self.process is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1.0)
+        for channel in (self.events, self.control, self.free):
+            channel.close()
+            channel.cancel_join_thread()
+
+    def release(self):
+        self._stop()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
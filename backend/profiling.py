@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from collections import deque
+import metrics
+import threading
+import time
+
+
+def percentile(sorted_values, q):
+    """ Nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class StageTimer:
+    """
+    Collects wall-clock durations of named pipeline stages.
+
+    Each stage keeps its last ``history`` samples plus running totals, so
+    recording costs a lock and an append and the summary can report
+    percentiles without unbounded memory.
+    """
+
+    def __init__(self, history=2000, histogram=None):
+        """
+        :param history: Recent samples kept per stage for the percentiles.
+        :param histogram: Optional ``metrics.Histogram`` labelled by stage that every sample is also observed into.
+        """
+        self.history = history
+        self.histogram = histogram
+        self.samples = {}
+        self.counts = {}
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.history)
+                self.counts[stage] = 0
+                self.totals[stage] = 0.0
+            samples.append(seconds)
+            self.counts[stage] += 1
+            self.totals[stage] += seconds
+        if self.histogram is not None:
+            self.histogram.observe(seconds, stage)
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        :return: Per stage: count, total seconds and mean/p50/p95/p99/max in milliseconds
+            (percentiles over the recent samples).
+        """
+        with self.lock:
+            snapshot = {stage: (sorted(samples), self.counts[stage], self.totals[stage]) for stage, samples in self.samples.items()}
+        return {
+            stage: {
+                'count': count,
+                'total_s': total,
+                'mean_ms': total / count * 1000 if count else 0.0,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'max_ms': samples[-1] * 1000 if samples else 0.0,
+            }
+            for stage, (samples, count, total) in snapshot.items()
+        }
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.totals.clear()
+
+
+# Process-wide timer the pipeline components record into
+timer = StageTimer(histogram=metrics.registry.histogram(
+    'traffic_stage_duration_seconds', "Duration of pipeline stages.", ('stage',)))
+
+
+def stage(name):
+    """ Context manager timing a block as ``name`` on the process-wide timer. """
+    return timer.measure(name)
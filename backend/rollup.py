@@ -0,0 +1,109 @@
+from models import Vehicle, Violation, DailyRollup, vehicle_violation
+from datetime import datetime, timezone
+from collections import defaultdict
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+# Speeds are kept as a histogram of 5 km/h bins, the last bin holding everything above
+SPEED_BIN_WIDTH = 5
+SPEED_BINS = 40
+
+
+def speed_bin(speed):
+    return min(SPEED_BINS - 1, max(0, int((speed or 0) // SPEED_BIN_WIDTH)))
+
+
+def percentile(histogram, q):
+    """
+    Estimates a speed percentile from a histogram, interpolating inside the bin.
+
+    :param histogram: Counts per speed bin.
+    :param q: Percentile between 0 and 100.
+    :return: Speed in km/h, or None for an empty histogram.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total * q / 100.0
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= target:
+            return (index + (target - seen) / count) * SPEED_BIN_WIDTH
+        seen += count
+    return len(histogram) * SPEED_BIN_WIDTH
+
+
+def local_day(timestamp, tz):
+    """ Calendar day of an epoch timestamp in the report timezone. """
+    return datetime.fromtimestamp(timestamp, tz).date()
+
+
+def record(session, entries):
+    """
+    Adds a batch of violations to the daily rollup inside the caller's transaction.
+
+    :param session: SQLAlchemy session.
+    :param entries: Iterable of (day, camera id, violation names, speed).
+    """
+    deltas = defaultdict(lambda: [0, 0.0, [0] * SPEED_BINS])
+    for day, camera_id, violations, speed in entries:
+        for name in dict.fromkeys(violations):
+            delta = deltas[(day, camera_id or "", name)]
+            delta[0] += 1
+            delta[1] = max(delta[1], float(speed or 0))
+            delta[2][speed_bin(speed)] += 1
+    if not deltas:
+        return
+
+    days = {key[0] for key in deltas}
+    existing = {(row.day, row.camera_id, row.violation): row
+                for row in session.query(DailyRollup).filter(DailyRollup.day.in_(days))}
+    for key, (count, speed_max, histogram) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            session.add(DailyRollup(day=key[0], camera_id=key[1], violation=key[2], count=count,
+                                    speed_max=speed_max, speed_histogram=json.dumps(histogram)))
+            continue
+        merged = json.loads(row.speed_histogram)
+        row.count += count
+        row.speed_max = max(row.speed_max or 0.0, speed_max)
+        row.speed_histogram = json.dumps([a + b for a, b in zip(merged, histogram)])
+
+
+def summarize(rows):
+    """ Turns rollup rows into report lines with percentiles. """
+    lines = []
+    for row in rows:
+        histogram = json.loads(row.speed_histogram)
+        # Interpolation inside the top bin can overshoot the fastest vehicle
+        p50, p95 = (min(p, row.speed_max) if p is not None and row.speed_max is not None else p
+                    for p in (percentile(histogram, 50), percentile(histogram, 95)))
+        lines.append({
+            'day': row.day,
+            'camera_id': row.camera_id or "-",
+            'violation': row.violation,
+            'count': row.count,
+            'speed_p50': p50,
+            'speed_p95': p95,
+            'speed_max': row.speed_max,
+        })
+    return lines
+
+
+def rebuild(session, tz, chunk=5000):
+    """
+    Recomputes the rollup from the vehicle records, e.g. for a database that
+    predates it. The caller commits.
+    """
+    session.query(DailyRollup).delete()
+    query = session.query(vehicle_violation.c.timestamp, Vehicle.camera_id, Violation.name, Vehicle.speed) \
+        .join(Vehicle, Vehicle.id == vehicle_violation.c.vehicle_id) \
+        .join(Violation, Violation.id == vehicle_violation.c.violation_id)
+    # Record timestamps are naive UTC
+    entries = [(local_day(timestamp.replace(tzinfo=timezone.utc).timestamp(), tz), camera_id, [name], speed)
+               for timestamp, camera_id, name, speed in query.all()]
+    for first in range(0, len(entries), chunk):
+        record(session, entries[first:first + chunk])
+        session.flush()
@@ -1,20 +1,26 @@
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, decode_token
 from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, Blueprint, request, jsonify, Response, url_for, render_template
-from models import Vehicle, Violation, vehicle_violation, User, Subscriber
+from flask import Flask, Blueprint, request, jsonify, Response, url_for, render_template, send_file
+from models import Vehicle, Violation, vehicle_violation, User, Subscriber, DailyRollup, VIOLATION_NAMES
 from multiprocessing import Process
 from flask_socketio import SocketIO
 from flask_mail import Message
-from datetime import datetime
+from sqlalchemy.orm import joinedload
+from sqlalchemy import func
+from datetime import datetime, timedelta
 from threading import Thread
-from camera import Camera
-import pytesseract
+from camera_manager import CameraManager
+from concurrent.futures import TimeoutError
+from migrations import migrate
+from plate_search import search_vehicles
+import metrics
+import rollup
 import threading
-import base64
+import logging
 import pytz
 import os
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+logger = logging.getLogger(__name__)
 
 class Routes:
     def __init__(self, app, db, bcrypt, mail, jwt):
@@ -26,15 +32,29 @@ class Routes:
         self.main_bp = Blueprint('main', __name__)
         self.socketio = SocketIO(app, cors_allowed_origins="*")
 
-        self.camera = Camera(0, "camera1", self.socketio, self.db, self.app)
+        self.camera_manager = CameraManager(self.socketio, self.db, self.app)
 
         self.frames = {}
  
         self.socketio.on_event('connect', self.connect)
         self.socketio.on_event('disconnect', self.disconnect)
+        self.socketio.on_event('subscribe', self.subscribe_stream)
+        self.socketio.on_event('select_camera', self.select_camera)
+        self.socketio.on_event('unsubscribe', self.unsubscribe_stream)
 
         self.main_bp.add_url_rule('/cameras', 'cameras', self.cameras, methods=['GET'])
+        self.main_bp.add_url_rule('/cameras', 'add_camera', self.add_camera, methods=['POST'])
+        self.main_bp.add_url_rule('/cameras/<camera_id>', 'remove_camera', self.remove_camera, methods=['DELETE'])
+        self.main_bp.add_url_rule('/inference_stats', 'inference_stats', self.inference_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/postprocess_stats', 'postprocess_stats', self.postprocess_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/stream_stats', 'stream_stats', self.stream_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/writer_stats', 'writer_stats', self.writer_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/ocr_stats', 'ocr_stats', self.ocr_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/metrics', 'metrics', self.metrics, methods=['GET'])
         self.main_bp.add_url_rule('/vehicles', 'vehicles', self.get_vehicles, methods=['GET'])
+        self.main_bp.add_url_rule('/vehicles/search', 'search_vehicles', self.search_vehicles, methods=['GET'])
+        self.main_bp.add_url_rule('/violation_stats', 'violation_stats', self.violation_stats, methods=['GET'])
+        self.main_bp.add_url_rule('/vehicles/<int:vehicle_id>/image/<kind>', 'vehicle_image', self.vehicle_image, methods=['GET'])
         self.main_bp.add_url_rule('/auth/login', 'login', self.login, methods=['POST'])
         self.main_bp.add_url_rule('/auth/protected', 'protected', self.protected, methods=['GET'])
         self.main_bp.add_url_rule('/get_line', 'get_line', self.get_line, methods=['GET'])
@@ -43,6 +63,8 @@ class Routes:
         self.main_bp.add_url_rule('/update_polygon', 'update_polygon', self.update_polygon, methods=['POST'])
         self.main_bp.add_url_rule('/get_speed_limit', 'get_speed_limit', self.get_speed_limit, methods=['GET'])
         self.main_bp.add_url_rule('/update_speed_limit', 'update_speed_limit', self.update_speed_limit, methods=['POST'])
+        self.main_bp.add_url_rule('/get_detection_stride', 'get_detection_stride', self.get_detection_stride, methods=['GET'])
+        self.main_bp.add_url_rule('/update_detection_stride', 'update_detection_stride', self.update_detection_stride, methods=['POST'])
         self.main_bp.add_url_rule('/get_license_text/<int:vehicle_id>', 'get_license_text', self.get_license_text, methods=['GET'])
         self.main_bp.add_url_rule('/confirm/<token>', 'confirm_email', self.confirm_email, methods=['GET'])
         self.main_bp.add_url_rule('/auth/register', 'register', self.register, methods=['POST'])
@@ -55,27 +77,35 @@ class Routes:
 
         self.initialize_violations()
 
+        # After the tables exist, cameras restore their stored config
+        for camera_config in self.app.config.get('CAMERAS', [{'id': 'camera1', 'name': 'camera1', 'source': 0}]):
+            self.camera_manager.add_camera(camera_config['source'], camera_config.get('name'), camera_config.get('id'), camera_config.get('preprocess'))
+
     def start_run(self, host='0.0.0.0', port=5000):
         self.start_scheduler()
-        self.socketio.run(self.app, host=host, port=port)
+        try:
+            self.socketio.run(self.app, host=host, port=port)
+        finally:
+            # Stops capture threads and worker processes and frees their shared memory
+            self.camera_manager.shutdown()
 
     def initialize_violations(self):
         with self.app.app_context():
             self.db.create_all()
+            migrate(self.db)
             existing_violations = {v.name for v in Violation.query.all()}  # Get existing violations
             
-            violations_to_add = [
-                "No Helmet",
-                "Overloading",
-                "Overspeeding"
-            ]
-
-            for violation_name in violations_to_add:
+            for violation_name in VIOLATION_NAMES:
                 if violation_name not in existing_violations:
                     self.db.session.add(Violation(name=violation_name))
             
             self.db.session.commit()
 
+            # Databases from before the rollup existed get it built once
+            if DailyRollup.query.first() is None and self.db.session.query(vehicle_violation).first() is not None:
+                rollup.rebuild(self.db.session, pytz.timezone(self.app.config.get('REPORT_TIMEZONE', 'UTC')))
+                self.db.session.commit()
+
     def add_cors_headers(self, response):
         """ Ensure proper CORS headers are added to all responses. """
         response.headers["Access-Control-Allow-Origin"] = "*"
@@ -91,7 +121,7 @@ class Routes:
         self.db.session.commit()
 
         # Send Confirmation Email
-        print("Confirmation")
+        logger.info("Sending confirmation email to user %s", user.id)
         token = create_access_token(identity=user.email, expires_delta=False)
         confirm_url = url_for("main.confirm_email", token=token, _external=True)
         msg = Message("Confirm Your Email", sender=self.app.config["MAIL_DEFAULT_SENDER"], recipients=[user.email])
@@ -120,7 +150,6 @@ class Routes:
         return jsonify({"access_token": access_token}), 200
 
     def subscribe(self):
-        print("Subscribing")
         data = request.get_json()
         email = data.get("email")
 
@@ -139,142 +168,434 @@ class Routes:
         return jsonify({"message": "Subscription successful"}), 201
 
     def start_scheduler(self):
-        scheduler = BackgroundScheduler(timezone=pytz.timezone("Asia/Manila"))  # Set to your timezone
+        scheduler = BackgroundScheduler(timezone=pytz.timezone(self.app.config.get('REPORT_TIMEZONE', 'UTC')))
         scheduler.add_job(lambda: self.send_daily_report(), "cron", hour=8, minute=0)  # Run at 8:00 AM daily
         scheduler.start()
 
     def get_time_now(self):
-        manila_time = pytz.timezone("Asia/Manila")
-        self.send_daily_report()
-        return  jsonify({"DateTime":datetime.now(manila_time).strftime("%Y-%m-%d %H:%M:%S %Z")})
+        report_time = pytz.timezone(self.app.config.get('REPORT_TIMEZONE', 'UTC'))
+        return jsonify({"DateTime": datetime.now(report_time).strftime("%Y-%m-%d %H:%M:%S %Z")})
 
-    def send_daily_report(self):
-        with self.app.app_context():
-            # Fetch vehicles registered today
-            today = datetime.utcnow().date()
-            vehicles = Vehicle.query.all()  # Change to filter by today if needed
+    def send_daily_report(self, day=None):
+        """
+        Mails the report of a day (yesterday by default) to every subscriber.
 
-            # if not vehicles:
-            #     print("No new records for today.")
-            #     return
-            
-            # Prepare the HTML email content
-            email_body = render_template("daily_report.html", vehicles=vehicles)
+        The report reads only the daily rollup, so it costs O(days) rather than
+        O(vehicles). Subscribers are BCC'd in batches of ``REPORT_BCC_BATCH_SIZE``
+        over a single SMTP connection, so each address gets exactly one email.
+        """
+        report_time = pytz.timezone(self.app.config.get('REPORT_TIMEZONE', 'UTC'))
+        day = day or datetime.now(report_time).date() - timedelta(days=1)
+        first_day = day - timedelta(days=self.app.config.get('REPORT_DAYS', 7) - 1)
 
-            # Fetch all subscribed users (replace with your user model)
-            subscribers = Subscriber.query.all()  # Replace with your subscriber model
+        with self.app.app_context():
+            rows = DailyRollup.query.filter(DailyRollup.day >= first_day, DailyRollup.day <= day) \
+                .order_by(DailyRollup.day.desc(), DailyRollup.camera_id, DailyRollup.violation).all()
+            lines = rollup.summarize(rows)
+            totals = {}
+            for line in lines:
+                totals[line['day']] = totals.get(line['day'], 0) + line['count']
+
+            subscribers = [subscriber.email for subscriber in Subscriber.query.all()]
             if not subscribers:
-                print("No subscribers found.")
-                return
-            
-            recipient_emails = [subscriber.email for subscriber in subscribers]
-
-            for email in subscribers:
-                msg = Message(
-                    subject="Daily Vehicle Report",
-                    sender=self.app.config["MAIL_DEFAULT_SENDER"],
-                    recipients=recipient_emails,
-                    html=email_body
-                )
-                self.mail.send(msg)
-
-            print(f"Sent daily report to {len(subscribers)} subscribers.")
+                logger.info("No subscribers for the daily report")
+                return 0
+
+            email_body = render_template(
+                "daily_report.html",
+                day=day,
+                lines=[line for line in lines if line['day'] == day],
+                totals=[(first_day + timedelta(days=i), totals.get(first_day + timedelta(days=i), 0))
+                        for i in range((day - first_day).days + 1)],
+            )
+
+            batch_size = max(1, self.app.config.get('REPORT_BCC_BATCH_SIZE', 50))
+            sender = self.app.config["MAIL_DEFAULT_SENDER"]
+            with self.mail.connect() as connection:
+                for first in range(0, len(subscribers), batch_size):
+                    connection.send(Message(
+                        subject=f"Daily Vehicle Report {day.isoformat()}",
+                        sender=sender,
+                        recipients=[sender] if sender else [],
+                        bcc=subscribers[first:first + batch_size],
+                        html=email_body
+                    ))
+
+            logger.info("Sent the daily report for %s to %d subscribers", day, len(subscribers))
+            return len(subscribers)
+
+    def parse_datetime_arg(self, name):
+        value = request.args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Invalid '{name}', expected an ISO 8601 date or datetime")
 
     def get_vehicles(self):
-        vehicles = Vehicle.query.all()
-        vehicles_data = []
-
-        for v in vehicles:
-            image_path = os.path.join(self.app.config['UPLOAD_FOLDER'], v.image_path)
-            license_path = os.path.join(self.app.config['UPLOAD_FOLDER'], v.license_path)
-
-            if os.path.exists(image_path):
-                with open(image_path, "rb") as img_file:
-                    base64_string = base64.b64encode(img_file.read()).decode("utf-8")
-            else:
-                base64_string = None  # If no image exists
-
-            if os.path.exists(license_path):
-                with open(license_path, "rb") as img_file:
-                    license_base64_string = base64.b64encode(img_file.read()).decode("utf-8")
-            else:
-                license_base64_string = None  # If no image exists
-
-            violations = [violation.name for violation in v.violations] if v.violations else []
-
-            stmt = self.db.session.query(Violation.name, vehicle_violation.c.timestamp) \
-                    .join(vehicle_violation, Violation.id == vehicle_violation.c.violation_id) \
-                    .filter(vehicle_violation.c.vehicle_id == v.id)
-
-            timestamp = stmt.all()[0].timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-            speed = v.speed
-
-            vehicles_data.append({
-                'id': v.id,
-                'image_base64': base64_string,
-                'license_base64': license_base64_string,
-                'timestamp': timestamp,
-                'violations': violations,
-                'speed': speed,
-            })
+        """
+        Lists vehicles newest first, one page at a time.
+
+        Query parameters: ``limit`` (default 50, max 500), ``cursor`` (the
+        ``next_cursor`` of the previous page), ``start``/``end`` (ISO dates),
+        ``violation`` (repeatable) and ``min_speed``. Images are returned as
+        URLs served by ``/vehicles/<id>/image/<kind>``.
+        """
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        cursor = request.args.get('cursor', type=int)
+        violation_names = request.args.getlist('violation')
+        min_speed = request.args.get('min_speed', type=float)
+        try:
+            start = self.parse_datetime_arg('start')
+            end = self.parse_datetime_arg('end')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Timestamp of a vehicle is the time its first violation was recorded
+        first_seen = self.db.session.query(
+            vehicle_violation.c.vehicle_id,
+            func.min(vehicle_violation.c.timestamp).label('timestamp')
+        ).group_by(vehicle_violation.c.vehicle_id).subquery()
+
+        query = self.db.session.query(Vehicle, first_seen.c.timestamp) \
+            .outerjoin(first_seen, first_seen.c.vehicle_id == Vehicle.id) \
+            .options(joinedload(Vehicle.violations))
+
+        if cursor is not None:
+            query = query.filter(Vehicle.id < cursor)
+        if start is not None:
+            query = query.filter(first_seen.c.timestamp >= start)
+        if end is not None:
+            query = query.filter(first_seen.c.timestamp <= end)
+        if violation_names:
+            query = query.filter(Vehicle.violations.any(Violation.name.in_(violation_names)))
+        if min_speed is not None:
+            query = query.filter(Vehicle.speed >= min_speed)
+
+        rows = query.order_by(Vehicle.id.desc()).limit(limit + 1).all()
+        next_cursor = rows[limit - 1][0].id if len(rows) > limit else None
+
+        vehicles_data = [self.vehicle_item(v, timestamp) for v, timestamp in rows[:limit]]
+        return jsonify({'items': vehicles_data, 'next_cursor': next_cursor})
+
+    def search_vehicles(self):
+        """
+        Searches vehicles through the indexed columns.
+
+        Query parameters: ``plate`` (prefix of the plate, case and punctuation
+        insensitive), ``fuzzy=1`` (trigram match ranked by similarity, single
+        page), ``start``/``end``, ``violation`` (repeatable), ``min_speed``,
+        ``max_speed``, ``limit`` and ``cursor``.
+        """
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        try:
+            start = self.parse_datetime_arg('start')
+            end = self.parse_datetime_arg('end')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        rows, next_cursor = search_vehicles(
+            self.db.session,
+            plate=request.args.get('plate'),
+            fuzzy=request.args.get('fuzzy', '0').lower() in ('1', 'true', 'yes'),
+            start=start,
+            end=end,
+            violations=request.args.getlist('violation'),
+            min_speed=request.args.get('min_speed', type=float),
+            max_speed=request.args.get('max_speed', type=float),
+            limit=limit,
+            cursor=request.args.get('cursor', type=int),
+        )
+        return jsonify({'items': [self.vehicle_item(v, timestamp) for v, timestamp in rows], 'next_cursor': next_cursor})
+
+    def violation_stats(self):
+        """
+        Violation counts per type and per day or hour of day, for the analytics charts.
+
+        Query parameters: ``start``/``end`` (ISO dates, inclusive days in
+        ``REPORT_TIMEZONE``), ``violation`` (repeatable) and ``group``
+        (``date`` or ``hour``). The per-day numbers come from the daily rollup;
+        hours are counted by the database in hourly buckets, so neither sends
+        the vehicle records themselves.
+        """
+        report_time = pytz.timezone(self.app.config.get('REPORT_TIMEZONE', 'UTC'))
+        group = request.args.get('group', 'date')
+        if group not in ('date', 'hour'):
+            return jsonify({"error": "Invalid 'group', expected 'date' or 'hour'"}), 400
+        violation_names = request.args.getlist('violation')
+        try:
+            start = self.parse_datetime_arg('start')
+            end = self.parse_datetime_arg('end')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        first_day = start.date() if start else None
+        last_day = end.date() if end else None
+
+        query = DailyRollup.query
+        if first_day is not None:
+            query = query.filter(DailyRollup.day >= first_day)
+        if last_day is not None:
+            query = query.filter(DailyRollup.day <= last_day)
+        rows = query.all()
+        names = sorted(set(VIOLATION_NAMES) | {row.violation for row in rows})
+        if violation_names:
+            rows = [row for row in rows if row.violation in violation_names]
+
+        counts = {}
+        for row in rows:
+            counts[row.violation] = counts.get(row.violation, 0) + row.count
+
+        trend = {}
+        if group == 'date':
+            for row in rows:
+                trend[row.day.isoformat()] = trend.get(row.day.isoformat(), 0) + row.count
+            trend = dict(sorted(trend.items()))
+        else:
+            # Record timestamps are naive UTC, the hours are folded into the report timezone
+            bucket = func.strftime('%Y-%m-%d %H:00:00', vehicle_violation.c.timestamp)
+            hours = self.db.session.query(bucket, func.count()) \
+                .select_from(vehicle_violation) \
+                .join(Violation, Violation.id == vehicle_violation.c.violation_id)
+            if first_day is not None:
+                hours = hours.filter(vehicle_violation.c.timestamp >= self.utc_midnight(first_day, report_time))
+            if last_day is not None:
+                hours = hours.filter(vehicle_violation.c.timestamp < self.utc_midnight(last_day + timedelta(days=1), report_time))
+            if violation_names:
+                hours = hours.filter(Violation.name.in_(violation_names))
+            for hour, count in hours.group_by(bucket).all():
+                local = pytz.utc.localize(datetime.strptime(hour, '%Y-%m-%d %H:%M:%S')).astimezone(report_time)
+                trend[local.hour] = trend.get(local.hour, 0) + count
+            trend = {f"{hour}:00": trend[hour] for hour in sorted(trend)}
+
+        return jsonify({
+            'names': names,
+            'violations': [{'violation': name, 'count': count} for name, count in sorted(counts.items())],
+            'trend': [{'label': label, 'count': count} for label, count in trend.items()],
+        })
+
+    def utc_midnight(self, day, tz):
+        """ Naive UTC datetime of the start of ``day`` in ``tz``, comparable with record timestamps. """
+        return tz.localize(datetime.combine(day, datetime.min.time())).astimezone(pytz.utc).replace(tzinfo=None)
+
+    def vehicle_item(self, v, timestamp):
+        return {
+            'id': v.id,
+            'image_url': url_for('main.vehicle_image', vehicle_id=v.id, kind='motorist', _external=True) if v.image_path else None,
+            'license_url': url_for('main.vehicle_image', vehicle_id=v.id, kind='license', _external=True) if v.license_path else None,
+            'thumbnail_url': url_for('main.vehicle_image', vehicle_id=v.id, kind='motorist', size=self.app.config.get('THUMBNAIL_SIZES', (160,))[0], _external=True) if v.image_path else None,
+            'timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else None,
+            'violations': [violation.name for violation in v.violations],
+            'speed': v.speed,
+            'plate_text': v.plate_text,
+        }
+
+    def vehicle_image(self, vehicle_id, kind):
+        """
+        Serves a vehicle's evidence image with ETag/Last-Modified revalidation.
+        With ``?size=<px>`` (one of ``THUMBNAIL_SIZES``) a cached thumbnail is served instead.
+        """
+        if kind not in ('motorist', 'license'):
+            return jsonify({"error": "Unknown image kind"}), 404
+        size = request.args.get('size', type=int)
+        if size is not None and size not in self.app.config.get('THUMBNAIL_SIZES', (160,)):
+            return jsonify({"error": "Unsupported thumbnail size"}), 400
+        vehicle = self.db.session.get(Vehicle, vehicle_id)
+        if not vehicle:
+            return jsonify({"error": "Vehicle not found"}), 404
 
-        return jsonify(vehicles_data)
+        stored = vehicle.image_path if kind == 'motorist' else vehicle.license_path
+        if not stored:
+            return jsonify({"error": "Image not found"}), 404
+        store = self.camera_manager.evidence_store
+        path = store.thumbnail(stored, size) if size else store.path(stored)
+        if not path or not os.path.isfile(path):
+            return jsonify({"error": "Image not found"}), 404
+        return send_file(path, conditional=True, etag=True, max_age=self.app.config.get('IMAGE_CACHE_MAX_AGE', 86400))
 
     def get_license_text(self, vehicle_id):
-        print("OK, license text")
-        vehicle = Vehicle.query.get(vehicle_id)
-        
+        """
+        Returns the plate text read by the background OCR workers. Plates not
+        read yet are queued (once) and awaited for up to ``OCR_REQUEST_WAIT``
+        seconds; if the job is still running the answer is 202 ``pending``.
+        """
+        vehicle = self.db.session.get(Vehicle, vehicle_id)
         if not vehicle:
             return jsonify({"error": "Vehicle not found"}), 404
-
-        license_path = os.path.join(self.app.config['UPLOAD_FOLDER'], vehicle.license_path) if vehicle.license_path else None
-
-        license_text = pytesseract.image_to_string(license_path)
-
-        if not license_text:
-            license_text = "XXXX-XXXX"
-
-        return jsonify({"license_text": license_text})
+        if not vehicle.license_path:
+            return jsonify({"license_text": "XXXX-XXXX", "confidence": 0.0, "status": "no_plate"})
+
+        text, confidence = vehicle.plate_text, vehicle.plate_confidence
+        if confidence is None:
+            future = self.camera_manager.plate_reader.submit(vehicle.id, vehicle.license_path)
+            try:
+                text, confidence = future.result(timeout=self.app.config.get('OCR_REQUEST_WAIT', 2.0))
+            except TimeoutError:
+                return jsonify({"license_text": None, "status": "pending"}), 202
+            except Exception:
+                text, confidence = None, 0.0
+
+        return jsonify({"license_text": text or "XXXX-XXXX", "confidence": confidence, "status": "done"})
+
+    def get_camera(self, camera_id=None):
+        """ Resolves the camera addressed by the request, defaulting to the first camera. """
+        if camera_id is None:
+            camera_id = request.args.get('camera_id')
+        if camera_id is None and request.is_json:
+            camera_id = (request.get_json(silent=True) or {}).get('camera_id')
+        return self.camera_manager.get(camera_id)
 
     def cameras(self):
-        with self.app.app_context():
-            return jsonify([camera.name])
+        return jsonify([camera.to_dict() for camera in self.camera_manager.list()])
+
+    def add_camera(self):
+        data = request.json
+        if not data or "source" not in data:
+            return jsonify({"error": "Invalid data format"}), 400
+        try:
+            camera = self.camera_manager.add_camera(data["source"], data.get("name"), data.get("id"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        return jsonify({"message": "Camera added", "camera": camera.to_dict()}), 201
+
+    def remove_camera(self, camera_id):
+        if not self.camera_manager.remove_camera(camera_id):
+            return jsonify({"error": "Camera not found"}), 404
+        return jsonify({"message": "Camera removed", "camera_id": camera_id}), 200
+
+    def inference_stats(self):
+        return jsonify({
+            'detector': self.camera_manager.inference_server.stats(),
+            'license': self.camera_manager.license_server.stats(),
+            'violation': self.camera_manager.violation_server.stats(),
+            'models': self.camera_manager.models.describe(),
+        })
+
+    def postprocess_stats(self):
+        return jsonify(self.camera_manager.worker_pool.stats())
+
+    def writer_stats(self):
+        return jsonify(self.camera_manager.violation_writer.stats())
+
+    def ocr_stats(self):
+        return jsonify(self.camera_manager.plate_reader.stats())
+
+    def metrics(self):
+        """ Pipeline metrics in the Prometheus text exposition format. """
+        return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    def stream_stats(self):
+        broadcaster = self.camera_manager.broadcaster
+        stats = broadcaster.stats()
+        stats['cameras'] = {camera.id: broadcaster.subscriber_count(camera.id) for camera in self.camera_manager.list()}
+        return jsonify(stats)
 
     def get_speed_limit(self):
-        return jsonify({'speed_limit': self.camera.get_speed_limit()})
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
+        return jsonify({'speed_limit': camera.get_speed_limit()})
 
     def get_line(self):
-        line_coords = self.camera.get_line()
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
+        line_coords = camera.get_line()
         return jsonify(line_coords)
 
     def get_polygon(self):
-        polygon_coords = self.camera.get_polygon()
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
+        polygon_coords = camera.get_polygon()
         return jsonify(polygon_coords)
 
     def update_speed_limit(self):
         data = request.json
-        print("Ok, updating speed limit")
-        print(data)
+        logger.info("Updating speed limit: %s", data)
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
         if "speed_limit" in data:
-            speed_limit = data["speed_limit"]
-            self.camera.set_speed_limit(speed_limit)
+            try:
+                speed_limit = float(data["speed_limit"])
+                camera.set_speed_limit(speed_limit)
+            except (TypeError, ValueError):
+                return jsonify({"error": "speed_limit must be a positive number"}), 400
+            self.camera_manager.save_config(camera)
             return jsonify({"message": "Speed limit updated", "speed_limit": speed_limit}), 200
         return jsonify({"error": "Invalid data format"}), 400
 
+    def get_detection_stride(self):
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
+        return jsonify(camera.get_detection_stride())
+
+    def update_detection_stride(self):
+        """
+        Switches a camera between detecting every frame (``adaptive: false``) and
+        the adaptive stride. Settings that are left out keep their current value.
+        """
+        data = request.json
+        logger.info("Updating detection stride: %s", data)
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid data format"}), 400
+        if not data.get("adaptive", True):
+            detection_stride = camera.set_detection_stride(None)
+            self.camera_manager.save_config(camera)
+            return jsonify({"message": "Detection stride updated", "detection_stride": detection_stride}), 200
+
+        current = camera.get_detection_stride()
+        settings = {key: current[key] for key in ("min_stride", "max_stride", "target_fps", "near_line", "busy_tracks") if key in current}
+        try:
+            for key, cast in (("min_stride", int), ("max_stride", int), ("near_line", float), ("busy_tracks", int)):
+                if key in data:
+                    settings[key] = cast(data[key])
+            if "target_fps" in data:
+                settings["target_fps"] = float(data["target_fps"]) if data["target_fps"] is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid data format"}), 400
+        detection_stride = camera.set_detection_stride(self.camera_manager.detection_stride_settings(**settings))
+        self.camera_manager.save_config(camera)
+        return jsonify({"message": "Detection stride updated", "detection_stride": detection_stride}), 200
+
     def update_polygon(self):
         data = request.json
-        print("Ok, updating polygon")
+        logger.info("Updating polygon: %s", data)
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
         if all(key in data for key in ["x1", "y1", "x2", "y2", "x3", "y3", "x4", "y4"]):
-            polygon_coords = self.camera.set_polygon(data['x1'], data['y1'], data['x2'], data['y2'], data['x3'], data['y3'], data['x4'], data['y4'])
+            try:
+                size = {key: float(data[key]) for key in ("width_m", "length_m") if data.get(key) is not None}
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid data format"}), 400
+            if any(value <= 0 for value in size.values()):
+                return jsonify({"error": "width_m and length_m must be positive"}), 400
+            try:
+                polygon_coords = camera.set_polygon(data['x1'], data['y1'], data['x2'], data['y2'], data['x3'], data['y3'], data['x4'], data['y4'], **size)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            self.camera_manager.save_config(camera)
             return jsonify({"message": "Polygon coordinates updated", "polygon_coords": polygon_coords}), 200
         return jsonify({"error": "Invalid data format"}), 400
 
     def update_line(self):
         data = request.json
-        print("Ok, updating line")
+        logger.info("Updating line: %s", data)
+        camera = self.get_camera()
+        if not camera:
+            return jsonify({"error": "Camera not found"}), 404
         if all(key in data for key in ["x1", "y1", "x2", "y2"]):
-            line_coords = self.camera.set_line(data['x1'], data['y1'], data['x2'], data['y2'])
+            try:
+                line_coords = camera.set_line(data['x1'], data['y1'], data['x2'], data['y2'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            self.camera_manager.save_config(camera)
             return jsonify({"message": "Line coordinates updated", "line_coords": line_coords}), 200
         return jsonify({"error": "Invalid data format"}), 400
 
@@ -284,12 +605,43 @@ class Routes:
         return jsonify({"message": f"Welcome, {user}!"}), 200
 
     def connect(self):
-        print("Client connected")
-        self.streaming_active = True
-        self.socketio.start_background_task(self.camera.capture_frame)
+        logger.debug("Client %s connected", request.sid)
+        self.subscribe_stream(request.args)
+
+    def subscribe_stream(self, data):
+        """
+        Sets the stream of the calling client: camera, resolution tier
+        (full, half or thumbnail), JPEG quality and maximum frame rate.
+        Frames are sent as binary JPEG payloads on the 'frame' event.
+        """
+        data = data or {}
+        broadcaster = self.camera_manager.broadcaster
+        current = broadcaster.get(request.sid)
+        settings = current.to_dict() if current else {'camera_id': None, 'tier': 'full', 'quality': 95, 'max_fps': 30}
+
+        camera = self.camera_manager.get(data.get('camera_id', settings['camera_id']))
+        if not camera:
+            return {"error": "Camera not found"}
+        try:
+            subscription = broadcaster.subscribe(
+                request.sid,
+                camera.id,
+                tier=data.get('tier', settings['tier']),
+                quality=data.get('quality', settings['quality']),
+                max_fps=data.get('max_fps', settings['max_fps']),
+            )
+        except ValueError as e:
+            return {"error": str(e)}
+        return subscription.to_dict()
+
+    def select_camera(self, data):
+        """ Moves the client's stream subscription to another camera. """
+        return self.subscribe_stream({'camera_id': (data or {}).get('camera_id')})
+
+    def unsubscribe_stream(self, data=None):
+        self.camera_manager.broadcaster.unsubscribe(request.sid)
+        return {"message": "Unsubscribed"}
 
     def disconnect(self):
-        print("Client disconnected")
-        self.streaming_active = False
-        print("No clients connected, stopping streaming")
-
+        logger.debug("Client %s disconnected", request.sid)
+        self.camera_manager.broadcaster.unsubscribe(request.sid)
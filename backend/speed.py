@@ -0,0 +1,198 @@
+import numpy as np
+import time
+import cv2
+
+
+class TrackStore:
+    """
+    Per-track speed state as a struct of arrays.
+
+    Every column is a preallocated NumPy array indexed by slot; ``ids`` holds
+    the tracker id of each slot and -1 for free slots. Tracker ids are mapped
+    to slots with one sort and a ``searchsorted``, so a frame touches all of
+    its tracks in a few vectorized operations. The arrays double when full.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: Initial number of slots.
+        """
+        self.capacity = max(1, int(capacity))
+        self.ids = np.full(self.capacity, -1, dtype=np.int64)
+        self.entry_xy = np.zeros((self.capacity, 2), dtype=np.float64)
+        self.entry_time = np.zeros(self.capacity, dtype=np.float64)
+        self.inside = np.zeros(self.capacity, dtype=bool)
+        self.speed = np.zeros(self.capacity, dtype=np.float64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.ids >= 0))
+
+    def grow(self):
+        extra = self.capacity
+        self.ids = np.concatenate([self.ids, np.full(extra, -1, dtype=np.int64)])
+        self.entry_xy = np.concatenate([self.entry_xy, np.zeros((extra, 2), dtype=np.float64)])
+        self.entry_time = np.concatenate([self.entry_time, np.zeros(extra, dtype=np.float64)])
+        self.inside = np.concatenate([self.inside, np.zeros(extra, dtype=bool)])
+        self.speed = np.concatenate([self.speed, np.zeros(extra, dtype=np.float64)])
+        self.capacity += extra
+
+    def find(self, track_ids):
+        """
+        :param track_ids: Tracker ids.
+        :return: Slot of each id, -1 for ids that are not stored.
+        """
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        slots = np.full(len(track_ids), -1, dtype=np.int64)
+        occupied = np.flatnonzero(self.ids >= 0)
+        if not len(occupied) or not len(track_ids):
+            return slots
+        keys = self.ids[occupied]
+        order = np.argsort(keys)
+        positions = np.minimum(np.searchsorted(keys[order], track_ids), len(keys) - 1)
+        found = keys[order][positions] == track_ids
+        slots[found] = occupied[order[positions[found]]]
+        return slots
+
+    def assign(self, track_ids):
+        """
+        Slots of the given tracks, allocating and clearing slots for new ones.
+
+        :return: Tuple of (slots, mask of the ids that were new).
+        """
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        slots = self.find(track_ids)
+        new = slots < 0
+        count = int(np.count_nonzero(new))
+        if count:
+            free = np.flatnonzero(self.ids < 0)
+            while len(free) < count:
+                self.grow()
+                free = np.flatnonzero(self.ids < 0)
+            fresh = free[:count]
+            slots[new] = fresh
+            self.ids[fresh] = track_ids[new]
+            self.entry_xy[fresh] = 0.0
+            self.entry_time[fresh] = 0.0
+            self.inside[fresh] = False
+            self.speed[fresh] = 0.0
+        return slots, new
+
+    def release(self, track_ids):
+        """ Frees the slots of the given tracks. """
+        slots = self.find(track_ids)
+        self.ids[slots[slots >= 0]] = -1
+
+
+def region_homography(region, width_m, length_m):
+    """
+    Homography from image pixels to road-plane meters.
+
+    The four region points are taken in the order of the speed polygon (top
+    left, bottom left, bottom right, top right as seen by the camera) and
+    mapped to a ``width_m`` x ``length_m`` rectangle, x across and y along
+    the road.
+
+    :param region: Four (x, y) image points.
+    :param width_m: Real distance between the left and right edges, in meters.
+    :param length_m: Real distance between the top and bottom edges, in meters.
+    :return: 3x3 homography, or None when the points are degenerate.
+    """
+    source = np.array(region, dtype=np.float32).reshape(4, 2)
+    target = np.array([(0, 0), (0, length_m), (width_m, length_m), (width_m, 0)], dtype=np.float32)
+    # Three collinear points cannot span a plane
+    if abs(cv2.contourArea(source)) < 1.0:
+        return None
+    return cv2.getPerspectiveTransform(source, target)
+
+
+class SpeedEstimator:
+    """
+    Region based speed estimator fed by the camera's tracked detections.
+
+    Each box's bottom center (where the vehicle touches the road) is mapped to
+    meters through the homography of the speed region. A track's speed is its
+    average since it entered the region: straight-line distance from the entry
+    point over the capture time elapsed, in km/h. It is updated on every frame
+    while the track is inside and kept after it leaves. The estimator runs
+    neither a detector nor a tracker of its own: the camera detects and tracks
+    once per frame and hands the result to ``update``. A track's state is kept
+    until ``release`` is called for it by the camera's ``TrackManager``.
+    """
+
+    def __init__(self, region, width_m=7.0, length_m=20.0, min_interval=0.3, capacity=64):
+        """
+        :param region: Four (x, y) points describing the speed region.
+        :param width_m: Real width of the region in meters.
+        :param length_m: Real length of the region, along the road, in meters.
+        :param min_interval: Seconds a track must be inside before a speed is reported.
+        :param capacity: Initial number of track slots.
+        """
+        self.min_interval = min_interval
+        self.store = TrackStore(capacity)
+        self.set_region(region, width_m, length_m)
+
+    def set_region(self, region, width_m=None, length_m=None):
+        """
+        :param region: Four (x, y) points describing the speed region.
+        :param width_m: Real width in meters, unchanged when None.
+        :param length_m: Real length in meters, unchanged when None.
+        """
+        width_m = self.width_m if width_m is None else float(width_m)
+        length_m = self.length_m if length_m is None else float(length_m)
+        # Swapped as one tuple so the capture thread never sees a half-updated calibration
+        self.calibration = (region_homography(region, width_m, length_m), width_m, length_m)
+        self.region = np.array(region, dtype=np.int32).reshape((-1, 1, 2))
+        self.width_m = width_m
+        self.length_m = length_m
+
+    def to_meters(self, points):
+        """
+        :param points: (n, 2) image points.
+        :return: (n, 2) road-plane points in meters.
+        """
+        homography = self.calibration[0]
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if homography is None or not len(points):
+            return np.full((len(points), 2), np.nan)
+        return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+
+    def update(self, detections, timestamp=None):
+        """
+        Updates speeds from one frame of tracked detections.
+
+        :param detections: ``sv.Detections`` with ``tracker_id`` set.
+        :param timestamp: Capture time of the frame, defaults to now.
+        :return: Speed in km/h of each detection, 0 while not measured yet.
+        """
+        now = time.time() if timestamp is None else timestamp
+        store = self.store
+        if detections.tracker_id is None or not len(detections):
+            return np.zeros(len(detections), dtype=np.float64)
+
+        homography, width_m, length_m = self.calibration
+        xyxy = np.asarray(detections.xyxy, dtype=np.float64)
+        ground = np.column_stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, xyxy[:, 3]])
+        world = self.to_meters(ground) if homography is not None else np.full((len(xyxy), 2), np.nan)
+        inside = (world[:, 0] >= 0) & (world[:, 0] <= width_m) & (world[:, 1] >= 0) & (world[:, 1] <= length_m)
+
+        slots, new = store.assign(detections.tracker_id)
+        entered = inside & (new | ~store.inside[slots])
+        store.entry_xy[slots[entered]] = world[entered]
+        store.entry_time[slots[entered]] = now
+
+        elapsed = now - store.entry_time[slots]
+        measuring = inside & ~entered & (elapsed >= self.min_interval)
+        if measuring.any():
+            distance = np.linalg.norm(world[measuring] - store.entry_xy[slots[measuring]], axis=1)
+            store.speed[slots[measuring]] = distance / elapsed[measuring] * 3.6
+        store.inside[slots] = inside
+        return store.speed[slots].copy()
+
+    def release(self, track_ids):
+        """ Frees the state of evicted tracks, see ``TrackManager.on_evict``. """
+        self.store.release(track_ids)
+
+    def speed_of(self, track_id):
+        """ Last measured speed of a track in km/h, 0.0 when unknown. """
+        slot = self.store.find([track_id])[0]
+        return float(self.store.speed[slot]) if slot >= 0 else 0.0
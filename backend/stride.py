@@ -0,0 +1,141 @@
+import supervision as sv
+import numpy as np
+
+
+def segment_distance(points, start, end):
+    """
+    Distance of each point to the segment from ``start`` to ``end``.
+
+    :param points: (n, 2) array of points.
+    :return: (n,) array of distances.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    start = np.asarray(start, dtype=np.float64)
+    direction = np.asarray(end, dtype=np.float64) - start
+    length = float(direction @ direction)
+    if length == 0:
+        return np.linalg.norm(points - start, axis=1)
+    t = np.clip((points - start) @ direction / length, 0.0, 1.0)
+    return np.linalg.norm(points - (start + t[:, None] * direction), axis=1)
+
+
+class TrackPredictor:
+    """
+    Constant-velocity extrapolation of the last tracked boxes.
+
+    Fed with the tracker output of every detection frame, it predicts where
+    the tracks are on the frames in between so speed estimation and line
+    crossing keep running without a detector pass. Velocities are in pixels
+    per second of capture time and smoothed over detection frames.
+    """
+
+    def __init__(self, smoothing=0.5):
+        """
+        :param smoothing: Weight of the newest velocity measurement.
+        """
+        self.smoothing = smoothing
+        self.detections = sv.Detections.empty()
+        self.velocities = np.zeros((0, 4), dtype=np.float32)
+        self.timestamp = None
+
+    def update(self, detections, timestamp):
+        """
+        :param detections: Tracked ``sv.Detections`` of a detection frame.
+        :param timestamp: Capture time of that frame.
+        """
+        velocities = np.zeros((len(detections), 4), dtype=np.float32)
+        if detections.tracker_id is not None and self.timestamp is not None and len(self.detections) and timestamp > self.timestamp:
+            previous = {int(track_id): i for i, track_id in enumerate(self.detections.tracker_id)}
+            elapsed = timestamp - self.timestamp
+            for i, track_id in enumerate(detections.tracker_id):
+                j = previous.get(int(track_id))
+                if j is not None:
+                    measured = (detections.xyxy[i] - self.detections.xyxy[j]) / elapsed
+                    velocities[i] = self.smoothing * measured + (1 - self.smoothing) * self.velocities[j]
+        self.detections = detections
+        self.velocities = velocities
+        self.timestamp = timestamp
+
+    def predict(self, timestamp):
+        """
+        :return: The last tracked detections moved to ``timestamp``.
+        """
+        if not len(self.detections) or self.timestamp is None:
+            return sv.Detections.empty()
+        predicted = sv.Detections(
+            xyxy=(self.detections.xyxy + self.velocities * (timestamp - self.timestamp)).astype(np.float32),
+            confidence=self.detections.confidence,
+            class_id=self.detections.class_id,
+            tracker_id=self.detections.tracker_id,
+        )
+        return predicted
+
+
+class AdaptiveStride:
+    """
+    Picks how many frames pass between two detector runs.
+
+    After every detection the stride drops to ``min_stride`` when a track is
+    within ``near_line`` pixels of the counting line, or would reach it before
+    the next detection at its current velocity, or when at least
+    ``busy_tracks`` vehicles are tracked, so crossings are always measured on
+    real detections. It also drops while detections are not tracked yet: the
+    tracker only confirms a new track on consecutive frames. Otherwise it grows by one, up to ``max_stride``, when
+    the road is empty or the camera runs below ``target_fps``, and holds.
+    """
+
+    def __init__(self, min_stride=1, max_stride=4, target_fps=None, near_line=80, busy_tracks=8):
+        """
+        :param min_stride: Smallest stride, 1 detects on every frame.
+        :param max_stride: Largest stride.
+        :param target_fps: Processing rate the camera should keep, the source rate when None.
+        :param near_line: Distance in pixels between a box edge and the line that counts as near.
+        :param busy_tracks: Number of tracks from which the scene counts as busy.
+        """
+        self.min_stride = max(1, int(min_stride))
+        self.max_stride = max(self.min_stride, int(max_stride))
+        self.target_fps = target_fps
+        self.near_line = near_line
+        self.busy_tracks = busy_tracks
+        self.stride = self.min_stride
+
+    def update(self, detections, line, fps, source_fps=None, velocities=None, untracked=0):
+        """
+        :param detections: Tracked detections of the frame that was just detected.
+        :param line: ((x1, y1), (x2, y2)) counting line.
+        :param fps: Current processing rate of the camera.
+        :param source_fps: Frame rate of the source, the target when ``target_fps`` is None.
+        :param velocities: Optional (n, 4) box velocities in pixels per second, see ``TrackPredictor``.
+        :param untracked: Detections of the frame the tracker did not report.
+        :return: Frames until the next detection.
+        """
+        target = self.target_fps or source_fps
+        if len(detections):
+            xyxy = detections.xyxy
+            centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+            # Half the box diagonal, so a big vehicle counts as near when its edge approaches the line
+            reach = np.linalg.norm(xyxy[:, 2:] - xyxy[:, :2], axis=1) / 2 + self.near_line
+            rate = fps or target
+            if velocities is not None and len(velocities) == len(detections) and rate:
+                # Distance covered until the next detection at the largest stride
+                speed = np.linalg.norm((velocities[:, :2] + velocities[:, 2:]) / 2, axis=1)
+                reach = reach + speed * self.max_stride / rate
+            near = bool(np.any(segment_distance(centers, *line) < reach))
+        else:
+            near = False
+
+        if near or untracked or len(detections) >= self.busy_tracks:
+            self.stride = self.min_stride
+        elif not len(detections) or (target and fps and fps < 0.9 * target):
+            self.stride = min(self.max_stride, self.stride + 1)
+        return self.stride
+
+    def to_dict(self):
+        return {
+            'min_stride': self.min_stride,
+            'max_stride': self.max_stride,
+            'target_fps': self.target_fps,
+            'near_line': self.near_line,
+            'busy_tracks': self.busy_tracks,
+            'stride': self.stride,
+        }
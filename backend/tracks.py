@@ -0,0 +1,173 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACKED = "tracked"
+LOST = "lost"
+
+
+class RingBuffer:
+    """
+    Fixed-capacity history of (timestamp, x, y) rows. Appending overwrites
+    the oldest row once full, so a track never holds more than ``capacity``.
+    """
+
+    __slots__ = ('data', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.data = np.zeros((max(1, int(capacity)), 3), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, x, y):
+        capacity = len(self.data)
+        index = (self.start + self.size) % capacity
+        self.data[index] = (timestamp, x, y)
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def values(self):
+        """ :return: (n, 3) rows, oldest first. """
+        return np.roll(self.data, -self.start, axis=0)[:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+class TrackRecord:
+    __slots__ = ('track_id', 'class_id', 'state', 'first_seen', 'last_seen', 'hits', 'missed', 'history')
+
+    def __init__(self, track_id, class_id, timestamp, history):
+        self.track_id = track_id
+        self.class_id = class_id
+        self.state = TRACKED
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 0
+        # Detector updates since the tracker last reported the track
+        self.missed = 0
+        self.history = RingBuffer(history)
+
+    def to_dict(self):
+        return {
+            'track_id': self.track_id,
+            'class_id': self.class_id,
+            'state': self.state,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'hits': self.hits,
+        }
+
+
+class TrackManager:
+    """
+    Owns the lifecycle of a camera's tracks.
+
+    A track is ``tracked`` while the tracker reports it and ``lost`` when it
+    stops doing so. Lost tracks are evicted once the tracker has given up on
+    them too (``lost_track_buffer`` detector updates, the same buffer the
+    tracker is built with), or after ``ttl`` seconds without being reported,
+    whichever comes first. ``max_tracks`` bounds the number of records; when
+    it is reached the longest unseen tracks go first. Eviction callbacks let
+    other per-track state (speed estimation) be freed at the same time.
+    """
+
+    def __init__(self, lost_track_buffer=30, ttl=10.0, history=32, max_tracks=256):
+        """
+        :param lost_track_buffer: Detector updates a lost track is kept, match the tracker's.
+        :param ttl: Seconds after which a track that is not reported is evicted regardless.
+        :param history: Positions kept per track.
+        :param max_tracks: Most records held at once.
+        """
+        self.lost_track_buffer = lost_track_buffer
+        self.ttl = ttl
+        self.history = history
+        self.max_tracks = max(1, int(max_tracks))
+        self.records = {}
+        self.on_evict = []
+        self.evicted = 0
+        self.high_water = 0
+
+    def update(self, detections, timestamp, detected=True):
+        """
+        Records one frame of tracked detections.
+
+        :param detections: ``sv.Detections`` with ``tracker_id`` set.
+        :param timestamp: Capture time of the frame.
+        :param detected: False for frames whose boxes were predicted, which
+            do not count towards the tracker's lost buffer.
+        :return: Ids of the tracks evicted on this frame.
+        """
+        reported = set()
+        if detections.tracker_id is not None and len(detections):
+            xyxy = detections.xyxy
+            centers_x = (xyxy[:, 0] + xyxy[:, 2]) / 2
+            class_ids = detections.class_id if detections.class_id is not None else np.zeros(len(detections), dtype=int)
+            for track_id, class_id, x, y in zip(detections.tracker_id.tolist(), class_ids.tolist(), centers_x.tolist(), xyxy[:, 3].tolist()):
+                record = self.records.get(track_id)
+                if record is None:
+                    record = self.records[track_id] = TrackRecord(track_id, class_id, timestamp, self.history)
+                record.state = TRACKED
+                record.last_seen = timestamp
+                record.missed = 0
+                record.hits += 1
+                record.history.append(timestamp, x, y)
+                reported.add(track_id)
+
+        expired = []
+        for track_id, record in self.records.items():
+            if track_id in reported:
+                continue
+            record.state = LOST
+            if detected:
+                record.missed += 1
+            if record.missed > self.lost_track_buffer or timestamp - record.last_seen > self.ttl:
+                expired.append(track_id)
+
+        overflow = len(self.records) - len(expired) - self.max_tracks
+        if overflow > 0:
+            expiring = set(expired)
+            remaining = sorted((r for r in self.records.values() if r.track_id not in expiring), key=lambda r: r.last_seen)
+            expired.extend(r.track_id for r in remaining[:overflow])
+            logger.warning("Track capacity %d reached, evicting %d tracks", self.max_tracks, overflow)
+
+        self.high_water = max(self.high_water, len(self.records))
+        if expired:
+            self.evict(expired)
+        return expired
+
+    def evict(self, track_ids):
+        for track_id in track_ids:
+            self.records.pop(track_id, None)
+        self.evicted += len(track_ids)
+        for callback in self.on_evict:
+            callback(track_ids)
+
+    def get(self, track_id):
+        return self.records.get(track_id)
+
+    def trail(self, track_id):
+        """ :return: (n, 2) recent bottom-center positions of a track, oldest first. """
+        record = self.records.get(track_id)
+        if record is None:
+            return np.zeros((0, 2))
+        return record.history.values()[:, 1:]
+
+    def record_bytes(self):
+        """ Approximate memory of one record including its history buffer. """
+        return 8 * len(TrackRecord.__slots__) + 64 + self.history * 3 * 8
+
+    def stats(self):
+        records = list(self.records.values())
+        lost = sum(1 for r in records if r.state == LOST)
+        return {
+            'tracked': len(records) - lost,
+            'lost': lost,
+            'evicted': self.evicted,
+            'high_water': self.high_water,
+            'high_water_bytes': self.high_water * self.record_bytes(),
+            'max_tracks': self.max_tracks,
+        }
@@ -0,0 +1,265 @@
+from concurrent.futures import ThreadPoolExecutor
+from models import Vehicle, Violation, vehicle_violation
+import rollup
+from datetime import datetime, timezone
+from collections import deque
+import profiling
+import metrics
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ViolationEvent:
+    __slots__ = ('camera_id', 'motorist_img', 'license_img', 'violations', 'speed', 'timestamp', 'queued_at',
+                 'motorist_path', 'license_path')
+
+    def __init__(self, camera_id, motorist_img, license_img, violations, speed, timestamp=None):
+        self.camera_id = camera_id
+        self.motorist_img = motorist_img
+        self.license_img = license_img
+        self.violations = violations
+        self.speed = speed
+        self.timestamp = timestamp or time.time()
+        self.queued_at = time.perf_counter()
+        self.motorist_path = None
+        self.license_path = None
+
+
+class ViolationWriter:
+    """
+    Persists violations on a background thread.
+
+    Events are taken from a bounded queue and written in batches: evidence
+    images are encoded and written in parallel, violation names are resolved
+    from an in-memory id cache and every vehicle of the batch is committed in
+    one transaction. ``submit`` never blocks, so the detection path is never
+    held up by the disk or SQLite.
+    """
+
+    def __init__(self, app, db, evidence_store, plate_reader=None, rollup_timezone=None, batch_size=32, flush_interval=0.5, io_workers=4, max_queue_size=1000, history=200):
+        """
+        :param app: Flask application, used for the app context.
+        :param db: SQLAlchemy instance.
+        :param evidence_store: EvidenceStore the images are written to.
+        :param plate_reader: Optional PlateReader that every saved plate is handed to.
+        :param rollup_timezone: tzinfo whose calendar days the daily rollup is keyed by, UTC when None.
+        :param batch_size: Maximum number of vehicles per transaction.
+        :param flush_interval: Longest time in seconds an event waits for its batch.
+        :param io_workers: Threads writing evidence images.
+        :param max_queue_size: Events held before new ones are dropped.
+        :param history: Number of recent batches kept for the statistics.
+        """
+        self.app = app
+        self.db = db
+        self.evidence_store = evidence_store
+        self.plate_reader = plate_reader
+        self.rollup_timezone = rollup_timezone or timezone.utc
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.events = queue.Queue(maxsize=max_queue_size)
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="evidence-io")
+        self.violation_ids = {}
+        self.violation_names = {}
+
+        self.stats_lock = threading.Lock()
+        self.batch_latencies = deque(maxlen=history)
+        self.event_latencies = deque(maxlen=history)
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.batch_seconds = metrics.registry.histogram(
+            'traffic_violation_write_seconds', "Time to persist a batch of violations (evidence and database).")
+        self.event_seconds = metrics.registry.histogram(
+            'traffic_violation_event_latency_seconds', "Time from a violation being queued to it being committed.")
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="violation-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, camera_id, motorist_img, license_img, violations, speed, timestamp=None):
+        """
+        Queues a violation for persistence without blocking.
+
+        :return: False if the queue was full and the event was dropped.
+        """
+        if not violations:
+            return False
+        try:
+            self.events.put_nowait(ViolationEvent(camera_id, motorist_img, license_img, violations, speed, timestamp))
+            return True
+        except queue.Full:
+            with self.stats_lock:
+                self.dropped += 1
+            logger.warning("Violation queue full, dropping event from camera %s", camera_id)
+            return False
+
+    def _collect(self):
+        try:
+            batch = [self.events.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.events.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self.running or not self.events.empty():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            with profiling.stage('evidence_write'):
+                saved, created = self._save_images(batch)
+            try:
+                with profiling.stage('db_write'):
+                    plates = self._write_batch(saved) if saved else []
+            except Exception:
+                logger.exception("Failed to write %d violations", len(saved))
+                # No record points at the files this batch added
+                self._discard(created)
+                saved = plates = []
+            if self.plate_reader is not None:
+                for vehicle_id, license_path in plates:
+                    self.plate_reader.submit(vehicle_id, license_path)
+            end = time.perf_counter()
+
+            with self.stats_lock:
+                self.batches += 1
+                self.written += len(saved)
+                self.failed += len(batch) - len(saved)
+                self.batch_latencies.append(end - start)
+                self.event_latencies.extend(end - event.queued_at for event in saved)
+            self.batch_seconds.observe(end - start)
+            for event in saved:
+                self.event_seconds.observe(end - event.queued_at)
+
+    def _save_images(self, batch):
+        """
+        Writes the evidence images of a batch in parallel.
+
+        :return: Tuple of (events whose images were all written, paths of the
+            files these events added to the store).
+        """
+        jobs = []
+        for event in batch:
+            motorist = self.io_pool.submit(self.evidence_store.store, "motorist", event.motorist_img, event.timestamp)
+            plate = None
+            if event.license_img is not None:
+                plate = self.io_pool.submit(self.evidence_store.store, "license", event.license_img, event.timestamp)
+            jobs.append((event, motorist, plate))
+
+        saved = []
+        created = set()
+        orphans = set()
+        for event, motorist, plate in jobs:
+            written = []
+            failed = False
+            # Vehicles without a readable plate keep license_path empty
+            for kind, job in (("motorist", motorist), ("license", plate)):
+                if job is None:
+                    continue
+                try:
+                    path, new = job.result()
+                except Exception:
+                    logger.exception("Failed to write %s evidence for camera %s", kind, event.camera_id)
+                    failed = True
+                    continue
+                setattr(event, f"{kind}_path", path)
+                if new:
+                    written.append(path)
+            if failed:
+                orphans.update(written)
+                continue
+            # The frames are no longer needed once they are on disk
+            event.motorist_img = event.license_img = None
+            saved.append(event)
+            created.update(written)
+        # Identical images share one file, which a saved event may still point at
+        self._discard(orphans - {path for event in saved for path in (event.motorist_path, event.license_path)})
+        return saved, created
+
+    def _discard(self, paths):
+        for path in paths:
+            self.evidence_store.discard(path)
+
+    def _resolve_violation_ids(self, names):
+        missing = [name for name in names if name not in self.violation_ids]
+        if missing:
+            found = {v.name: v.id for v in Violation.query.filter(Violation.name.in_(missing)).all()}
+            # Unknown names (e.g. non-violation classes) are cached as None too
+            for name in missing:
+                self.violation_ids[name] = found.get(name)
+                if name in found:
+                    self.violation_names[found[name]] = name
+        return [self.violation_ids[name] for name in dict.fromkeys(names) if self.violation_ids[name] is not None]
+
+    def _write_batch(self, batch):
+        """
+        Inserts a batch of vehicles and their violations in one transaction,
+        together with the matching daily rollup increments.
+
+        :return: (vehicle id, license path) of every saved vehicle with a plate.
+        """
+        with self.app.app_context():
+            try:
+                vehicles = [Vehicle(image_path=event.motorist_path, license_path=event.license_path, speed=event.speed, camera_id=event.camera_id)
+                            for event in batch]
+                self.db.session.add_all(vehicles)
+                self.db.session.flush()
+                plates = [(vehicle.id, vehicle.license_path) for vehicle in vehicles if vehicle.license_path]
+
+                records = []
+                rollups = []
+                for event, vehicle in zip(batch, vehicles):
+                    timestamp = datetime.utcfromtimestamp(event.timestamp)
+                    recorded = []
+                    for violation_id in self._resolve_violation_ids(event.violations):
+                        records.append({'vehicle_id': vehicle.id, 'violation_id': violation_id, 'timestamp': timestamp})
+                        recorded.append(self.violation_names[violation_id])
+                    rollups.append((rollup.local_day(event.timestamp, self.rollup_timezone), event.camera_id, recorded, event.speed))
+                if records:
+                    self.db.session.execute(vehicle_violation.insert(), records)
+                rollup.record(self.db.session, rollups)
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                raise
+        return plates
+
+    def stats(self):
+        with self.stats_lock:
+            batch_latencies = list(self.batch_latencies)
+            event_latencies = list(self.event_latencies)
+            return {
+                'queue_depth': self.events.qsize(),
+                'batches': self.batches,
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'batch_latency_ms_avg': sum(batch_latencies) / len(batch_latencies) * 1000 if batch_latencies else 0.0,
+                'batch_latency_ms_max': max(batch_latencies) * 1000 if batch_latencies else 0.0,
+                'event_latency_ms_avg': sum(event_latencies) / len(event_latencies) * 1000 if event_latencies else 0.0,
+                'event_latency_ms_max': max(event_latencies) * 1000 if event_latencies else 0.0,
+            }
+
+    def shutdown(self):
+        """
+        Stops the writer after flushing what is already queued.
+        """
+        self.running = False
+        self.thread.join(timeout=10)
+        self.io_pool.shutdown(wait=True)
@@ -0,0 +1,131 @@
+from collections import deque
+import metrics
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of worker threads fed by a bounded job queue.
+
+    When the queue is full a new job is handled according to the overflow
+    policy: ``drop_oldest`` discards the longest waiting job, ``drop_newest``
+    discards the incoming job and ``block`` makes the caller wait for room.
+    """
+
+    def __init__(self, num_workers=4, max_queue_size=64, overflow_policy=DROP_OLDEST, name="worker"):
+        """
+        :param num_workers: Number of worker threads.
+        :param max_queue_size: Maximum number of jobs waiting to run.
+        :param overflow_policy: One of ``drop_oldest``, ``drop_newest`` or ``block``.
+        :param name: Prefix for the worker thread names.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.name = name
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.job_seconds = metrics.registry.histogram('traffic_worker_job_seconds', "Duration of worker jobs.", ('pool',))
+        self.wait_seconds = metrics.registry.histogram('traffic_worker_queue_wait_seconds', "Time jobs waited in the queue.", ('pool',))
+        self.overflow_policy = overflow_policy
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.running = True
+
+        self.queued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+
+        self.workers = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, int(num_workers)))
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queues ``fn(*args, **kwargs)`` for a worker.
+
+        :return: False if the job was not queued.
+        """
+        with self.condition:
+            if not self.running:
+                return False
+            if len(self.jobs) >= self.max_queue_size:
+                if self.overflow_policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.overflow_policy == DROP_OLDEST:
+                    self.jobs.popleft()
+                    self.dropped += 1
+                else:
+                    while self.running and len(self.jobs) >= self.max_queue_size:
+                        self.condition.wait()
+                    if not self.running:
+                        return False
+
+            self.jobs.append((fn, args, kwargs, time.perf_counter()))
+            self.queued += 1
+            self.condition.notify_all()
+            return True
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self.running and not self.jobs:
+                    self.condition.wait()
+                if not self.jobs:
+                    return
+                fn, args, kwargs, queued_at = self.jobs.popleft()
+                # Wake up producers blocked on a full queue
+                self.condition.notify_all()
+
+            start = time.perf_counter()
+            self.wait_seconds.observe(start - queued_at, self.name)
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception("Worker job failed")
+                with self.condition:
+                    self.failed += 1
+            else:
+                with self.condition:
+                    self.processed += 1
+            finally:
+                self.job_seconds.observe(time.perf_counter() - start, self.name)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'workers': len(self.workers),
+                'max_queue_size': self.max_queue_size,
+                'overflow_policy': self.overflow_policy,
+                'queue_depth': len(self.jobs),
+                'queued': self.queued,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'failed': self.failed,
+            }
+
+    def shutdown(self, wait=True, timeout=5):
+        """
+        Stops accepting jobs; workers drain what is already queued and exit.
+
+        :param wait: Join the workers.
+        :param timeout: Seconds to wait for each worker, None to wait until the queue is drained.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if wait:
+            for worker in self.workers:
+                worker.join(timeout=timeout)
@@ -8,7 +8,7 @@ const VehicleList = ({local_url}) => {
     useEffect(() => {
         fetch(`${local_url}/vehicles`)
             .then(response => response.json())
-            .then(data => setVehicles(data))
+            .then(data => setVehicles(data.items))
             .catch(error => console.error("Error fetching data:", error));
     }, []);
 
@@ -26,7 +26,7 @@ const VehicleList = ({local_url}) => {
                         className="p-4 bg-white shadow-md rounded-lg flex items-center gap-4 cursor-pointer hover:bg-gray-200"
                         onClick={() => handleSelect(vehicle)}
                     >
-                        <img src={vehicle.image_path || "default-image.jpg"} 
+                        <img src={vehicle.thumbnail_url || "default-image.jpg"} 
                              alt={vehicle.name} 
                              className="w-16 h-16 rounded-md object-cover" 
                         />
@@ -6,14 +6,23 @@ const VideoStream = ({ socket }) => {
 
     useEffect(() => {
 
+        // Frames arrive as binary JPEG payloads
         const handleFrame = (data) => {
-            setFrame(data);
+            const url = URL.createObjectURL(new Blob([data], { type: 'image/jpeg' }));
+            setFrame((previous) => {
+                if (previous) URL.revokeObjectURL(previous);
+                return url;
+            });
         };
 
         socket.on('frame', handleFrame);
 
         return () => {
             socket.off('frame', handleFrame);
+            setFrame((previous) => {
+                if (previous) URL.revokeObjectURL(previous);
+                return "";
+            });
         };
     }, []);  // Effect now correctly depends on `cameraName`
 
@@ -21,7 +30,7 @@ const VideoStream = ({ socket }) => {
         <div className="w-full max-w-2xl mx-auto border-4 border-gray-500 rounded-lg overflow-hidden shadow-lg aspect-video flex items-center justify-center bg-gray-900">
         {frame ? (
             <img
-            src={`data:image/jpeg;base64,${frame}`}
+            src={frame}
             alt="Camera Feed"
             className="w-full h-full object-cover rounded-[3%]"
             />
@@ -17,10 +17,10 @@ const Dashboard = ({ socket, local_url }) => {
     useEffect(() => {
         const fetchVehicles = async () => {
             try {
-                const response = await fetch(`${local_url}/vehicles`);
+                const response = await fetch(`${local_url}/vehicles?limit=20`);
                 if (!response.ok) throw new Error("Failed to fetch vehicles");
                 const data = await response.json();
-                setVehicles(data);
+                setVehicles(data.items);
             } catch (error) {
                 console.error("Error fetching vehicles:", error);
             }
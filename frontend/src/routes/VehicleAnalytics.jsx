@@ -3,7 +3,7 @@ import { useNavigate } from "react-router-dom";
 import { LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid, BarChart, Bar, Legend } from "recharts";
 
 const VehicleAnalytics = ({ local_url }) => {
-    const [records, setRecords] = useState([]);
+    const [stats, setStats] = useState({ names: [], violations: [], trend: [] });
     const [startDate, setStartDate] = useState("");
     const [endDate, setEndDate] = useState("");
     const [violationFilter, setViolationFilter] = useState("");
@@ -11,57 +11,35 @@ const VehicleAnalytics = ({ local_url }) => {
 
     const navigate = useNavigate()
 
+    // Counts are aggregated by the server from the daily rollup, not from the vehicle records
     useEffect(() => {
-        const fetchRecords = async () => {
+        let cancelled = false;
+        const params = new URLSearchParams({ group: viewType });
+        if (startDate) params.set("start", startDate);
+        if (endDate) params.set("end", endDate);
+        if (violationFilter) params.set("violation", violationFilter);
+
+        const fetchStats = async () => {
             try {
-                const response = await fetch(`${local_url}/vehicles`);
-                if (!response.ok) throw new Error("Failed to fetch vehicle data");
+                const response = await fetch(`${local_url}/violation_stats?${params}`);
+                if (!response.ok) throw new Error("Failed to fetch violation statistics");
                 const data = await response.json();
-                setRecords(data);
+                if (!cancelled) setStats(data);
             } catch (error) {
                 console.error("Error fetching data:", error);
             }
         };
 
-        fetchRecords();
-        const interval = setInterval(fetchRecords, 5000);
-        return () => clearInterval(interval);
-    }, [local_url]);
-
-    // Filter violations based on date range, type, and timestamp
-    const filteredViolations = records.flatMap(record => 
-        record.violations.map(v => ({
-            timestamp: new Date(record.timestamp),
-            type: v
-        })).filter(({ timestamp }) => {
-            return (!startDate || timestamp >= new Date(startDate)) &&
-                   (!endDate || timestamp <= new Date(endDate)) &&
-                   (!violationFilter || v === violationFilter);
-        })
-    );
-
-    // Aggregate data by violation type
-    const violationCounts = filteredViolations.reduce((acc, { type }) => {
-        acc[type] = (acc[type] || 0) + 1;
-        return acc;
-    }, {});
-
-    const chartData = Object.entries(violationCounts).map(([name, count]) => ({
-        violation: name,
-        count
-    }));
-
-    // Aggregate data by date or hour
-    const timeGroupedData = filteredViolations.reduce((acc, { timestamp }) => {
-        const key = viewType === "date" ? timestamp.toLocaleDateString() : `${timestamp.getHours()}:00`;
-        acc[key] = (acc[key] || 0) + 1;
-        return acc;
-    }, {});
+        fetchStats();
+        const interval = setInterval(fetchStats, 5000);
+        return () => {
+            cancelled = true;
+            clearInterval(interval);
+        };
+    }, [local_url, startDate, endDate, violationFilter, viewType]);
 
-    const formattedTimeData = Object.entries(timeGroupedData).map(([key, count]) => ({
-        label: key,
-        count
-    }));
+    const chartData = stats.violations;
+    const formattedTimeData = stats.trend;
 
     return (
         <div className="grid grid-rows-[auto_1fr] gap-4 h-screen w-screen p-8">
@@ -91,7 +69,7 @@ const VehicleAnalytics = ({ local_url }) => {
                         onChange={(e) => setViolationFilter(e.target.value)}
                     >
                         <option value="">All Violations</option>
-                        {[...new Set(records.flatMap(r => r.violations.map(v => v)))]
+                        {stats.names
                             .map(v => <option key={v} value={v}>{v}</option>)}
                     </select>
                     <select
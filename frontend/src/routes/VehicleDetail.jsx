@@ -14,8 +14,14 @@ const VehicleDetail = ({local_url}) => {
     const fetchLicenseText = async (v_id) => {
         try {
             const response = await fetch(`${local_url}/get_license_text/${v_id}`);
-            if (!response.ok) throw new Error("Failed to fetch speed limit");
+            if (!response.ok) throw new Error("Failed to fetch license text");
             const data = await response.json();
+            if (data['status'] === "pending") {
+                // OCR is still running in the background, ask again shortly
+                setLicenseText("Reading...");
+                setTimeout(() => fetchLicenseText(v_id), 1000);
+                return;
+            }
             setLicenseText(data['license_text']);
         } catch (error) {
             console.error("Error fetching license text:", error);
@@ -32,12 +38,12 @@ const VehicleDetail = ({local_url}) => {
                     {/* Vehicle Image */}
                     <div className="flex flex-col">
                         <img 
-                            src={vehicle.image_base64 ? `data:image/jpeg;base64,${vehicle.image_base64}` : "/default-image.png"} 
+                            src={vehicle.image_url || "/default-image.png"} 
                             alt={`Vehicle ${vehicle.id}`} 
                             className="w-full h-64 object-cover rounded-lg mt-4"
                         />
                         <img 
-                            src={vehicle.license_base64 ? `data:image/jpeg;base64,${vehicle.license_base64}` : "/default-image.png"} 
+                            src={vehicle.license_url || "/default-image.png"} 
                             alt={`Vehicle ${vehicle.id} License`} 
                             className="w-full mt-4"
                             onClick={() => fetchLicenseText(vehicle.id)}
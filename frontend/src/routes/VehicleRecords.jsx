@@ -1,45 +1,92 @@
-import React, { useEffect, useState } from "react";
+import React, { useCallback, useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import * as XLSX from "xlsx";
 
+const PAGE_SIZE = 100;
+
 const VehicleRecords = ({ local_url }) => {
     const [records, setRecords] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [violationNames, setViolationNames] = useState([]);
     const [startDate, setStartDate] = useState("");
     const [endDate, setEndDate] = useState("");
     const [violationFilter, setViolationFilter] = useState("");
     const navigate = useNavigate();
 
+    // Filters are applied by the server, so every page only holds matching records
+    const fetchPage = useCallback(async (cursor) => {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (cursor !== null) params.set("cursor", cursor);
+        if (startDate) params.set("start", startDate);
+        if (endDate) params.set("end", `${endDate}T23:59:59`);
+        if (violationFilter) params.set("violation", violationFilter);
+        const response = await fetch(`${local_url}/vehicles?${params}`);
+        if (!response.ok) throw new Error("Failed to fetch vehicle records");
+        return response.json();
+    }, [local_url, startDate, endDate, violationFilter]);
+
     useEffect(() => {
-        const fetchRecords = async () => {
+        let cancelled = false;
+
+        const loadFirstPage = async () => {
+            try {
+                const data = await fetchPage(null);
+                if (cancelled) return;
+                setRecords(data.items);
+                setNextCursor(data.next_cursor);
+            } catch (error) {
+                console.error("Error fetching records:", error);
+            }
+        };
+
+        // The refresh only prepends records newer than the ones shown, pages already loaded stay
+        const refresh = async () => {
             try {
-                const response = await fetch(`${local_url}/vehicles`);
-                if (!response.ok) throw new Error("Failed to fetch vehicle records");
-                const data = await response.json();
-                setRecords(data);
+                const data = await fetchPage(null);
+                if (cancelled) return;
+                setRecords((current) => {
+                    const newest = current.length > 0 ? current[0].id : -1;
+                    const added = data.items.filter((record) => record.id > newest);
+                    return added.length > 0 ? [...added, ...current] : current;
+                });
             } catch (error) {
                 console.error("Error fetching records:", error);
             }
         };
 
-        fetchRecords();
-        const interval = setInterval(fetchRecords, 5000);
-        return () => clearInterval(interval);
+        loadFirstPage();
+        const interval = setInterval(refresh, 5000);
+        return () => {
+            cancelled = true;
+            clearInterval(interval);
+        };
+    }, [fetchPage]);
+
+    useEffect(() => {
+        fetch(`${local_url}/violation_stats`)
+            .then((response) => response.json())
+            .then((data) => setViolationNames(data.names))
+            .catch((error) => console.error("Error fetching violation names:", error));
     }, [local_url]);
 
-    // Filter records based on date range and violation type
-    const filteredRecords = records.filter((record) => {
-        const recordTime = new Date(record.timestamp);
-        const matchesDate =
-            (!startDate || recordTime >= new Date(startDate)) &&
-            (!endDate || recordTime <= new Date(endDate));
-        const matchesViolation =
-            !violationFilter || record.violations.includes(violationFilter);
-        return matchesDate && matchesViolation;
-    });
-
-    // Export data as Excel
+    const loadMore = async () => {
+        if (nextCursor === null || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const data = await fetchPage(nextCursor);
+            setRecords((current) => [...current, ...data.items]);
+            setNextCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Error fetching records:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    // Export the loaded records as Excel
     const exportToExcel = () => {
-        const exportData = filteredRecords.map((r) => ({
+        const exportData = records.map((r) => ({
             ID: r.id,
             Timestamp: r.timestamp,
             Violations: r.violations.length > 0 ? r.violations.join(", ") : "None",
@@ -83,7 +130,7 @@ const VehicleRecords = ({ local_url }) => {
                         onChange={(e) => setViolationFilter(e.target.value)}
                     >
                         <option value="">All Violations</option>
-                        {[...new Set(records.flatMap((r) => r.violations))]
+                        {violationNames
                             .map((v) => (
                                 <option key={v} value={v}>{v}</option>
                             ))}
@@ -108,7 +155,7 @@ const VehicleRecords = ({ local_url }) => {
                             </tr>
                         </thead>
                         <tbody>
-                            {filteredRecords.map((record) => (
+                            {records.map((record) => (
                                 <tr
                                     key={record.id}
                                     className="hover:bg-gray-100 cursor-pointer"
@@ -131,6 +178,15 @@ const VehicleRecords = ({ local_url }) => {
                         </tbody>
                     </table>
                 </div>
+                {nextCursor !== null && (
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="self-center mt-4 bg-blue-500 text-white px-4 py-2 rounded-md disabled:opacity-50"
+                    >
+                        {loadingMore ? "Loading..." : "Load more"}
+                    </button>
+                )}
             </div>
         </div>
     );